@@ -5,6 +5,7 @@ from .models import (
     Hospital, BloodStock, Transaction
 )
 from .authentication import hash_api_key
+from .stock_service import set_stock_level
 import secrets
 
 
@@ -68,6 +69,10 @@ class HospitalAdmin(admin.ModelAdmin):
         ('API Configuration', {
             'fields': ('api_key_hash', 'display_api_key', 'is_active')
         }),
+        ('Ingest Limits', {
+            'fields': ('ingest_rate_per_minute', 'ingest_burst'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -108,6 +113,31 @@ class BloodStockAdmin(admin.ModelAdmin):
     search_fields = ['hospital__name', 'hospital__code']
     readonly_fields = ['id', 'updated_at']
     ordering = ['hospital__name', 'blood_group']
+
+    def get_readonly_fields(self, request, obj=None):
+        """The stock key is fixed once created; only the level is edited"""
+        if obj:
+            return [*self.readonly_fields, 'hospital', 'blood_group', 'blood_product_type']
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        """Set the level through stock_service, so the ledger records it"""
+        set_stock_level(obj.hospital, obj.blood_group, obj.units_available,
+                        blood_product_type=obj.blood_product_type)
+        saved = BloodStock.objects.get(
+            hospital=obj.hospital, blood_group=obj.blood_group, blood_product_type=obj.blood_product_type
+        )
+        obj.pk, obj.updated_at = saved.pk, saved.updated_at
+
+    def delete_model(self, request, obj):
+        """Zero the level in the ledger before the row goes"""
+        set_stock_level(obj.hospital, obj.blood_group, 0, blood_product_type=obj.blood_product_type)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset.select_related('hospital'):
+            set_stock_level(obj.hospital, obj.blood_group, 0, blood_product_type=obj.blood_product_type)
+        super().delete_queryset(request, queryset)
     
     def stock_status(self, obj):
         """Visual indicator for stock levels"""
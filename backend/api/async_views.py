@@ -0,0 +1,190 @@
+"""
+BloodSync Nepal - Async Public Views
+Async (ASGI) implementations of the read-heavy public stock endpoints.
+
+They run the same queries as their ``bloodsync_views`` counterparts through
+the async ORM, so an ASGI worker keeps serving other requests while one
+waits on the database. DRF views are sync only, so these are plain Django
+views that reuse DRF content negotiation and renderers: responses have the
+same bodies as the sync views, including MessagePack, and share their
+cache entries and ETags.
+
+``ASYNC_PUBLIC_VIEWS`` routes the public endpoints here; enable it when
+serving ``bloodhub.asgi``.
+"""
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .bloodsync_views import (
+    PRIORITY_CITIES, PUBLIC_HOSPITAL_FIELDS, map_snapshots, map_viewport_params, map_viewport_payload,
+    priority_snapshots, public_stock_params, public_stock_payload, public_stock_result,
+    public_stock_snapshots, snapshot_map_entry, stock_stream_params, stock_stream_response,
+    stock_stream_unavailable, viewport_cluster_entry, viewport_clusters, viewport_snapshots,
+)
+from .models import Hospital
+from .renderers import with_msgpack
+from .stock_cache import (
+    aget_stock_version, entry_key, etag_matches, response_digest, response_etag,
+    stock_cache_counter, with_validators,
+)
+from .stock_events import astream_stock_events
+
+# The browsable API needs a DRF view, so async views offer JSON (and MessagePack).
+ASYNC_RENDERER_CLASSES = with_msgpack([JSONRenderer])
+
+_negotiation = DefaultContentNegotiation()
+
+
+def _render(renderer, media_type, data, status_code=status.HTTP_200_OK):
+    content = renderer.render(data, media_type, {}) if data is not None else b''
+    content_type = media_type
+    if renderer.charset:
+        content_type = f'{media_type}; charset={renderer.charset}'
+    return HttpResponse(content, status=status_code, content_type=content_type)
+
+
+def async_stock_view(name):
+    """
+    Async ``cache_stock_response`` for views that return response data.
+
+    Negotiates the renderer, answers matching ``If-None-Match`` with 304,
+    serves cached data, and otherwise awaits the view and caches its data.
+    A view may instead return an ``HttpResponse`` (an error), which is sent
+    as is and not cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return HttpResponseNotAllowed(['GET'])
+            drf_request = Request(request)
+            try:
+                renderer, media_type = _negotiation.select_renderer(
+                    drf_request, [renderer() for renderer in ASYNC_RENDERER_CLASSES]
+                )
+            except NotAcceptable as exc:
+                return _render(JSONRenderer(), JSONRenderer.media_type, {'detail': exc.detail}, exc.status_code)
+
+            digest = response_digest(name, request.GET, kwargs)
+            version = await aget_stock_version()
+            etag = response_etag(version, digest, renderer.format)
+
+            if etag_matches(request, etag):
+                stock_cache_counter.record(name, 'not_modified')
+                return with_validators(_render(renderer, media_type, None, status.HTTP_304_NOT_MODIFIED), etag)
+
+            key = entry_key(version, name, digest)
+            data = await cache.aget(key)
+            if data is not None:
+                stock_cache_counter.record(name, 'hits')
+            else:
+                stock_cache_counter.record(name, 'misses')
+                data = await view(request, *args, **kwargs)
+                if isinstance(data, HttpResponse):
+                    return data
+                await cache.aset(key, data, settings.PUBLIC_STOCK_CACHE_TIMEOUT)
+            return with_validators(_render(renderer, media_type, data), etag)
+        return wrapper
+    return decorator
+
+
+@async_stock_view('public-blood-stock')
+async def public_blood_stock(request):
+    """Async ``PublicBloodStockView``."""
+    city, blood_group, min_units = public_stock_params(request.GET)
+
+    results = []
+    async for snapshot in public_stock_snapshots(city, blood_group, min_units):
+        result = public_stock_result(snapshot, blood_group, min_units)
+        if result:
+            results.append(result)
+
+    return public_stock_payload(results, city, blood_group, min_units)
+
+
+@async_stock_view('public-hospitals')
+async def hospital_list_public(request):
+    """Async ``hospital_list_public``."""
+    hospitals = [
+        hospital async for hospital in
+        Hospital.objects.filter(is_active=True).values(*PUBLIC_HOSPITAL_FIELDS)
+    ]
+    return {
+        'hospitals': hospitals,
+        'count': len(hospitals),
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@async_stock_view('map-data')
+async def blood_stock_map_data(request):
+    """Async ``blood_stock_map_data``."""
+    map_data = [
+        snapshot_map_entry(snapshot)
+        async for snapshot in map_snapshots(request.GET.get('cities'))
+        if snapshot.latitude and snapshot.longitude
+    ]
+    return {
+        'hospitals': map_data,
+        'count': len(map_data),
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@async_stock_view('priority-hospitals')
+async def priority_hospitals(request):
+    """Async ``priority_hospitals``."""
+    response_data = [snapshot_map_entry(snapshot) async for snapshot in priority_snapshots()]
+    return {
+        'hospitals': response_data,
+        'count': len(response_data),
+        'cities': PRIORITY_CITIES,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@async_stock_view('map-viewport')
+async def map_viewport(request):
+    """Async ``map_viewport``."""
+    try:
+        south, west, north, east, zoom = map_viewport_params(request.GET)
+    except ValueError as exc:
+        return _render(JSONRenderer(), JSONRenderer.media_type, {'error': str(exc)}, status.HTTP_400_BAD_REQUEST)
+
+    snapshots = viewport_snapshots(south, west, north, east)
+    hospitals, clusters = [], []
+    if zoom > settings.MAP_CLUSTER_MAX_ZOOM:
+        hospitals = [snapshot_map_entry(snapshot) async for snapshot in snapshots]
+    else:
+        clusters = [viewport_cluster_entry(row) async for row in viewport_clusters(snapshots, zoom)]
+
+    return map_viewport_payload((south, west, north, east), zoom, hospitals, clusters)
+
+
+@require_GET
+async def stock_stream(request):
+    """
+    Live stock changes as Server-Sent Events.
+    GET /api/v1/public/stock-stream/
+    Query params: city, blood_group, hospital (code)
+
+    Each ``stock`` event carries the hospital's stock vector and the groups
+    that changed. Reconnects resume from ``Last-Event-ID`` (or
+    ``?last_event_id=``). Served only under ASGI: a WSGI server would run
+    the stream in a worker thread for its whole lifetime.
+    """
+    if not isinstance(request, ASGIRequest):
+        return stock_stream_unavailable()
+    return stock_stream_response(astream_stock_events(**stock_stream_params(request)))
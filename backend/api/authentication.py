@@ -1,8 +1,99 @@
 import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from rest_framework import authentication, exceptions
 from .models import Hospital
 
 
+class HospitalKeyCache:
+    """
+    In-process TTL/LRU cache of API-key digest -> Hospital row values.
+
+    Entries hold the row's field values, not a model instance, so every
+    request gets its own Hospital and one request cannot change what the
+    next one sees. Unknown or inactive keys are cached as ``None`` so
+    repeated bad keys do not hit the database either. Entries expire after
+    ``ttl`` seconds, which bounds staleness across worker processes; within
+    a process the cache is cleared whenever a Hospital is saved, deleted or
+    changed by a queryset ``update()`` (see ``api.signals``).
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every clear so a lookup that raced an invalidation is not stored.
+        self.generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, digest):
+        """Return (found, row_values_or_None) for a digest."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, row = entry
+            if expires_at <= time.monotonic():
+                del self._entries[digest]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(digest)
+            if row is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, row
+
+    def put(self, digest, row, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[digest] = (time.monotonic() + self.ttl, row)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# Every concrete column, so the per-request instance has no deferred fields.
+HOSPITAL_FIELDS = [field.attname for field in Hospital._meta.concrete_fields]
+
+hospital_key_cache = HospitalKeyCache(
+    ttl=settings.HOSPITAL_AUTH_CACHE_TTL,
+    max_size=settings.HOSPITAL_AUTH_CACHE_SIZE,
+)
+
+
 class HospitalAPIKeyAuthentication(authentication.BaseAuthentication):
     """Simple API key authentication for hospital integrations."""
 
@@ -13,11 +104,17 @@ class HospitalAPIKeyAuthentication(authentication.BaseAuthentication):
         if not api_key:
             return None
 
-        hashed = hashlib.sha256(api_key.encode()).hexdigest()
-        try:
-            hospital = Hospital.objects.get(api_key_hash=hashed, is_active=True)
-        except Hospital.DoesNotExist:
+        hashed = hash_api_key(api_key)
+        found, row = hospital_key_cache.get(hashed)
+        if not found:
+            generation = hospital_key_cache.generation
+            row = Hospital.objects.filter(api_key_hash=hashed, is_active=True).values_list(
+                *HOSPITAL_FIELDS
+            ).first()
+            hospital_key_cache.put(hashed, row, generation)
+        if row is None:
             raise exceptions.AuthenticationFailed("Invalid API key.")
+        hospital = Hospital.from_db(Hospital.objects.db, HOSPITAL_FIELDS, row)
 
         # DRF expects a (user, auth) tuple. We pass the hospital as the user-like object.
         return (hospital, None)
@@ -4,36 +4,128 @@ Real-time blood inventory management endpoints
 """
 
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.views import APIView
-from django.db.models import Sum, Count, Q, Max
+from django.conf import settings
+from django.db.models import Avg, CharField, Sum, Count, Q, Max, Min
+from django.db.models.functions import Cast, Substr
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_GET
 from django.utils import timezone
 from datetime import timedelta
-from collections import defaultdict
 import math
+import uuid
 
 from .models import (
-    Hospital, BloodStock, Transaction, StockAlert, DonationDrive, BLOOD_GROUP_CHOICES, DonorProfile
+    Hospital, BloodStock, HospitalStockSnapshot, StockAggregate, Transaction, StockAlert, DonationDrive,
+    SearchDocument, BLOOD_GROUP_CHOICES, SNAPSHOT_GROUP_FIELDS, DonorProfile
 )
 from .serializers import (
     HospitalSerializer, BloodStockSerializer, TransactionSerializer,
-    StockAlertSerializer, DonationDriveSerializer, NearbyDonorRequestSerializer
+    StockAlertSerializer, DonationDriveSerializer, NearbyDonorRequestSerializer, NearestStockQuerySerializer,
+    TransferPlanQuerySerializer
 )
+from .geo import cluster_precision, covering_cells, haversine_km, prefix_range
+from .nearby import nearest_hospitals_with_stock
+from .pagination import StockAlertCursorPagination
+from .renderers import COMPACT_RENDERER_CLASSES
+from .search import search_documents
+from .stock_cache import cache_stock_response
+from .transfers import plan_transfers
 
 PRIORITY_CITIES = ['Kathmandu', 'Bhaktapur', 'Lalitpur', 'Pokhara']
-
-
-def haversine_km(lat1, lon1, lat2, lon2):
-    """Return distance in kilometers between two lat/long points."""
-    r = 6371  # Earth radius in km
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lon2 - lon1)
-    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return r * c
+MAP_MAX_ZOOM = 22
+
+
+def _snapshot_hospital(snapshot):
+    """``HospitalSerializer``-shaped dict built from a stock snapshot row."""
+    return {
+        'id': str(snapshot.hospital_id),
+        'code': snapshot.code,
+        'name': snapshot.name,
+        'city': snapshot.city,
+        'address': snapshot.address,
+        'latitude': f'{snapshot.latitude:.6f}' if snapshot.latitude is not None else None,
+        'longitude': f'{snapshot.longitude:.6f}' if snapshot.longitude is not None else None,
+        'is_active': snapshot.is_active,
+    }
+
+
+def snapshot_map_entry(snapshot):
+    """Map marker for a stock snapshot row."""
+    return {
+        'id': str(snapshot.hospital_id),
+        'code': snapshot.code,
+        'name': snapshot.name,
+        'city': snapshot.city,
+        'address': snapshot.address,
+        'position': {
+            'lat': snapshot.latitude,
+            'lng': snapshot.longitude,
+        },
+        'stock': snapshot.stock_by_group(),
+        'total_units': snapshot.total_units,
+    }
+
+
+def public_stock_params(params):
+    """Return (city, blood_group, min_units) from public stock query params."""
+    try:
+        min_units = int(params.get('min_units', 0))
+    except ValueError:
+        min_units = 0
+    return params.get('city'), params.get('blood_group'), min_units
+
+
+def public_stock_snapshots(city, blood_group, min_units):
+    """Snapshot rows that can match a public stock search."""
+    # One query against the denormalized read model
+    snapshots = HospitalStockSnapshot.objects.filter(is_active=True)
+    if city:
+        snapshots = snapshots.filter(city__icontains=city)
+    if min_units > 0:
+        if blood_group:
+            field = SNAPSHOT_GROUP_FIELDS.get(blood_group)
+            snapshots = snapshots.filter(**{f'{field}__gte': min_units}) if field else snapshots.none()
+        else:
+            any_group = Q()
+            for field in SNAPSHOT_GROUP_FIELDS.values():
+                any_group |= Q(**{f'{field}__gte': min_units})
+            snapshots = snapshots.filter(any_group)
+    return snapshots
+
+
+def public_stock_result(snapshot, blood_group, min_units):
+    """Search result for one snapshot, or None if none of its stock matches."""
+    # Build stock dictionary
+    stock_dict = {
+        group: {'units': units, 'updated_at': snapshot.group_updated_at[group]}
+        for group, units in snapshot.stock_by_group().items()
+        if (not blood_group or group == blood_group) and units >= min_units
+    }
+    if not stock_dict:  # Only include hospitals with matching stock
+        return None
+    return {
+        'hospital': _snapshot_hospital(snapshot),
+        'stock': stock_dict,
+        'last_updated': max(entry['updated_at'] for entry in stock_dict.values())
+    }
+
+
+def public_stock_payload(results, city, blood_group, min_units):
+    return {
+        'results': results,
+        'total_hospitals': len(results),
+        'query': {
+            'city': city,
+            'blood_group': blood_group,
+            'min_units': min_units
+        },
+        'timestamp': timezone.now().isoformat()
+    }
 
 
 class PublicBloodStockView(APIView):
@@ -43,58 +135,19 @@ class PublicBloodStockView(APIView):
     Query params: city, blood_group, min_units
     """
     permission_classes = [AllowAny]
+    renderer_classes = COMPACT_RENDERER_CLASSES
 
+    @method_decorator(cache_stock_response('public-blood-stock'))
     def get(self, request):
-        city = request.query_params.get('city')
-        blood_group = request.query_params.get('blood_group')
-        min_units = request.query_params.get('min_units', 0)
-
-        try:
-            min_units = int(min_units)
-        except ValueError:
-            min_units = 0
-
-        # Query active hospitals
-        hospitals = Hospital.objects.filter(is_active=True)
-        if city:
-            hospitals = hospitals.filter(city__icontains=city)
+        city, blood_group, min_units = public_stock_params(request.query_params)
 
         results = []
-        for hospital in hospitals:
-            stock_queryset = hospital.stock.all()
-            if blood_group:
-                stock_queryset = stock_queryset.filter(blood_group=blood_group)
-            if min_units > 0:
-                stock_queryset = stock_queryset.filter(units_available__gte=min_units)
-
-            # Build stock dictionary
-            stock_dict = {}
-            latest_update = None
-            for stock in stock_queryset:
-                stock_dict[stock.blood_group] = {
-                    'units': stock.units_available,
-                    'updated_at': stock.updated_at.isoformat()
-                }
-                if not latest_update or stock.updated_at > latest_update:
-                    latest_update = stock.updated_at
+        for snapshot in public_stock_snapshots(city, blood_group, min_units):
+            result = public_stock_result(snapshot, blood_group, min_units)
+            if result:
+                results.append(result)
 
-            if stock_dict:  # Only include hospitals with matching stock
-                results.append({
-                    'hospital': HospitalSerializer(hospital).data,
-                    'stock': stock_dict,
-                    'last_updated': latest_update.isoformat() if latest_update else None
-                })
-
-        return Response({
-            'results': results,
-            'total_hospitals': len(results),
-            'query': {
-                'city': city,
-                'blood_group': blood_group,
-                'min_units': min_units
-            },
-            'timestamp': timezone.now().isoformat()
-        })
+        return Response(public_stock_payload(results, city, blood_group, min_units))
 
 
 class BloodAvailabilityByCityView(APIView):
@@ -103,32 +156,37 @@ class BloodAvailabilityByCityView(APIView):
     GET /api/v1/public/blood-availability/{city}
     """
     permission_classes = [AllowAny]
+    renderer_classes = COMPACT_RENDERER_CLASSES
 
+    @method_decorator(cache_stock_response('blood-availability-city'))
     def get(self, request, city):
-        hospitals = Hospital.objects.filter(is_active=True, city__icontains=city)
+        total_hospitals = HospitalStockSnapshot.objects.filter(is_active=True, city__icontains=city).count()
         
-        if not hospitals.exists():
+        if not total_hospitals:
             return Response({
                 'error': f'No hospitals found in {city}',
                 'city': city,
                 'total_hospitals': 0
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # Aggregate stock across all hospitals in city
-        aggregated = defaultdict(int)
+        # Per-city totals are maintained by stock_service; sum the matching cities
+        rows = (
+            StockAggregate.objects.filter(city__icontains=city, hospital_count__gt=0)
+            .order_by()
+            .values('blood_group')
+            .annotate(units=Sum('units_available'), updated=Max('last_updated'))
+        )
+        aggregated = {}
         latest_updates = {}
-        
-        for hospital in hospitals:
-            for stock in hospital.stock.all():
-                aggregated[stock.blood_group] += stock.units_available
-                if stock.blood_group not in latest_updates or stock.updated_at > latest_updates[stock.blood_group]:
-                    latest_updates[stock.blood_group] = stock.updated_at
+        for row in rows:
+            aggregated[row['blood_group']] = row['units']
+            latest_updates[row['blood_group']] = row['updated'].isoformat()
 
         return Response({
             'city': city,
-            'total_hospitals': hospitals.count(),
-            'aggregated_stock': dict(aggregated),
-            'last_updated_by_group': {k: v.isoformat() for k, v in latest_updates.items()},
+            'total_hospitals': total_hospitals,
+            'aggregated_stock': aggregated,
+            'last_updated_by_group': latest_updates,
             'timestamp': timezone.now().isoformat()
         })
 
@@ -141,8 +199,13 @@ class AdminAnalyticsView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        # Total units across all hospitals
-        total_units = BloodStock.objects.aggregate(total=Sum('units_available'))['total'] or 0
+        # Blood group distribution and total units across active hospitals
+        blood_group_distribution = dict.fromkeys((bg_code for bg_code, _ in BLOOD_GROUP_CHOICES), 0)
+        blood_group_distribution.update(
+            StockAggregate.objects.order_by().values('blood_group')
+            .annotate(total=Sum('units_available')).values_list('blood_group', 'total')
+        )
+        total_units = sum(blood_group_distribution.values())
 
         # Critical shortages (< 5 units)
         critical_stocks = BloodStock.objects.filter(units_available__lt=5).select_related('hospital')
@@ -166,15 +229,15 @@ class AdminAnalyticsView(APIView):
         week_ago = now - timedelta(days=7)
         two_weeks_ago = now - timedelta(days=14)
 
-        recent_donations = Transaction.objects.filter(
+        # Adjustments (stock set by hand, opening balances) are not donations.
+        donations = Transaction.objects.filter(is_adjustment=False, units_change__gt=0)
+        recent_donations = donations.filter(
             timestamp__gte=week_ago,
-            units_change__gt=0
         ).aggregate(total=Sum('units_change'))['total'] or 0
 
-        previous_donations = Transaction.objects.filter(
+        previous_donations = donations.filter(
             timestamp__gte=two_weeks_ago,
             timestamp__lt=week_ago,
-            units_change__gt=0
         ).aggregate(total=Sum('units_change'))['total'] or 0
 
         trend = 'stable'
@@ -183,14 +246,6 @@ class AdminAnalyticsView(APIView):
         elif recent_donations < previous_donations * 0.9:
             trend = 'declining'
 
-        # Blood group distribution
-        blood_group_distribution = {}
-        for bg_code, bg_name in BLOOD_GROUP_CHOICES:
-            total = BloodStock.objects.filter(blood_group=bg_code).aggregate(
-                total=Sum('units_available')
-            )['total'] or 0
-            blood_group_distribution[bg_code] = total
-
         return Response({
             'total_units': total_units,
             'critical_shortages': critical_shortages,
@@ -201,7 +256,7 @@ class AdminAnalyticsView(APIView):
             'statistics': {
                 'total_hospitals': Hospital.objects.filter(is_active=True).count(),
                 'total_transactions_last_7_days': Transaction.objects.filter(
-                    timestamp__gte=week_ago
+                    timestamp__gte=week_ago, is_adjustment=False
                 ).count(),
                 'recent_donations': recent_donations,
                 'previous_donations': previous_donations
@@ -210,6 +265,29 @@ class AdminAnalyticsView(APIView):
         })
 
 
+class TransferPlanView(APIView):
+    """
+    Network-wide plan of transfers from surplus to shortage hospitals.
+    GET /api/v1/admin/transfer-plan/
+    Query params: blood_group, product, max_km, safety_units
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        serializer = TransferPlanQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        plan = plan_transfers(
+            blood_groups=[data['blood_group']] if data.get('blood_group') else None,
+            products=[data['product']] if data.get('product') else None,
+            max_km=data.get('max_km'),
+            safety_units=data.get('safety_units'),
+        )
+        plan['timestamp'] = timezone.now().isoformat()
+        return Response(plan)
+
+
 class StockAlertViewSet(viewsets.ReadOnlyModelViewSet):
     """
     View and manage stock alerts.
@@ -218,6 +296,7 @@ class StockAlertViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = StockAlert.objects.all()
     serializer_class = StockAlertSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = StockAlertCursorPagination
 
     def get_queryset(self):
         queryset = StockAlert.objects.select_related('hospital')
@@ -234,7 +313,7 @@ class StockAlertViewSet(viewsets.ReadOnlyModelViewSet):
         if alert_level:
             queryset = queryset.filter(alert_level=alert_level)
 
-        return queryset.order_by('-triggered_at')
+        return queryset
 
 
 class DonationDriveViewSet(viewsets.ModelViewSet):
@@ -401,16 +480,18 @@ class NearbyDonorLocatorView(APIView):
         })
 
 
+PUBLIC_HOSPITAL_FIELDS = ('code', 'name', 'city', 'address', 'latitude', 'longitude')
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_stock_response('public-hospitals')
 def hospital_list_public(request):
     """
     Simple list of all active hospitals with their locations.
     GET /api/v1/public/hospitals
     """
-    hospitals = Hospital.objects.filter(is_active=True).values(
-        'code', 'name', 'city', 'address', 'latitude', 'longitude'
-    )
+    hospitals = Hospital.objects.filter(is_active=True).values(*PUBLIC_HOSPITAL_FIELDS)
     
     return Response({
         'hospitals': list(hospitals),
@@ -419,6 +500,86 @@ def hospital_list_public(request):
     })
 
 
+SEARCH_KINDS = {kind for kind, _ in SearchDocument.KIND_CHOICES}
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes(COMPACT_RENDERER_CLASSES)
+def search_public(request):
+    """
+    Ranked prefix search (autocomplete) over hospitals, hospital requests,
+    blood banks and donation drives by name, city and address.
+    GET /api/v1/public/search/?q=bir hos
+    Query params: q, type (comma-separated kinds), limit (max 50)
+    """
+    query = request.query_params.get('q', '')
+    kinds = [kind.strip() for kind in request.query_params.get('type', '').split(',') if kind.strip()]
+    unknown = set(kinds) - SEARCH_KINDS
+    if unknown:
+        return Response(
+            {'error': f"Unknown type: {', '.join(sorted(unknown))}", 'types': sorted(SEARCH_KINDS)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+    except ValueError:
+        limit = 10
+
+    results = search_documents(query, kinds=kinds, limit=limit)
+    return Response({
+        'query': query,
+        'results': results,
+        'count': len(results),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes(COMPACT_RENDERER_CLASSES)
+@cache_stock_response('nearest-stock')
+def nearest_stock(request):
+    """
+    The k closest hospitals holding at least min_units of a blood group,
+    across city and district borders.
+    GET /api/v1/public/nearest-stock/?lat=27.7&lng=85.3&blood_group=O-
+    Query params: hospital (code, instead of lat/lng), lat, lng, blood_group,
+    product, min_units (default 1), k (default 5, max 50), radius_km
+    """
+    serializer = NearestStockQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    origin = None
+    if data.get('hospital'):
+        origin = Hospital.objects.filter(code=data['hospital'], is_active=True).first()
+        if not origin:
+            return Response({'error': 'Hospital not found or inactive'}, status=status.HTTP_404_NOT_FOUND)
+        if origin.latitude is None or origin.longitude is None:
+            return Response({'error': 'Hospital is missing location coordinates'}, status=status.HTTP_400_BAD_REQUEST)
+        lat, lng = origin.latitude, origin.longitude
+    else:
+        lat, lng = data['lat'], data['lng']
+
+    results = nearest_hospitals_with_stock(
+        lat, lng, data['blood_group'],
+        product=data.get('product'),
+        min_units=data['min_units'],
+        k=data['k'],
+        max_km=data.get('radius_km'),
+        exclude=origin.id if origin else None,
+    )
+    return Response({
+        'origin': {'lat': float(lat), 'lng': float(lng), 'hospital': origin.code if origin else None},
+        'blood_group': data['blood_group'],
+        'product': data.get('product'),
+        'min_units': data['min_units'],
+        'results': results,
+        'count': len(results),
+        'timestamp': timezone.now().isoformat()
+    })
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def check_stock_alerts(request):
@@ -439,46 +600,46 @@ def check_stock_alerts(request):
     })
 
 
+def map_snapshots(cities_param=None):
+    """Located active snapshots, optionally limited to a comma-separated city list."""
+    snapshots = HospitalStockSnapshot.objects.filter(
+        is_active=True, latitude__isnull=False, longitude__isnull=False
+    )
+    if cities_param:
+        city_list = [city.strip() for city in cities_param.split(',') if city.strip()]
+        if city_list:
+            city_query = Q()
+            for city in city_list:
+                city_query |= Q(city__iexact=city)
+            snapshots = snapshots.filter(city_query)
+    return snapshots
+
+
+def priority_snapshots():
+    city_query = Q()
+    for city in PRIORITY_CITIES:
+        city_query |= Q(city__iexact=city)
+
+    snapshots = HospitalStockSnapshot.objects.filter(is_active=True).filter(city_query)
+    return snapshots.filter(latitude__isnull=False, longitude__isnull=False)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(COMPACT_RENDERER_CLASSES)
+@cache_stock_response('map-data')
 def blood_stock_map_data(request):
     """
     Get all hospital locations with current stock for map visualization.
     GET /api/v1/public/map-data
     """
-    hospitals = Hospital.objects.filter(is_active=True).prefetch_related('stock')
-
-    cities_param = request.query_params.get('cities')
-    if cities_param:
-        city_list = [city.strip() for city in cities_param.split(',') if city.strip()]
-        if city_list:
-            city_query = Q()
-            for city in city_list:
-                city_query |= Q(city__iexact=city)
-            hospitals = hospitals.filter(city_query)
+    snapshots = map_snapshots(request.query_params.get('cities'))
     
-    map_data = []
-    for hospital in hospitals:
-        if hospital.latitude and hospital.longitude:
-            stock_summary = {}
-            total_units = 0
-            for stock in hospital.stock.all():
-                stock_summary[stock.blood_group] = stock.units_available
-                total_units += stock.units_available
-            
-            map_data.append({
-                'id': str(hospital.id),
-                'code': hospital.code,
-                'name': hospital.name,
-                'city': hospital.city,
-                'address': hospital.address,
-                'position': {
-                    'lat': float(hospital.latitude),
-                    'lng': float(hospital.longitude)
-                },
-                'stock': stock_summary,
-                'total_units': total_units
-            })
+    map_data = [
+        snapshot_map_entry(snapshot)
+        for snapshot in snapshots
+        if snapshot.latitude and snapshot.longitude
+    ]
     
     return Response({
         'hospitals': map_data,
@@ -489,32 +650,11 @@ def blood_stock_map_data(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(COMPACT_RENDERER_CLASSES)
+@cache_stock_response('priority-hospitals')
 def priority_hospitals(request):
     """Return map-ready hospitals restricted to the four priority cities."""
-    city_query = Q()
-    for city in PRIORITY_CITIES:
-        city_query |= Q(city__iexact=city)
-
-    hospitals = Hospital.objects.filter(is_active=True).filter(city_query).prefetch_related('stock')
-
-    hospitals = hospitals.filter(latitude__isnull=False, longitude__isnull=False)
-
-    response_data = []
-    for hospital in hospitals:
-        stock_summary = {stock.blood_group: stock.units_available for stock in hospital.stock.all()}
-        response_data.append({
-            'id': str(hospital.id),
-            'code': hospital.code,
-            'name': hospital.name,
-            'city': hospital.city,
-            'address': hospital.address,
-            'position': {
-                'lat': float(hospital.latitude),
-                'lng': float(hospital.longitude)
-            },
-            'stock': stock_summary,
-            'total_units': sum(stock_summary.values()),
-        })
+    response_data = [snapshot_map_entry(snapshot) for snapshot in priority_snapshots()]
 
     return Response({
         'hospitals': response_data,
@@ -522,3 +662,159 @@ def priority_hospitals(request):
         'cities': PRIORITY_CITIES,
         'timestamp': timezone.now().isoformat()
     })
+
+
+
+def map_viewport_params(params):
+    """
+    Return (south, west, north, east, zoom) from ``bbox=west,south,east,north``
+    and ``zoom`` query params.
+
+    Raises:
+        ValueError: if either is missing, malformed or out of range
+    """
+    try:
+        west, south, east, north = (float(value) for value in params.get('bbox', '').split(','))
+        zoom = int(params.get('zoom', ''))
+    except ValueError:
+        raise ValueError('bbox=west,south,east,north and zoom are required')
+    if not all(math.isfinite(value) for value in (west, south, east, north)):
+        raise ValueError('bbox must be finite')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError('bbox must be west,south,east,north with south <= north and west <= east')
+    if not 0 <= zoom <= MAP_MAX_ZOOM:
+        raise ValueError(f'zoom must be between 0 and {MAP_MAX_ZOOM}')
+    return south, west, north, east, zoom
+
+
+def viewport_snapshots(south, west, north, east):
+    """Located active snapshots inside a bounding box, found through the geohash index."""
+    cells = Q()
+    for cell in covering_cells(south, west, north, east):
+        low, high = prefix_range(cell)
+        cells |= Q(geohash__gte=low, geohash__lt=high)
+    return HospitalStockSnapshot.objects.filter(
+        cells,
+        is_active=True,
+        latitude__gte=south, latitude__lte=north,
+        longitude__gte=west, longitude__lte=east,
+    )
+
+
+def viewport_clusters(snapshots, zoom):
+    """One row per geohash cell sized for ``zoom``, with the cell's summed stock."""
+    return (
+        snapshots.order_by()
+        .values(cell=Substr('geohash', 1, cluster_precision(zoom)))
+        .annotate(
+            hospitals=Count('hospital_id'),
+            lat=Avg('latitude'), lng=Avg('longitude'),
+            south=Min('latitude'), west=Min('longitude'),
+            north=Max('latitude'), east=Max('longitude'),
+            # Only meaningful for single-hospital cells.
+            any_id=Min(Cast('hospital_id', CharField())), any_code=Min('code'), any_name=Min('name'),
+            units=Sum('total_units'),
+            **{f'sum_{field}': Sum(field) for field in SNAPSHOT_GROUP_FIELDS.values()},
+        )
+        .order_by('cell')
+    )
+
+
+def viewport_cluster_entry(row):
+    """Map cluster for a ``viewport_clusters`` row."""
+    entry = {
+        'id': row['cell'],
+        'position': {'lat': row['lat'], 'lng': row['lng']},
+        'bounds': [[row['south'], row['west']], [row['north'], row['east']]],
+        'hospital_count': row['hospitals'],
+        'stock': {group: row[f'sum_{field}'] for group, field in SNAPSHOT_GROUP_FIELDS.items()},
+        'total_units': row['units'],
+    }
+    if row['hospitals'] == 1:
+        entry['hospital'] = {
+            'id': str(uuid.UUID(row['any_id'])), 'code': row['any_code'], 'name': row['any_name'],
+        }
+    return entry
+
+
+def map_viewport_payload(bbox, zoom, hospitals, clusters):
+    south, west, north, east = bbox
+    return {
+        'mode': 'clusters' if zoom <= settings.MAP_CLUSTER_MAX_ZOOM else 'hospitals',
+        'zoom': zoom,
+        'bbox': [west, south, east, north],
+        'hospitals': hospitals,
+        'clusters': clusters,
+        'count': len(hospitals) + sum(cluster['hospital_count'] for cluster in clusters),
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes(COMPACT_RENDERER_CLASSES)
+@cache_stock_response('map-viewport')
+def map_viewport(request):
+    """
+    Map markers for the visible part of the map.
+    GET /api/v1/public/map-viewport/?bbox=west,south,east,north&zoom=12
+
+    Up to ``MAP_CLUSTER_MAX_ZOOM`` hospitals are grouped into geohash cells
+    sized for the zoom level, each with its hospital count and summed stock
+    per blood group; closer in, every hospital in the box is returned like
+    ``map-data`` does.
+    """
+    try:
+        south, west, north, east, zoom = map_viewport_params(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    snapshots = viewport_snapshots(south, west, north, east)
+    hospitals, clusters = [], []
+    if zoom > settings.MAP_CLUSTER_MAX_ZOOM:
+        hospitals = [snapshot_map_entry(snapshot) for snapshot in snapshots]
+    else:
+        clusters = [viewport_cluster_entry(row) for row in viewport_clusters(snapshots, zoom)]
+
+    return Response(map_viewport_payload((south, west, north, east), zoom, hospitals, clusters))
+
+
+def stock_stream_response(events):
+    """Wrap an SSE frame iterator in a non-buffered streaming response."""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def stock_stream_unavailable():
+    """503 for the live stream outside ASGI."""
+    return JsonResponse(
+        {'error': 'The live stock stream is served only by the ASGI application '
+                  '(bloodhub.asgi with ASYNC_PUBLIC_VIEWS=true)'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+def stock_stream_params(request):
+    params = request.GET
+    return {
+        'last_event_id': request.headers.get('Last-Event-ID') or params.get('last_event_id'),
+        'city': params.get('city'),
+        'hospital': params.get('hospital'),
+        'blood_group': params.get('blood_group'),
+    }
+
+
+@require_GET
+def stock_stream(request):
+    """
+    Live stock changes; see ``async_views.stock_stream``.
+    GET /api/v1/public/stock-stream/
+
+    A stream keeps its connection open for up to STOCK_STREAM_MAX_SECONDS,
+    which under WSGI would hold a worker thread per client, so the sync
+    routes only answer 503.
+    """
+    return stock_stream_unavailable()
@@ -0,0 +1,57 @@
+"""
+BloodSync Nepal - System Checks
+Configuration the API cannot run correctly without.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .stock_cache import stock_version_shared
+from .stock_events import redis
+
+# Backends whose incr() is a single atomic operation. The file and database
+# backends read and write back, so concurrent callers can lose an increment.
+ATOMIC_INCR_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.redis.RedisCache',
+)
+
+
+@register()
+def check_throttle_cache(app_configs, **kwargs):
+    """The ingest token bucket reserves tokens with an atomic incr."""
+    backend = settings.CACHES.get('throttle', {}).get('BACKEND')
+    if backend in ATOMIC_INCR_BACKENDS:
+        return []
+    return [Error(
+        f"The 'throttle' cache uses {backend}, whose incr() is not atomic."
+        if backend else "No 'throttle' cache is configured.",
+        hint="Point CACHES['throttle'] at Redis (shared by workers) or LocMemCache "
+             '(per process); api.throttling reserves tokens with cache.incr.',
+        id='api.E001',
+    )]
+
+
+@register()
+def check_stock_version_cache(app_configs, **kwargs):
+    """A per-process stock version cannot back ETags across workers."""
+    if stock_version_shared() or settings.DEBUG:
+        return []
+    return [Warning(
+        'The default cache is private to each process, so public stock responses are sent without ETags.',
+        hint='Set REDIS_URL (or CACHE_DIR on a single host) to share the stock version and answer '
+             'If-None-Match polls with 304.',
+        id='api.W001',
+    )]
+
+
+@register()
+def check_stock_stream_redis(app_configs, **kwargs):
+    """Without the client the stream would silently fan out per process."""
+    if not settings.STOCK_STREAM_REDIS_URL or redis is not None:
+        return []
+    return [Error(
+        'STOCK_STREAM_REDIS_URL is set but the redis package is not installed.',
+        hint='pip install redis, or unset STOCK_STREAM_REDIS_URL (and REDIS_URL) to fan out in-process.',
+        id='api.E002',
+    )]
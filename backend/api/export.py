@@ -0,0 +1,145 @@
+"""
+BloodSync Nepal - Ledger Export
+Stream Transaction rows as CSV or NDJSON.
+
+Rows are read with ``QuerySet.iterator()`` (a server-side cursor on
+PostgreSQL) and encoded as they arrive, so memory stays flat however many
+rows are exported; the CSV header is sent before the query runs. Under ASGI
+a sync iterator would be read to the end before anything is sent, so
+``astream_export`` hands the same chunks out one at a time from the
+request's sync thread.
+The columns are a superset of the import format, so an export can be fed
+back to ``import_transactions``.
+"""
+
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+
+from .models import Transaction
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_COLUMNS = (
+    'id',
+    'hospital_code',
+    'hospital_city',
+    'blood_group',
+    'blood_product_type',
+    'units_change',
+    'timestamp',
+    'ingested_at',
+    'source_reference',
+    'notes',
+)
+_EXPORT_FIELDS = (
+    'id',
+    'hospital__code',
+    'hospital__city',
+    'blood_group',
+    'blood_product_type',
+    'units_change',
+    'timestamp',
+    'ingested_at',
+    'source_reference',
+    'notes',
+)
+
+# Rows read per round trip and encoded per yielded chunk.
+EXPORT_CHUNK_SIZE = 2000
+
+
+def export_queryset(hospital_code=None, city=None, blood_group=None, since=None, until=None):
+    """
+    Build the export queryset in ledger order (``ingested_at``, ``id``).
+
+    Args:
+        hospital_code: only rows for this hospital code
+        city: only rows for hospitals in this city (case-insensitive)
+        blood_group: only rows for this blood group
+        since: inclusive lower bound on ``ingested_at``
+        until: exclusive upper bound on ``ingested_at``
+
+    Returns:
+        QuerySet of value tuples in ``EXPORT_COLUMNS`` order
+    """
+    queryset = Transaction.objects.all()
+    if hospital_code:
+        queryset = queryset.filter(hospital__code=hospital_code)
+    if city:
+        queryset = queryset.filter(hospital__city__iexact=city)
+    if blood_group:
+        queryset = queryset.filter(blood_group=blood_group)
+    if since:
+        queryset = queryset.filter(ingested_at__gte=since)
+    if until:
+        queryset = queryset.filter(ingested_at__lt=until)
+    return queryset.order_by('ingested_at', 'id').values_list(*_EXPORT_FIELDS)
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(
+            (row[0], *row[1:6], row[6].isoformat(), row[7].isoformat(), *row[8:])
+        ))
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _ndjson_chunks(rows):
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    chunk = []
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record['id'] = str(record['id'])
+        record['timestamp'] = record['timestamp'].isoformat()
+        record['ingested_at'] = record['ingested_at'].isoformat()
+        chunk.append(dumps(record))
+        chunk.append('\n')
+        if len(chunk) >= 2 * EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_export(queryset, file_format):
+    """
+    Yield encoded text chunks for ``queryset`` (from ``export_queryset``).
+
+    Args:
+        queryset: value-tuple queryset from ``export_queryset``
+        file_format: 'csv' or 'ndjson'
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {file_format}')
+    rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if file_format == 'csv':
+        return _csv_chunks(rows)
+    return _ndjson_chunks(rows)
+
+
+async def astream_export(queryset, file_format):
+    """Async ``stream_export`` for ASGI responses; reads one chunk per thread hop."""
+    chunks = stream_export(queryset, file_format)
+    # thread_sensitive keeps every step (and the cursor) on the same thread.
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
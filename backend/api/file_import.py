@@ -0,0 +1,304 @@
+"""
+BloodSync Nepal - Bulk File Import
+Stream hospital LIS exports (CSV or NDJSON) into the ledger.
+
+Files are parsed row by row and validated against the rules of
+``IngestTransactionSerializer``: well-formed rows by a precompiled field
+check, and only rows that fail it by the serializer itself, for its error
+messages. Valid rows are applied in fixed-size chunks, each in its own
+transaction through ``api.ingest.ingest_transactions``, or, for a
+``FileImportJob``, appended to the ingest queue for ``run_ingest_worker``.
+Memory use is bounded by the chunk size, not the file size. A file that
+cannot be read past some line (bad UTF-8, a NUL byte in a CSV) stops the
+import there; the chunks applied before it stay committed and the report
+says where it stopped.
+"""
+
+import codecs
+import csv
+import json
+import time
+
+from django.db.models import Count
+from rest_framework import serializers
+
+from .ingest import enqueue_transactions, ingest_transactions
+from .models import BLOOD_GROUP_CHOICES, BLOOD_PRODUCT_CHOICES, FileImportJob
+from .serializers import IngestTransactionSerializer
+
+FILE_FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_MAX_REPORTED_ERRORS = 1000
+
+_BLOOD_GROUPS = frozenset(code for code, _ in BLOOD_GROUP_CHOICES)
+_BLOOD_PRODUCTS = frozenset(code for code, _ in BLOOD_PRODUCT_CHOICES)
+_TIMESTAMP_FIELD = IngestTransactionSerializer().fields['timestamp']
+_TEXT_FIELDS = {
+    name: field.max_length
+    for name, field in IngestTransactionSerializer().fields.items()
+    if name in ('source_reference', 'notes')
+}
+
+
+def detect_format(filename, default=None):
+    """Guess the export format from a file name."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+
+class UnreadableFile(Exception):
+    """The file cannot be decoded or parsed past ``line_number``."""
+
+    def __init__(self, line_number, message):
+        super().__init__(message)
+        self.line_number = line_number
+
+
+def iter_rows(stream, file_format):
+    """
+    Yield (line_number, row, error) triples from a binary stream.
+
+    CSV files need a header row; empty cells are treated as missing so
+    optional fields fall back to their defaults. Rows that cannot be parsed
+    are yielded with ``row`` set to None.
+
+    Raises:
+        UnreadableFile: if the stream is not valid UTF-8 or the CSV reader
+            fails, with the line after the last row read
+    """
+    text = codecs.getreader('utf-8-sig')(stream)
+    line_number = 0
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                line_number = reader.line_num
+                yield line_number, {key: value for key, value in row.items() if key and value not in ('', None)}, None
+            return
+
+        for line_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, None, f'Invalid JSON: {exc}'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, 'Expected a JSON object'
+                continue
+            yield line_number, row, None
+    except (UnicodeDecodeError, csv.Error) as exc:
+        # The decoder and the CSV reader fail partway through the stream,
+        # after the rows before it were yielded; nothing past it is readable.
+        raise UnreadableFile(line_number + 1, f'Cannot read file: {exc}') from exc
+
+
+def _check_row(row):
+    """
+    Validated data for a well-formed row, or None if the row needs the
+    serializer (it is invalid, or uses a form only the serializer parses).
+    """
+    blood_group = row.get('blood_group')
+    product = row.get('blood_product_type', 'whole_blood')
+    if not (isinstance(blood_group, str) and blood_group in _BLOOD_GROUPS
+            and isinstance(product, str) and product in _BLOOD_PRODUCTS):
+        return None
+
+    units = row.get('units_change')
+    if isinstance(units, str):
+        try:
+            units = int(units)
+        except ValueError:
+            return None
+    elif type(units) is not int:
+        return None
+
+    timestamp = row.get('timestamp')
+    if not isinstance(timestamp, str):
+        return None
+    try:
+        timestamp = _TIMESTAMP_FIELD.to_internal_value(timestamp)
+    except serializers.ValidationError:
+        return None
+
+    data = {'blood_group': blood_group, 'blood_product_type': product,
+            'units_change': units, 'timestamp': timestamp}
+    for name, max_length in _TEXT_FIELDS.items():
+        if name in row:
+            value = row[name]
+            # CharField trims whitespace and rejects NUL; leave those to it.
+            if not isinstance(value, str) or len(value) > max_length or value != value.strip() or '\x00' in value:
+                return None
+            data[name] = value
+    return data
+
+
+def validate_row(row):
+    """
+    Validate one row as ``IngestTransactionSerializer`` would.
+
+    Raises:
+        serializers.ValidationError: with the serializer's errors
+    """
+    data = _check_row(row)
+    if data is not None:
+        return data
+    serializer = IngestTransactionSerializer(data=row)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def queue_payload(data):
+    """JSON-ready queue payload for validated row data (``serializer.data`` form)."""
+    return {**data, 'timestamp': _TIMESTAMP_FIELD.to_representation(data['timestamp'])}
+
+
+def import_transactions(hospital, stream, file_format, chunk_size=DEFAULT_CHUNK_SIZE,
+                        max_reported_errors=DEFAULT_MAX_REPORTED_ERRORS, job=None, throttle=None):
+    """
+    Validate and apply a hospital export file.
+
+    Invalid rows are skipped and reported; valid rows are applied in chunks
+    of ``chunk_size``, or with ``job`` queued under it for the ingest
+    worker. If the file cannot be read past some line, the rows before it
+    are applied and the import stops, with ``stopped`` set to the line and
+    reason; likewise when ``throttle`` refuses a chunk, with ``retry_after``
+    added. Re-importing the same file is safe when rows carry a
+    ``source_reference``.
+
+    Args:
+        hospital: Hospital instance the rows belong to
+        stream: binary file-like object
+        file_format: 'csv' or 'ndjson'
+        chunk_size: rows applied per database transaction
+        max_reported_errors: cap on row-level errors included in the report
+        job: optional FileImportJob; its rows are queued, not applied
+        throttle: optional callable taking a chunk's row count and returning
+            0 to go ahead or the seconds to wait (``consume_tokens``)
+
+    Returns:
+        dict import report with counts and row-level errors
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f'Unsupported file format: {file_format}')
+
+    started = time.perf_counter()
+    report = {
+        'rows': 0,
+        'ingested': 0,
+        'duplicates': 0,
+        'queued': 0,
+        'invalid': 0,
+        'chunks': 0,
+        'errors': [],
+        'errors_truncated': False,
+        'stopped': None,
+    }
+
+    def record_error(line_number, errors):
+        report['invalid'] += 1
+        if len(report['errors']) < max_reported_errors:
+            report['errors'].append({'line': line_number, 'errors': errors})
+        else:
+            report['errors_truncated'] = True
+
+    def flush(chunk):
+        if job is not None:
+            enqueue_transactions(hospital, [queue_payload(data) for data in chunk], import_job=job)
+            report['queued'] += len(chunk)
+            report['chunks'] += 1
+            return
+        results, _ = ingest_transactions(hospital, chunk)
+        replays = sum(1 for _, replayed in results if replayed)
+        report['duplicates'] += replays
+        report['ingested'] += len(results) - replays
+        report['chunks'] += 1
+
+    def admit(chunk, chunk_line):
+        wait = throttle(len(chunk)) if throttle else 0
+        if wait:
+            report['stopped'] = {
+                'line': chunk_line,
+                'error': 'Ingest rate limit exceeded',
+                'retry_after': round(wait, 3),
+            }
+        return not wait
+
+    chunk = []
+    chunk_line = None
+    try:
+        for line_number, row, parse_error in iter_rows(stream, file_format):
+            report['rows'] += 1
+            if parse_error:
+                record_error(line_number, {'non_field_errors': [parse_error]})
+                continue
+            try:
+                chunk.append(validate_row(row))
+            except serializers.ValidationError as exc:
+                record_error(line_number, exc.detail)
+                continue
+            if chunk_line is None:
+                chunk_line = line_number
+            if len(chunk) >= chunk_size:
+                if not admit(chunk, chunk_line):
+                    chunk = []
+                    break
+                flush(chunk)
+                chunk = []
+                chunk_line = None
+    except UnreadableFile as exc:
+        report['stopped'] = {'line': exc.line_number, 'error': str(exc)}
+
+    if chunk and admit(chunk, chunk_line):
+        flush(chunk)
+
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def queue_import(hospital, stream, file_format, file_name='', **kwargs):
+    """
+    Validate an export file and queue its rows for ``run_ingest_worker``.
+
+    Returns:
+        tuple (FileImportJob, import report)
+    """
+    job = FileImportJob.objects.create(hospital=hospital, file_name=file_name, file_format=file_format)
+    report = import_transactions(hospital, stream, file_format, job=job, **kwargs)
+    job.report = report
+    job.save(update_fields=['report'])
+    return job, report
+
+
+def import_job_status(job):
+    """
+    Progress of a queued file import.
+
+    Applied queue items are purged after a while, so ``applied`` is derived
+    from the rows queued minus those still pending or failed.
+    """
+    counts = dict(
+        job.queue_items.filter(status__in=('pending', 'failed'))
+        .values_list('status').annotate(count=Count('id')).order_by()
+    )
+    queued = job.report.get('queued', 0)
+    pending = counts.get('pending', 0)
+    failed = counts.get('failed', 0)
+    return {
+        'job_id': str(job.id),
+        'file': job.file_name,
+        'file_format': job.file_format,
+        'created_at': job.created_at.isoformat(),
+        'state': 'queued' if pending else 'done',
+        'queued': queued,
+        'pending': pending,
+        'failed': failed,
+        'applied': queued - pending - failed,
+        'report': job.report,
+    }
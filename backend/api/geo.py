@@ -0,0 +1,97 @@
+"""
+BloodSync Nepal - Geo Grid
+Geohash cells for indexing and clustering hospital coordinates, and
+great-circle distances.
+
+A geohash names a cell of a fixed world grid; every extra character splits
+the cell into 32. Nearby points share a prefix, so a B-tree index on the
+geohash column answers "everything in this cell" with a range scan, and
+grouping on a prefix clusters points into that precision's cells.
+"""
+
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Stored precision: cells of about 5 m.
+GEOHASH_PRECISION = 9
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Return distance in kilometers between two lat/long points."""
+    r = 6371  # Earth radius in km
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return r * c
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Geohash of a point; ``''`` if either coordinate is missing."""
+    if lat is None or lng is None:
+        return ''
+    lat, lng = float(lat), float(lng)
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, char, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, span = (lng, lng_range) if even else (lat, lat_range)
+        mid = (span[0] + span[1]) / 2
+        char <<= 1
+        if value >= mid:
+            char |= 1
+            span[0] = mid
+        else:
+            span[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[char])
+            bits, char = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(lat_degrees, lng_degrees) spanned by a cell of ``precision`` characters."""
+    total_bits = 5 * precision
+    return 180.0 / 2 ** (total_bits // 2), 360.0 / 2 ** (total_bits - total_bits // 2)
+
+
+def prefix_range(prefix):
+    """(low, high) bounds such that ``low <= geohash < high`` selects the cell."""
+    # '{' sorts right after 'z', the last base32 character.
+    return prefix, prefix + '{'
+
+
+def covering_cells(south, west, north, east, max_cells=16):
+    """
+    Fewest-but-finest geohash cells covering a bounding box.
+
+    Returns the cells of the longest precision that needs at most
+    ``max_cells`` of them (at least precision 1).
+    """
+    cells = []
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lat_size, lng_size = cell_size(precision)
+        rows = range(math.floor((south + 90) / lat_size), math.floor((min(north, 89.999999) + 90) / lat_size) + 1)
+        cols = range(math.floor((west + 180) / lng_size), math.floor((min(east, 179.999999) + 180) / lng_size) + 1)
+        if cells and len(rows) * len(cols) > max_cells:
+            break
+        cells = [
+            encode_geohash(-90 + (row + 0.5) * lat_size, -180 + (col + 0.5) * lng_size, precision)
+            for row in rows for col in cols
+        ]
+    return cells
+
+
+def cluster_precision(zoom, cluster_pixels=64):
+    """
+    Geohash precision whose cells best match ``cluster_pixels`` on a web map
+    at ``zoom`` (256 px tiles).
+    """
+    target = math.log2(360.0 / 2 ** zoom * cluster_pixels / 256)
+    return min(
+        range(1, GEOHASH_PRECISION + 1),
+        key=lambda precision: abs(math.log2(cell_size(precision)[1]) - target),
+    )
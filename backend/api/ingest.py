@@ -0,0 +1,255 @@
+"""
+BloodSync Nepal - Transaction Ingestion
+Shared ledger + stock write path used by the hospital ingest endpoints.
+
+``(hospital, source_reference)`` is an idempotency key: an event whose
+reference has already been ingested is returned as a replay of the
+original transaction and does not touch the ledger or stock again.
+
+In asynchronous mode the ingest views only append events to
+``IngestQueueItem``; ``manage.py run_ingest_worker`` drains the queue in
+batches through the same write path.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction as db_transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Hospital, IngestQueueItem, Transaction
+from .serializers import IngestTransactionSerializer
+from .stock_service import apply_stock_deltas, fold_stock_deltas, get_stock_rows
+
+
+def _find_existing(hospital, references):
+    """Return already-ingested transactions keyed by source_reference."""
+    if not references:
+        return {}
+    existing = {}
+    # The blank exclusion matches the partial unique index condition.
+    lookup = Transaction.objects.filter(hospital=hospital, source_reference__in=references)
+    for txn in lookup.exclude(source_reference='').order_by():
+        txn.hospital = hospital
+        existing[txn.source_reference] = txn
+    return existing
+
+
+def _ingest_once(hospital, items):
+    references = {item.get('source_reference', '') for item in items} - {''}
+    existing = _find_existing(hospital, references)
+
+    results = [None] * len(items)
+    new_items = []
+    first_index_by_reference = {}
+    in_batch_replays = []
+
+    for index, item in enumerate(items):
+        reference = item.get('source_reference', '')
+        if reference in existing:
+            results[index] = (existing[reference], True)
+            continue
+        if reference in first_index_by_reference:
+            in_batch_replays.append((index, first_index_by_reference[reference]))
+            continue
+        if reference:
+            first_index_by_reference[reference] = index
+        new_items.append((index, item))
+
+    if new_items:
+        rows = [
+            Transaction(
+                hospital=hospital,
+                blood_group=item['blood_group'],
+                blood_product_type=item.get('blood_product_type', 'whole_blood'),
+                units_change=item['units_change'],
+                timestamp=item['timestamp'],
+                sequence=sequence,
+                source_reference=item.get('source_reference', ''),
+                notes=item.get('notes', ''),
+            )
+            # The sequence keeps the batch in arrival order on replay when
+            # rows share an ingested_at.
+            for sequence, (_, item) in enumerate(new_items)
+        ]
+        with db_transaction.atomic():
+            # Append to transaction ledger
+            created = Transaction.objects.bulk_create(rows)
+            # Update materialized stock, once per key
+            apply_stock_deltas(hospital, fold_stock_deltas([item for _, item in new_items]))
+
+        for (index, _), txn in zip(new_items, created):
+            results[index] = (txn, False)
+
+    for index, original_index in in_batch_replays:
+        results[index] = (results[original_index][0], True)
+
+    return results
+
+
+def ingest_transactions(hospital, items):
+    """
+    Append a batch of events to the ledger and apply them to stock.
+
+    Ledger rows are written with one ``bulk_create`` and every stock key is
+    written once with a single conditional UPDATE. Stock is read back after
+    commit so no row lock is held across extra round trips. Replayed events
+    (same ``source_reference`` as an earlier event) are resolved with one
+    indexed lookup and never take the stock lock.
+
+    Args:
+        hospital: Hospital instance the events belong to
+        items: list of validated ``IngestTransactionSerializer`` payloads
+
+    Returns:
+        tuple of (results, stock_by_key) where ``results`` is a list of
+        (transaction, replayed) pairs in input order and ``stock_by_key``
+        maps (blood_group, blood_product_type) -> BloodStock
+    """
+    results = _ingest_results(hospital, items)
+    keys = {(txn.blood_group, txn.blood_product_type) for txn, _ in results}
+    return results, get_stock_rows(hospital, keys)
+
+
+def _ingest_results(hospital, items):
+    """``ingest_transactions`` without reading the stock back."""
+    try:
+        return _ingest_once(hospital, items)
+    except IntegrityError:
+        # A concurrent retry inserted one of our references first; the
+        # second pass sees it as a replay.
+        return _ingest_once(hospital, items)
+
+
+def enqueue_transactions(hospital, payloads, import_job=None):
+    """
+    Append validated events to the durable ingest queue.
+
+    Args:
+        hospital: Hospital instance the events belong to
+        payloads: list of JSON-ready ``IngestTransactionSerializer`` payloads
+            (``serializer.data``)
+        import_job: optional FileImportJob the events came from
+
+    Returns:
+        list of created IngestQueueItem instances
+    """
+    return IngestQueueItem.objects.bulk_create(
+        [IngestQueueItem(hospital=hospital, payload=payload, import_job=import_job) for payload in payloads],
+        batch_size=1000,
+    )
+
+
+def _apply_hospital_entries(hospital, entries):
+    """
+    Ingest one hospital's claimed items under a savepoint.
+
+    If the batch raises it is rolled back and the items are applied one at
+    a time, so only the items that fail on their own are held back.
+
+    Returns:
+        list with a (transaction, replayed) pair or the raised exception
+        per entry
+    """
+    try:
+        with db_transaction.atomic():
+            return _ingest_results(hospital, [data for _, data in entries])
+    except Exception as exc:
+        if len(entries) == 1:
+            return [exc]
+    return [outcome for entry in entries for outcome in _apply_hospital_entries(hospital, [entry])]
+
+
+def apply_queued_batch(batch_size=500):
+    """
+    Apply the oldest pending queue items, grouped per hospital.
+
+    Queue state and ledger/stock changes commit together, so a crash leaves
+    items pending rather than half-applied. An item whose apply raises a
+    database error is rolled back on its own and left pending for a later
+    batch, with the error and attempt count recorded; after
+    ``INGEST_MAX_ATTEMPTS`` attempts it is marked failed. Any other error
+    would recur on retry, so its item is marked failed at once.
+
+    Args:
+        batch_size: maximum number of queue items to claim
+
+    Returns:
+        dict with applied, duplicate, retrying and failed counts
+    """
+    summary = {'applied': 0, 'duplicates': 0, 'retrying': 0, 'failed': 0}
+    with db_transaction.atomic():
+        claimed = list(
+            IngestQueueItem.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('id')[:batch_size]
+        )
+        if not claimed:
+            return summary
+
+        by_hospital = defaultdict(list)
+        for item in claimed:
+            serializer = IngestTransactionSerializer(data=item.payload)
+            if serializer.is_valid():
+                by_hospital[item.hospital_id].append((item, serializer.validated_data))
+            else:
+                item.status = 'failed'
+                item.error = str(serializer.errors)
+                summary['failed'] += 1
+
+        hospitals = Hospital.objects.in_bulk(list(by_hospital))
+        now = timezone.now()
+        for hospital_id, entries in by_hospital.items():
+            outcomes = _apply_hospital_entries(hospitals[hospital_id], entries)
+            for (item, _), outcome in zip(entries, outcomes):
+                if isinstance(outcome, Exception):
+                    item.attempts += 1
+                    item.error = f'{type(outcome).__name__}: {outcome}'
+                    if (not isinstance(outcome, DatabaseError)
+                            or item.attempts >= settings.INGEST_MAX_ATTEMPTS):
+                        item.status = 'failed'
+                        summary['failed'] += 1
+                    else:
+                        summary['retrying'] += 1
+                    continue
+                txn, replayed = outcome
+                item.status = 'applied'
+                item.applied_at = now
+                item.transaction = txn
+                summary['duplicates' if replayed else 'applied'] += 1
+
+        IngestQueueItem.objects.bulk_update(claimed, ['status', 'applied_at', 'transaction', 'error', 'attempts'])
+
+    return summary
+
+
+def ingest_queue_stats():
+    """
+    Report queue depth and apply lag for monitoring.
+
+    Returns:
+        dict with pending/failed counts, age of the oldest pending event and
+        the enqueue-to-apply lag of the most recently applied event (seconds)
+    """
+    now = timezone.now()
+    pending = IngestQueueItem.objects.filter(status='pending')
+    oldest_pending = pending.aggregate(oldest=Min('enqueued_at'))['oldest']
+    last_applied = (
+        IngestQueueItem.objects.filter(status='applied')
+        .order_by('-id')
+        .values('enqueued_at', 'applied_at')
+        .first()
+    )
+
+    return {
+        'depth': pending.count(),
+        'failed': IngestQueueItem.objects.filter(status='failed').count(),
+        'oldest_pending_age_seconds': (now - oldest_pending).total_seconds() if oldest_pending else 0.0,
+        'last_apply_lag_seconds': (
+            (last_applied['applied_at'] - last_applied['enqueued_at']).total_seconds()
+            if last_applied else None
+        ),
+        'last_applied_at': last_applied['applied_at'].isoformat() if last_applied else None,
+        'timestamp': now.isoformat(),
+    }
@@ -0,0 +1,229 @@
+"""
+BloodSync Nepal - Ledger Replay
+Rebuild and verify BloodStock from the Transaction ledger.
+
+The ledger is replayed in ingestion order, ``(ingested_at, sequence, id)``,
+applying the same zero clamp as the ingest path. ``sequence`` is a row's
+position in its ingest batch, so rows of one batch that share an
+``ingested_at`` replay in the order they were applied. Replay streams rows
+with ``.iterator()`` and keeps only one integer per stock key in memory.
+StockCheckpoint rows let later runs, and point-in-time queries, start
+from the nearest saved snapshot instead of the beginning of the ledger;
+``prune_checkpoints`` keeps only the newest few.
+"""
+
+from django.db.models import Q
+
+from .models import BloodStock, Hospital, StockCheckpoint, Transaction
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class LedgerCursor:
+    """Position in the ledger: the last replayed (ingested_at, sequence, id)."""
+
+    def __init__(self, as_of, last_sequence, last_transaction_id):
+        self.as_of = as_of
+        self.last_sequence = last_sequence
+        self.last_transaction_id = last_transaction_id
+
+    def after_filter(self):
+        """Q matching ledger rows strictly after this cursor."""
+        return (
+            Q(ingested_at__gt=self.as_of)
+            | Q(ingested_at=self.as_of, sequence__gt=self.last_sequence)
+            | Q(ingested_at=self.as_of, sequence=self.last_sequence, id__gt=self.last_transaction_id)
+        )
+
+
+def load_checkpoint(at=None):
+    """
+    Load the newest checkpoint snapshot, optionally no later than ``at``.
+
+    Returns:
+        tuple of (cursor, states) where states maps
+        (hospital_id, blood_group, blood_product_type) -> units, or
+        (None, {}) when no checkpoint exists
+    """
+    checkpoints = StockCheckpoint.objects.all()
+    if at is not None:
+        checkpoints = checkpoints.filter(as_of__lte=at)
+    latest = checkpoints.order_by('-as_of', '-last_sequence', '-last_transaction_id').values(
+        'as_of', 'last_sequence', 'last_transaction_id'
+    ).first()
+    if not latest:
+        return None, {}
+
+    cursor = LedgerCursor(latest['as_of'], latest['last_sequence'], latest['last_transaction_id'])
+    rows = StockCheckpoint.objects.filter(
+        as_of=cursor.as_of, last_sequence=cursor.last_sequence, last_transaction_id=cursor.last_transaction_id
+    ).values_list('hospital_id', 'blood_group', 'blood_product_type', 'units')
+    states = {(hospital_id, group, product): units for hospital_id, group, product, units in rows}
+    return cursor, states
+
+
+def write_checkpoint(cursor, states):
+    """Persist a snapshot of ``states`` at ``cursor``."""
+    StockCheckpoint.objects.bulk_create(
+        [
+            StockCheckpoint(
+                hospital_id=hospital_id,
+                blood_group=group,
+                blood_product_type=product,
+                units=units,
+                as_of=cursor.as_of,
+                last_sequence=cursor.last_sequence,
+                last_transaction_id=cursor.last_transaction_id,
+            )
+            for (hospital_id, group, product), units in states.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def prune_checkpoints(keep):
+    """
+    Delete all but the newest ``keep`` (at least one) checkpoint snapshots.
+
+    Point-in-time queries (``stock_as_of``) before the oldest kept snapshot
+    fall back to replaying from the beginning of the ledger.
+
+    Returns:
+        number of StockCheckpoint rows deleted
+    """
+    cursors = list(
+        StockCheckpoint.objects.order_by('-as_of', '-last_sequence', '-last_transaction_id')
+        .values_list('as_of', 'last_sequence', 'last_transaction_id').distinct()[:keep]
+    )
+    if len(cursors) < keep:
+        return 0
+    as_of, last_sequence, last_transaction_id = cursors[-1]
+    kept = (
+        Q(as_of__gt=as_of)
+        | Q(as_of=as_of, last_sequence__gt=last_sequence)
+        | Q(as_of=as_of, last_sequence=last_sequence, last_transaction_id__gte=last_transaction_id)
+    )
+    deleted, _ = StockCheckpoint.objects.exclude(kept).delete()
+    return deleted
+
+
+def replay_ledger(states, cursor=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  checkpoint_every=None, checkpoint_before=None):
+    """
+    Replay ledger rows after ``cursor`` into ``states`` (mutated in place).
+
+    Args:
+        states: dict of starting units per (hospital_id, blood_group, product)
+        cursor: LedgerCursor to resume after, or None for the full ledger
+        until: only replay rows ingested at or before this datetime
+        chunk_size: rows fetched per database round trip
+        checkpoint_every: write a checkpoint after this many replayed rows
+            and once more at the end of the replay
+        checkpoint_before: never checkpoint rows ingested at or after this
+            datetime (leaves room for transactions still committing)
+
+    Returns:
+        tuple of (rows_replayed, last_cursor, checkpoints_written)
+    """
+    ledger = Transaction.objects.all()
+    if cursor is not None:
+        ledger = ledger.filter(cursor.after_filter())
+    if until is not None:
+        ledger = ledger.filter(ingested_at__lte=until)
+    ledger = ledger.order_by('ingested_at', 'sequence', 'id').values_list(
+        'id', 'ingested_at', 'sequence', 'hospital_id', 'blood_group', 'blood_product_type', 'units_change'
+    )
+
+    replayed = 0
+    since_checkpoint = 0
+    checkpoints_written = 0
+    last_cursor = cursor
+    for txn_id, ingested_at, sequence, hospital_id, group, product, change in ledger.iterator(chunk_size=chunk_size):
+        if checkpoint_every and checkpoint_before is not None and ingested_at >= checkpoint_before:
+            # Past the last checkpointable position: snapshot what we have so far.
+            if since_checkpoint:
+                write_checkpoint(last_cursor, states)
+                checkpoints_written += 1
+            checkpoint_every = None
+
+        key = (hospital_id, group, product)
+        states[key] = max(0, states.get(key, 0) + change)
+        last_cursor = LedgerCursor(ingested_at, sequence, txn_id)
+        replayed += 1
+        if checkpoint_every:
+            since_checkpoint += 1
+            if since_checkpoint >= checkpoint_every:
+                write_checkpoint(last_cursor, states)
+                checkpoints_written += 1
+                since_checkpoint = 0
+
+    if checkpoint_every and since_checkpoint:
+        write_checkpoint(last_cursor, states)
+        checkpoints_written += 1
+
+    return replayed, last_cursor, checkpoints_written
+
+
+def stock_as_of(at, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Ledger-derived stock at a point in time.
+
+    Starts from the nearest checkpoint at or before ``at`` and replays only
+    the ledger delta since then.
+
+    Returns:
+        dict mapping (hospital_id, blood_group, blood_product_type) -> units
+    """
+    cursor, states = load_checkpoint(at=at)
+    replay_ledger(states, cursor=cursor, until=at, chunk_size=chunk_size)
+    return states
+
+
+def stock_drift(states):
+    """
+    Compare replayed ledger state with the materialized BloodStock rows.
+
+    Stock of a key with no ledger rows at all (written around
+    ``stock_service``, e.g. by bulk loads) is reported with ``in_ledger``
+    False: the ledger has no opening balance for it, so its figure of 0 is
+    not evidence. ``set_stock_level`` writes adjustment rows, and migration
+    0018 gave stock from before the ledger an opening balance.
+
+    Returns:
+        list of dicts for keys where BloodStock differs from the ledger
+    """
+    drift = []
+    seen = set()
+    current = BloodStock.objects.values_list(
+        'hospital_id', 'hospital__code', 'blood_group', 'blood_product_type', 'units_available'
+    ).order_by()
+    for hospital_id, code, group, product, units in current.iterator(chunk_size=DEFAULT_CHUNK_SIZE):
+        key = (hospital_id, group, product)
+        seen.add(key)
+        expected = states.get(key, 0)
+        if expected != units:
+            drift.append({
+                'hospital_id': hospital_id,
+                'hospital_code': code,
+                'blood_group': group,
+                'blood_product_type': product,
+                'stock_units': units,
+                'ledger_units': expected,
+                'in_ledger': key in states,
+            })
+
+    missing = [key for key, expected in states.items() if key not in seen and expected != 0]
+    codes = dict(
+        Hospital.objects.filter(id__in={hospital_id for hospital_id, _, _ in missing}).values_list('id', 'code')
+    )
+    for hospital_id, group, product in missing:
+        drift.append({
+            'hospital_id': hospital_id,
+            'hospital_code': codes.get(hospital_id),
+            'blood_group': group,
+            'blood_product_type': product,
+            'stock_units': None,
+            'ledger_units': states[(hospital_id, group, product)],
+            'in_ledger': True,
+        })
+    return drift
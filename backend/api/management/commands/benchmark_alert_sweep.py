@@ -0,0 +1,153 @@
+"""
+Django management command to benchmark the stock alert sweep
+Usage: python manage.py benchmark_alert_sweep --hospitals 1250 --products 1
+
+Compares the legacy per-row sweep (one or two StockAlert queries per
+BloodStock row) against the set-based api.stock_alerts.sweep_stock_alerts,
+on the configured database. Each strategy runs twice against the same
+benchmark hospitals: once with no alerts open, once after half the stock
+has moved, and its writes are rolled back after each run.
+
+The benchmark stock is written with bulk_create and bulk_update, which
+bypass api.stock_service: no hospital snapshot, city aggregate, stock
+change log entry or inline alert evaluation follows those writes. That is
+deliberate (the sweeps start from stock with no alerts evaluated), and
+the benchmark hospitals are inactive and deleted afterwards.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction as db_transaction
+from django.utils import timezone
+
+from api.models import BLOOD_GROUP_CHOICES, BLOOD_PRODUCT_CHOICES, BloodStock, Hospital, StockAlert
+from api.stock_alerts import sweep_stock_alerts
+
+BENCH_HOSPITAL_PREFIX = 'BENCH-ALERT-'
+
+
+def legacy_sweep(hospitals):
+    """Legacy path: walk every stock row, query and write alerts one at a time."""
+    alerts_created = 0
+    for stock in BloodStock.objects.filter(hospital__in=hospitals).select_related('hospital'):
+        alert_level = None
+        threshold = 0
+        if stock.units_available < 3:
+            alert_level, threshold = 'emergency', 3
+        elif stock.units_available < 5:
+            alert_level, threshold = 'critical', 5
+        elif stock.units_available < 15:
+            alert_level, threshold = 'low', 15
+
+        if alert_level:
+            existing_alert = StockAlert.objects.filter(
+                hospital=stock.hospital, blood_group=stock.blood_group, resolved_at__isnull=True
+            ).first()
+            if not existing_alert:
+                StockAlert.objects.create(
+                    hospital=stock.hospital,
+                    blood_group=stock.blood_group,
+                    alert_level=alert_level,
+                    threshold=threshold,
+                    current_units=stock.units_available,
+                )
+                alerts_created += 1
+        else:
+            StockAlert.objects.filter(
+                hospital=stock.hospital, blood_group=stock.blood_group, resolved_at__isnull=True
+            ).update(resolved_at=timezone.now())
+    return alerts_created
+
+
+def set_based_sweep(hospitals):
+    return sweep_stock_alerts(hospitals)['opened']
+
+
+STRATEGIES = {
+    'legacy': legacy_sweep,
+    'set-based': set_based_sweep,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the legacy per-row stock alert sweep against the set-based sweep'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospitals', type=int, default=1250, help='Benchmark hospitals to create')
+        parser.add_argument('--products', type=int, default=1,
+                            help='Blood products per hospital and group (stock rows = hospitals x 8 x products)')
+        parser.add_argument('--strategy', choices=sorted(STRATEGIES), action='append',
+                            help='Strategy to run (default: all)')
+
+    def handle(self, *args, **options):
+        products = [code for code, _ in BLOOD_PRODUCT_CHOICES][:max(1, options['products'])]
+        strategies = options['strategy'] or ['legacy', 'set-based']
+
+        hospitals = self._setup(options['hospitals'], products)
+        try:
+            rows = BloodStock.objects.filter(hospital__in=hospitals).count()
+            self.stdout.write(self.style.WARNING(
+                f"\nBenchmarking the alert sweep on '{connections['default'].vendor}': "
+                f"{rows} stock rows over {options['hospitals']} hospitals\n"
+            ))
+            for name in strategies:
+                self.stdout.write(self.style.SUCCESS(f'{name}:'))
+                with db_transaction.atomic():
+                    self._run('first sweep', STRATEGIES[name], hospitals)
+                    self._shuffle_stock(hospitals)
+                    self._run('after changes', STRATEGIES[name], hospitals)
+                    db_transaction.set_rollback(True)
+                self.stdout.write('')
+        finally:
+            Hospital.objects.filter(code__startswith=BENCH_HOSPITAL_PREFIX).delete()
+
+    def _setup(self, count, products):
+        Hospital.objects.filter(code__startswith=BENCH_HOSPITAL_PREFIX).delete()
+        Hospital.objects.bulk_create([
+            Hospital(
+                code=f'{BENCH_HOSPITAL_PREFIX}{number:05d}',
+                name=f'Benchmark Hospital {number}',
+                api_key_hash='benchmark',
+                is_active=False,
+            )
+            for number in range(count)
+        ])
+        hospitals = Hospital.objects.filter(code__startswith=BENCH_HOSPITAL_PREFIX)
+        rng = random.Random(0)
+        # bulk_create skips the stock signals and stock_service, so no alerts,
+        # snapshots, aggregates or change log entries exist for this stock.
+        BloodStock.objects.bulk_create([
+            BloodStock(hospital_id=hospital_id, blood_group=blood_group, blood_product_type=product,
+                       units_available=rng.randint(0, 30))
+            for hospital_id in hospitals.values_list('id', flat=True)
+            for blood_group, _ in BLOOD_GROUP_CHOICES
+            for product in products
+        ], batch_size=2000)
+        return hospitals
+
+    def _shuffle_stock(self, hospitals):
+        rng = random.Random(1)
+        stock = list(BloodStock.objects.filter(hospital__in=hospitals).only('id', 'units_available'))
+        changed = rng.sample(stock, len(stock) // 2)
+        for row in changed:
+            row.units_available = rng.randint(0, 30)
+        # Bypasses stock_service like _setup: only the sweep under test reacts.
+        BloodStock.objects.bulk_update(changed, ['units_available'], batch_size=2000)
+
+    def _run(self, label, sweep, hospitals):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connections['default'].execute_wrapper(count_query):
+            started = time.perf_counter()
+            created = sweep(hospitals)
+            elapsed = time.perf_counter() - started
+        open_alerts = StockAlert.objects.filter(hospital__in=hospitals, resolved_at__isnull=True).count()
+        self.stdout.write(
+            f'  {label + ":":<15} {elapsed * 1000:9.1f} ms  {len(queries):6d} queries  '
+            f'{created:5d} opened  {open_alerts:5d} open'
+        )
@@ -0,0 +1,117 @@
+"""
+Django management command to compare JSON and MessagePack payloads
+Usage: python manage.py benchmark_payload_formats --batch-size 500 --hospitals 200
+
+Builds an ingest batch (IngestTransactionSerializer payloads) and a stock
+listing (BloodStockSerializer output) in memory and reports encoded size
+and parse/render time for each format using the DRF parser and renderer
+classes the API actually serves. No database access.
+"""
+import io
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.models import BLOOD_GROUP_CHOICES, BLOOD_PRODUCT_CHOICES, BloodStock, Hospital
+from api.parsers import MessagePackParser
+from api.renderers import MessagePackRenderer, msgpack
+from api.serializers import BloodStockSerializer
+
+CITIES = ['Kathmandu', 'Lalitpur', 'Bhaktapur', 'Pokhara', 'Biratnagar', 'Chitwan']
+FORMATS = {
+    'json': (JSONRenderer, JSONParser),
+    'msgpack': (MessagePackRenderer, MessagePackParser),
+}
+
+
+def build_ingest_batch(size):
+    now = timezone.now()
+    groups = [code for code, _ in BLOOD_GROUP_CHOICES]
+    products = [code for code, _ in BLOOD_PRODUCT_CHOICES]
+    return [
+        {
+            'blood_group': random.choice(groups),
+            'blood_product_type': random.choice(products),
+            'units_change': random.choice([-3, -2, -1, 1, 2, 4]),
+            'timestamp': (now - timedelta(seconds=i * 7)).isoformat(),
+            'source_reference': f'LIS-{uuid.uuid4().hex[:12].upper()}',
+            'notes': random.choice(['', 'Donation camp', 'Issued to ward 4']),
+        }
+        for i in range(size)
+    ]
+
+
+def build_stock_listing(hospital_count):
+    now = timezone.now()
+    rows = []
+    for index in range(hospital_count):
+        hospital = Hospital(
+            code=f'HSP-{index:04d}',
+            name=f'Benchmark Hospital {index}',
+            city=random.choice(CITIES),
+            address='Ward 10, Main Road',
+            latitude=Decimal('27.700000') + Decimal(index) / 1000,
+            longitude=Decimal('85.300000') + Decimal(index) / 1000,
+        )
+        for group, _ in BLOOD_GROUP_CHOICES:
+            rows.append(BloodStock(
+                id=len(rows) + 1,
+                hospital=hospital,
+                blood_group=group,
+                blood_product_type='whole_blood',
+                units_available=random.randint(0, 80),
+                updated_at=now,
+            ))
+    return BloodStockSerializer(rows, many=True).data
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON and MessagePack size and parse/render time on realistic payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Events per ingest batch')
+        parser.add_argument('--hospitals', type=int, default=200, help='Hospitals in the stock listing')
+        parser.add_argument('--rounds', type=int, default=50, help='Timed repetitions per payload')
+
+    def handle(self, *args, **options):
+        if msgpack is None:
+            raise CommandError('msgpack is not installed (pip install msgpack)')
+
+        payloads = {
+            f"ingest batch ({options['batch_size']} events)": build_ingest_batch(options['batch_size']),
+            f"stock listing ({options['hospitals']} hospitals)": build_stock_listing(options['hospitals']),
+        }
+        for label, data in payloads.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            baseline = None
+            for name, (renderer_class, parser_class) in FORMATS.items():
+                size, render_ms, parse_ms = self._measure(
+                    data, renderer_class(), parser_class(), options['rounds']
+                )
+                baseline = baseline or size
+                self.stdout.write(
+                    f'  {name:8} {size:>10,} bytes ({size / baseline:6.1%})   '
+                    f'render {render_ms:7.3f} ms   parse {parse_ms:7.3f} ms'
+                )
+
+    def _measure(self, data, renderer, parser, rounds):
+        body = renderer.render(data)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            renderer.render(data)
+        render_ms = (time.perf_counter() - start) * 1000 / rounds
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            parser.parse(io.BytesIO(body), parser.media_type, {})
+        parse_ms = (time.perf_counter() - start) * 1000 / rounds
+
+        return len(body), render_ms, parse_ms
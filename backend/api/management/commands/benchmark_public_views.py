@@ -0,0 +1,207 @@
+"""
+Django management command to load-test the sync and async public views
+Usage: python manage.py benchmark_public_views --concurrency 200 --requests 5000
+
+Drives the real WSGI and ASGI request handlers in-process (no sockets)
+against the configured database and reports requests per second and
+latency percentiles. The sync run serves requests on ``--threads`` worker
+threads, like a threaded WSGI worker; the async run serves them all on one
+event loop, like an ASGI worker. Latency includes time spent waiting for a
+free worker thread.
+
+Every request adds a unique query parameter so it misses the public stock
+cache; pass ``--cached`` to measure cache hits instead. ``--db-latency-ms``
+adds a blocking delay to each query to approximate a networked database,
+where async workers stand to gain the most.
+"""
+import asyncio
+import statistics
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import include, path
+
+from api import urls as api_urls
+
+ENDPOINTS = {
+    'blood-stock': '/api/v1/public/blood-stock/',
+    'hospitals': '/api/v1/public/hospitals/',
+    'map-data': '/api/v1/public/map-data/',
+    'priority-hospitals': '/api/v1/public/priority-hospitals/',
+}
+
+
+def _urlconf(patterns):
+    module = types.ModuleType('benchmark_public_urls')
+    module.urlpatterns = [path('api/', include(patterns))]
+    return module
+
+
+def _query_string(index, cached):
+    return b'' if cached else f'_={index}'.encode()
+
+
+def _wsgi_environ(url, query_string):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url,
+        'QUERY_STRING': query_string.decode(),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': BytesIO(),
+    }
+
+
+def _asgi_scope(url, query_string):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url,
+        'raw_path': url.encode(),
+        'query_string': query_string,
+        'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare requests/s and p99 latency of the sync and async public views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=200, help='Requests in flight at once')
+        parser.add_argument('--requests', type=int, default=5000, help='Requests per run')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads for the sync run')
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), action='append',
+                            help='Endpoint to benchmark (default: all)')
+        parser.add_argument('--mode', choices=['sync', 'async'], action='append',
+                            help='Implementation to run (default: both)')
+        parser.add_argument('--cached', action='store_true', help='Let requests hit the public stock cache')
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Blocking delay added to every query')
+
+    def handle(self, *args, **options):
+        endpoints = options['endpoint'] or sorted(ENDPOINTS)
+        modes = options['mode'] or ['sync', 'async']
+        latency = options['db_latency_ms'] / 1000
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def install_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(add_latency)
+
+        if latency:
+            connection_created.connect(install_latency, weak=False)
+
+        self.stdout.write(self.style.WARNING(
+            f"\nBenchmarking public views on '{connections['default'].vendor}': "
+            f"{options['requests']} requests, {options['concurrency']} in flight, "
+            f"{options['threads']} sync worker threads, "
+            f"{'cached' if options['cached'] else 'uncached'}, "
+            f"{options['db_latency_ms']:g} ms added per query\n"
+        ))
+        try:
+            for endpoint in endpoints:
+                self.stdout.write(self.style.SUCCESS(f'{endpoint}:'))
+                for mode in modes:
+                    patterns = (api_urls.async_public_stock_patterns if mode == 'async'
+                                else api_urls.sync_public_stock_patterns)
+                    with override_settings(ROOT_URLCONF=_urlconf(patterns)):
+                        run = self._run_async if mode == 'async' else self._run_sync
+                        result = run(ENDPOINTS[endpoint], options)
+                    self._report(mode, result)
+                self.stdout.write('')
+        finally:
+            connection_created.disconnect(install_latency)
+
+    def _run_sync(self, url, options):
+        application = get_wsgi_application()
+        workers = threading.BoundedSemaphore(options['threads'])
+        latencies, errors = [], []
+
+        def start_response(status, headers, exc_info=None):
+            if not status.startswith('200'):
+                errors.append(status)
+
+        def request(index):
+            started = time.perf_counter()
+            with workers:
+                environ = _wsgi_environ(url, _query_string(index, options['cached']))
+                response = application(environ, start_response)
+                b''.join(response)
+                response.close()
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as clients:
+            list(clients.map(request, range(options['requests'])))
+        return time.perf_counter() - started, latencies, errors
+
+    def _run_async(self, url, options):
+        application = get_asgi_application()
+        latencies, errors = [], []
+
+        async def request(index, slots):
+            async with slots:
+                started = time.perf_counter()
+                messages = []
+                body_sent = False
+                finished = asyncio.Event()
+
+                async def receive():
+                    nonlocal body_sent
+                    if not body_sent:
+                        body_sent = True
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                    # Django listens for a disconnect while the view runs
+                    await finished.wait()
+                    return {'type': 'http.disconnect'}
+
+                async def send(message):
+                    messages.append(message)
+                    if message['type'] == 'http.response.body' and not message.get('more_body'):
+                        finished.set()
+
+                scope = _asgi_scope(url, _query_string(index, options['cached']))
+                await application(scope, receive, send)
+                if messages[0]['status'] != 200:
+                    errors.append(messages[0]['status'])
+                latencies.append(time.perf_counter() - started)
+
+        async def run():
+            slots = asyncio.Semaphore(options['concurrency'])
+            await asyncio.gather(*(request(index, slots) for index in range(options['requests'])))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        return time.perf_counter() - started, latencies, errors
+
+    def _report(self, mode, result):
+        elapsed, latencies, errors = result
+        latencies_ms = sorted(t * 1000 for t in latencies)
+        p99 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.99))]
+        line = (
+            f'  {mode:5}  {len(latencies_ms) / elapsed:9.1f} req/s   '
+            f'p50 {statistics.median(latencies_ms):8.2f} ms   p99 {p99:8.2f} ms'
+        )
+        if errors:
+            line += self.style.ERROR(f'   errors: {len(errors)}')
+        self.stdout.write(line)
@@ -0,0 +1,173 @@
+"""
+Django management command to benchmark concurrent stock updates
+Usage: python manage.py benchmark_stock_updates --threads 8 --events 200
+
+Compares the legacy locked read-modify-write path against the
+single-statement update in api.stock_service, on the configured database.
+"""
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction as db_transaction
+from django.utils import timezone
+
+from api.authentication import hash_api_key
+from api.models import BLOOD_GROUP_CHOICES, BloodStock, Hospital, Transaction
+from api.stock_service import apply_stock_deltas, fold_stock_deltas, set_stock_level
+
+BENCH_HOSPITAL_CODE = 'BENCH-STOCK'
+INITIAL_UNITS = 1_000_000
+
+
+def _write_ledger(hospital, blood_group, change):
+    Transaction.objects.create(
+        hospital=hospital,
+        blood_group=blood_group,
+        units_change=change,
+        timestamp=timezone.now(),
+        notes='benchmark',
+    )
+
+
+def locked_update(hospital, blood_group, change):
+    """Legacy path: lock the row, clamp in Python, write it back."""
+    with db_transaction.atomic():
+        _write_ledger(hospital, blood_group, change)
+        lock_start = time.perf_counter()
+        stock, _ = BloodStock.objects.select_for_update().get_or_create(
+            hospital=hospital,
+            blood_group=blood_group,
+            defaults={'units_available': 0},
+        )
+        stock.units_available = max(0, stock.units_available + change)
+        stock.save()
+    return time.perf_counter() - lock_start
+
+
+def atomic_update(hospital, blood_group, change):
+    """Current path: one conditional UPDATE per key."""
+    folded = fold_stock_deltas([{'blood_group': blood_group, 'units_change': change}])
+    with db_transaction.atomic():
+        _write_ledger(hospital, blood_group, change)
+        lock_start = time.perf_counter()
+        apply_stock_deltas(hospital, folded)
+    return time.perf_counter() - lock_start
+
+
+STRATEGIES = {
+    'locked': locked_update,
+    'atomic': atomic_update,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark lock hold time and throughput of concurrent stock updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent writer threads')
+        parser.add_argument('--events', type=int, default=200, help='Events per thread')
+        parser.add_argument('--groups', type=int, default=8, help='Number of blood groups to spread events over')
+        parser.add_argument('--strategy', choices=sorted(STRATEGIES), action='append',
+                            help='Strategy to run (default: all)')
+
+    def handle(self, *args, **options):
+        groups = [code for code, _ in BLOOD_GROUP_CHOICES][:max(1, options['groups'])]
+        strategies = options['strategy'] or ['locked', 'atomic']
+
+        self.stdout.write(self.style.WARNING(
+            f"\nBenchmarking stock updates on '{connections['default'].vendor}': "
+            f"{options['threads']} threads x {options['events']} events over {len(groups)} groups\n"
+        ))
+
+        for name in strategies:
+            hospital = self._setup(groups)
+            try:
+                result = self._run(STRATEGIES[name], hospital, groups, options['threads'], options['events'])
+                self._report(name, result, hospital, groups)
+            finally:
+                Hospital.objects.filter(pk=hospital.pk).delete()
+
+    def _setup(self, groups):
+        Hospital.objects.filter(code=BENCH_HOSPITAL_CODE).delete()
+        hospital = Hospital.objects.create(
+            code=BENCH_HOSPITAL_CODE,
+            name='Benchmark Hospital',
+            api_key_hash=hash_api_key(BENCH_HOSPITAL_CODE),
+            is_active=False,
+        )
+        for blood_group in groups:
+            set_stock_level(hospital, blood_group, INITIAL_UNITS)
+        return hospital
+
+    def _run(self, update, hospital, groups, thread_count, events):
+        hold_times = []
+        applied = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local_holds, local_applied, local_errors = [], [], 0
+            try:
+                for _ in range(events):
+                    blood_group = rng.choice(groups)
+                    change = rng.choice([-2, -1, 1, 2, 3])
+                    for _attempt in range(50):
+                        try:
+                            local_holds.append(update(hospital, blood_group, change))
+                            local_applied.append((blood_group, change))
+                            break
+                        except OperationalError:
+                            # SQLite reports lock upgrades as "database is locked"
+                            local_errors += 1
+                            time.sleep(0.001)
+            finally:
+                connections.close_all()
+            with lock:
+                hold_times.extend(local_holds)
+                applied.extend(local_applied)
+                errors.append(local_errors)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'elapsed': elapsed,
+            'hold_times': hold_times,
+            'applied': applied,
+            'retries': sum(errors),
+        }
+
+    def _report(self, name, result, hospital, groups):
+        holds_ms = sorted(t * 1000 for t in result['hold_times'])
+        count = len(result['applied'])
+
+        expected = {blood_group: INITIAL_UNITS for blood_group in groups}
+        for blood_group, change in result['applied']:
+            expected[blood_group] += change
+        actual = dict(
+            BloodStock.objects.filter(hospital=hospital).values_list('blood_group', 'units_available')
+        )
+        lost = sum(abs(expected[g] - actual.get(g, 0)) for g in groups)
+
+        self.stdout.write(self.style.SUCCESS(f'{name}:'))
+        self.stdout.write(f'  events applied:      {count}')
+        self.stdout.write(f'  throughput:          {count / result["elapsed"]:.1f} events/s')
+        if holds_ms:
+            p99 = holds_ms[min(len(holds_ms) - 1, int(len(holds_ms) * 0.99))]
+            self.stdout.write(f'  lock hold mean:      {statistics.mean(holds_ms):.3f} ms')
+            self.stdout.write(f'  lock hold p50 / p99: {statistics.median(holds_ms):.3f} / {p99:.3f} ms')
+        self.stdout.write(f'  lock retries:        {result["retries"]}')
+        if lost:
+            self.stdout.write(self.style.ERROR(f'  lost units:          {lost}'))
+        else:
+            self.stdout.write('  lost units:          0')
+        self.stdout.write('')
@@ -0,0 +1,68 @@
+"""
+Django management command to import a hospital LIS export into the ledger
+Usage: python manage.py import_transactions --hospital HSP-001 export.csv [--file-format ndjson]
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.file_import import (
+    DEFAULT_CHUNK_SIZE, FILE_FORMATS, detect_format, import_transactions,
+)
+from api.models import Hospital
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or NDJSON transaction export into the ledger and blood stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the export file')
+        parser.add_argument('--hospital', required=True, help='Hospital code the rows belong to')
+        parser.add_argument('--file-format', choices=FILE_FORMATS,
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows applied per database transaction')
+        parser.add_argument('--errors-out', help='Write the row-level error report to this JSON file')
+
+    def handle(self, *args, **options):
+        try:
+            hospital = Hospital.objects.get(code=options['hospital'], is_active=True)
+        except Hospital.DoesNotExist:
+            raise CommandError(f"Active hospital '{options['hospital']}' not found")
+
+        file_format = options['file_format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot detect file format; pass --file-format')
+
+        with open(options['path'], 'rb') as stream:
+            report = import_transactions(
+                hospital,
+                stream,
+                file_format,
+                chunk_size=options['chunk_size'],
+                max_reported_errors=1_000_000 if options['errors_out'] else 20,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['ingested']} transactions for {hospital.code} "
+            f"in {report['elapsed_seconds']}s ({report['chunks']} chunks)"
+        ))
+        self.stdout.write(f"  rows read:   {report['rows']}")
+        self.stdout.write(f"  duplicates:  {report['duplicates']}")
+        self.stdout.write(f"  invalid:     {report['invalid']}")
+
+        if options['errors_out']:
+            with open(options['errors_out'], 'w') as out:
+                json.dump(report['errors'], out, indent=2)
+            self.stdout.write(f"  error report written to {options['errors_out']}")
+        else:
+            for error in report['errors']:
+                self.stdout.write(self.style.WARNING(f"  line {error['line']}: {error['errors']}"))
+            if report['errors_truncated']:
+                self.stdout.write('  ... more errors omitted; use --errors-out for the full report')
+
+        if report['stopped']:
+            raise CommandError(
+                f"Stopped at line {report['stopped']['line']}: {report['stopped']['error']} "
+                f"({report['ingested']} transactions before it were imported)"
+            )
@@ -0,0 +1,60 @@
+"""
+Django management command to plan inter-hospital blood transfers
+Usage: python manage.py plan_transfers [--blood-group O-] [--product whole_blood] [--max-km 200] [--json]
+
+Solves the network-wide transfer plan of api.transfers: units above the
+safety level at surplus hospitals are moved to hospitals below the
+low-stock threshold, most urgent shortages first, shortest routes first.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import BLOOD_GROUP_CHOICES, BLOOD_PRODUCT_CHOICES
+from api.transfers import SHORTAGE_LEVELS, plan_transfers
+
+
+class Command(BaseCommand):
+    help = 'Plan transfers from surplus to shortage hospitals across the country'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blood-group', choices=[code for code, _ in BLOOD_GROUP_CHOICES],
+                            action='append', help='Blood group to plan (repeatable; default all)')
+        parser.add_argument('--product', choices=[code for code, _ in BLOOD_PRODUCT_CHOICES],
+                            action='append', help='Blood product type to plan (repeatable; default all)')
+        parser.add_argument('--max-km', type=float, help='Longest transfer in kilometres')
+        parser.add_argument('--safety-units', type=int,
+                            help='Units a supplier keeps (default TRANSFER_SAFETY_UNITS)')
+        parser.add_argument('--json', action='store_true', help='Print the full plan as JSON')
+
+    def handle(self, *args, **options):
+        low = SHORTAGE_LEVELS[-1][1]
+        if options['safety_units'] is not None and options['safety_units'] < low:
+            raise CommandError(f'--safety-units must be at least {low}')
+
+        plan = plan_transfers(
+            blood_groups=options['blood_group'],
+            products=options['product'],
+            max_km=options['max_km'],
+            safety_units=options['safety_units'],
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(plan, indent=2))
+            return
+
+        for transfer in plan['transfers']:
+            self.stdout.write(
+                f"{transfer['blood_group']:>3} {transfer['blood_product_type']:<16} "
+                f"{transfer['units']:>4} units  {transfer['from']['code']} ({transfer['from']['city']}) -> "
+                f"{transfer['to']['code']} ({transfer['to']['city']})  {transfer['distance_km']} km"
+            )
+        for row in plan['summary']:
+            still_short = ', '.join(f'{level} {count}' for level, count in row['still_short'].items())
+            self.stdout.write(
+                f"{row['blood_group']:>3} {row['blood_product_type']:<16} "
+                f"{row['transferred_units']}/{row['shortage_units']} units short filled from "
+                f"{row['spare_units']} spare, {row['unit_km']} unit-km; still short: {still_short}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Planned {len(plan['transfers'])} transfers in {plan['solve_ms']} ms"
+        ))
@@ -0,0 +1,27 @@
+"""
+Django management command to prune the stock change log
+Usage: python manage.py prune_stock_changes [--days 7]
+
+Deletes delta-sync log entries older than the retention period. Mirrors
+whose cursor falls before the retained log get 410 from
+/api/v1/stock/changes/ and resync from /api/stock/.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.stock_changes import prune_stock_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete stock change log entries older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.STOCK_CHANGES_RETENTION_DAYS,
+                            help='Days of changes to keep')
+
+    def handle(self, *args, **options):
+        deleted = prune_stock_changes(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} stock change entries'))
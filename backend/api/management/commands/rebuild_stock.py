@@ -0,0 +1,143 @@
+"""
+Django management command to rebuild BloodStock from the Transaction ledger
+Usage: python manage.py rebuild_stock [--fix] [--full] [--as-of 2026-01-27T10:00:00Z]
+
+Streams the ledger from the newest checkpoint, reports drift against the
+materialized BloodStock rows and optionally corrects it. Events ingested
+while the replay runs show up in the report; --fix locks the drifted
+hospitals' stock, replays the ledger rows committed since, and applies the
+remaining difference as a delta, so it does not undo them. --fix leaves
+stock with no ledger rows (written around the stock service) alone, since
+the ledger has no opening balance to rebuild it from.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.ledger import (
+    DEFAULT_CHUNK_SIZE, load_checkpoint, prune_checkpoints, replay_ledger, stock_as_of, stock_drift,
+)
+from api.models import BloodStock, Hospital
+from api.stock_service import apply_stock_deltas, fold_stock_deltas
+
+# Rows newer than this may still belong to open transactions; never checkpoint them.
+CHECKPOINT_SAFETY_MARGIN = timedelta(minutes=1)
+
+
+class Command(BaseCommand):
+    help = 'Replay the transaction ledger to verify (and optionally fix) materialized blood stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Ledger rows fetched per round trip')
+        parser.add_argument('--checkpoint-every', type=int, default=100000,
+                            help='Write a checkpoint after this many replayed rows (0 disables)')
+        parser.add_argument('--keep-checkpoints', type=int, default=3,
+                            help='Checkpoint snapshots to keep; older ones are deleted')
+        parser.add_argument('--full', action='store_true',
+                            help='Ignore existing checkpoints and replay the whole ledger')
+        parser.add_argument('--fix', action='store_true',
+                            help='Correct drifted BloodStock rows to the ledger value')
+        parser.add_argument('--as-of', help='Print ledger-derived stock at this ISO datetime and exit')
+        parser.add_argument('--limit', type=int, default=50, help='Maximum drift rows to print')
+
+    def handle(self, *args, **options):
+        if options['keep_checkpoints'] < 1:
+            raise CommandError('--keep-checkpoints must be at least 1')
+        if options['as_of']:
+            self._print_as_of(options['as_of'], options['chunk_size'])
+            return
+
+        started = timezone.now()
+        cursor, states = (None, {}) if options['full'] else load_checkpoint()
+        if cursor:
+            self.stdout.write(f'Resuming from checkpoint at {cursor.as_of.isoformat()} ({len(states)} keys)')
+        else:
+            self.stdout.write('Replaying full ledger')
+
+        replayed, last_cursor, checkpoints = replay_ledger(
+            states,
+            cursor=cursor,
+            chunk_size=options['chunk_size'],
+            checkpoint_every=options['checkpoint_every'] or None,
+            checkpoint_before=started - CHECKPOINT_SAFETY_MARGIN,
+        )
+        pruned = prune_checkpoints(options['keep_checkpoints']) if checkpoints else 0
+        self.stdout.write(
+            f'Replayed {replayed} ledger rows in {(timezone.now() - started).total_seconds():.2f}s, '
+            f'wrote {checkpoints} checkpoint(s), pruned {pruned} old checkpoint row(s)'
+        )
+
+        drift = stock_drift(states)
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('BloodStock matches the ledger'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'{len(drift)} stock row(s) drift from the ledger:'))
+        for row in drift[:options['limit']]:
+            self.stdout.write(
+                f"  {row['hospital_code']} {row['blood_group']} {row['blood_product_type']}: "
+                f"stock={row['stock_units']} ledger={row['ledger_units']}"
+                + ('' if row['in_ledger'] else ' (no ledger rows)')
+            )
+        if len(drift) > options['limit']:
+            self.stdout.write(f'  ... and {len(drift) - options["limit"]} more')
+
+        if options['fix']:
+            self._fix(drift, states, last_cursor, options['chunk_size'])
+
+    def _fix(self, drift, states, cursor, chunk_size):
+        unbacked = [row for row in drift if not row['in_ledger']]
+        keys = {(row['hospital_id'], row['blood_group'], row['blood_product_type'])
+                for row in drift if row['in_ledger']}
+        hospitals = Hospital.objects.in_bulk({hospital_id for hospital_id, _, _ in keys})
+        fixed = 0
+        with db_transaction.atomic():
+            # Lock the stock first (in the ingest path's key order), then catch
+            # up with ledger rows committed since the replay: the delta is
+            # taken against the stock it is applied to.
+            current = {
+                (hospital_id, group, product): units
+                for hospital_id, group, product, units in BloodStock.objects.select_for_update()
+                .filter(hospital_id__in=hospitals)
+                .order_by('hospital_id', 'blood_group', 'blood_product_type')
+                .values_list('hospital_id', 'blood_group', 'blood_product_type', 'units_available')
+            }
+            replay_ledger(states, cursor=cursor, chunk_size=chunk_size)
+            changes = defaultdict(list)
+            for hospital_id, group, product in sorted(keys):
+                delta = states.get((hospital_id, group, product), 0) - current.get((hospital_id, group, product), 0)
+                if delta:
+                    changes[hospital_id].append(
+                        {'blood_group': group, 'blood_product_type': product, 'units_change': delta}
+                    )
+            for hospital_id, items in changes.items():
+                apply_stock_deltas(hospitals[hospital_id], fold_stock_deltas(items))
+                fixed += len(items)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} stock row(s)'))
+        if unbacked:
+            self.stdout.write(self.style.WARNING(
+                f'Left {len(unbacked)} stock row(s) with no ledger rows unchanged'
+            ))
+
+    def _print_as_of(self, value, chunk_size):
+        try:
+            at = parse_datetime(value)
+        except ValueError:
+            at = None
+        if at is None:
+            raise CommandError(f'Invalid --as-of datetime: {value}')
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+
+        states = stock_as_of(at, chunk_size=chunk_size)
+        codes = dict(Hospital.objects.filter(id__in={key[0] for key in states}).values_list('id', 'code'))
+        self.stdout.write(f'Ledger-derived stock as of {at.isoformat()}:')
+        for (hospital_id, group, product), units in sorted(
+            states.items(), key=lambda item: (codes.get(item[0][0], ''), item[0][1], item[0][2])
+        ):
+            self.stdout.write(f'  {codes.get(hospital_id, hospital_id)} {group} {product}: {units}')
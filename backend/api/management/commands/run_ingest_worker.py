@@ -0,0 +1,56 @@
+"""
+Django management command to drain the asynchronous ingest queue
+Usage: python manage.py run_ingest_worker [--batch-size 500] [--interval 1.0] [--once]
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.ingest import apply_queued_batch, ingest_queue_stats
+from api.models import IngestQueueItem
+
+
+class Command(BaseCommand):
+    help = 'Apply queued hospital ingest events to the ledger and stock in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Queue items applied per transaction')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--retain-hours', type=float, default=24.0,
+                            help='Delete applied queue items older than this many hours')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write(self.style.SUCCESS(f'Ingest worker started (batch size {batch_size})'))
+
+        try:
+            while True:
+                summary = apply_queued_batch(batch_size)
+                processed = sum(summary.values())
+
+                if processed:
+                    stats = ingest_queue_stats()
+                    lag = stats['last_apply_lag_seconds']
+                    self.stdout.write(
+                        f"[{stats['timestamp']}] applied={summary['applied']} "
+                        f"duplicates={summary['duplicates']} retrying={summary['retrying']} failed={summary['failed']} "
+                        f"depth={stats['depth']} lag={'n/a' if lag is None else f'{lag:.3f}s'}"
+                    )
+                    # Items left pending for a retry are claimed again first, so
+                    # only go straight on when the whole batch left the queue.
+                    if processed == batch_size and not summary['retrying']:
+                        continue
+
+                self._purge_applied(options['retain_hours'])
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Ingest worker stopped'))
+
+    def _purge_applied(self, retain_hours):
+        cutoff = timezone.now() - timedelta(hours=retain_hours)
+        IngestQueueItem.objects.filter(status='applied', applied_at__lt=cutoff).delete()
@@ -6,13 +6,13 @@ from api.models import (
     BloodBank,
     StoreItem,
     Hospital,
-    BloodStock,
     BLOOD_GROUP_CHOICES,
     BLOOD_PRODUCT_CHOICES,
 )
 import random
 import uuid
 from api.authentication import hash_api_key
+from api.stock_service import set_stock_level
 
 
 class Command(BaseCommand):
@@ -144,12 +144,7 @@ class Command(BaseCommand):
             for blood_group, _ in BLOOD_GROUP_CHOICES:
                 for blood_product, _ in BLOOD_PRODUCT_CHOICES:
                     units = random.randint(0, 50)  # Random units available
-                    BloodStock.objects.update_or_create(
-                        hospital=hospital,
-                        blood_group=blood_group,
-                        blood_product_type=blood_product,
-                        defaults={'units_available': units}
-                    )
+                    set_stock_level(hospital, blood_group, units, blood_product_type=blood_product)
                     self.stdout.write(f"  {hospital.name} - {blood_group} {blood_product}: {units} units")
 
         # Create store items
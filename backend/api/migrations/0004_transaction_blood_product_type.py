@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_donorprofile_referral_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='blood_product_type',
+            field=models.CharField(choices=[('whole_blood', 'Whole Blood'), ('plasma', 'Plasma'), ('platelets', 'Platelets')], default='whole_blood', max_length=20),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:07
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rekey_duplicate_references(apps, schema_editor):
+    """
+    Give retried duplicates already in the ledger a distinct reference.
+
+    The first transaction (by ingested_at, id) keeps the reference; later
+    copies are kept, since stock already counts them, and become
+    ``<reference>~dup<n>`` so the unique constraint can be added.
+    """
+    Transaction = apps.get_model('api', 'Transaction')
+    max_length = Transaction._meta.get_field('source_reference').max_length
+
+    duplicated = (
+        Transaction.objects.exclude(source_reference='').order_by('hospital_id')
+        .values('hospital_id', 'source_reference').annotate(copies=Count('id')).filter(copies__gt=1)
+    )
+    hospital_id = taken = None
+    for key in list(duplicated):
+        if key['hospital_id'] != hospital_id:
+            # One hospital's references at a time, kept current as keys are rewritten.
+            hospital_id = key['hospital_id']
+            taken = set(
+                Transaction.objects.filter(hospital_id=hospital_id)
+                .exclude(source_reference='').values_list('source_reference', flat=True)
+            )
+        copies = Transaction.objects.filter(
+            hospital_id=hospital_id, source_reference=key['source_reference']
+        ).order_by('ingested_at', 'id')
+        number = 0
+        for transaction in list(copies)[1:]:
+            while True:
+                number += 1
+                suffix = f'~dup{number}'
+                reference = key['source_reference'][:max_length - len(suffix)] + suffix
+                if reference not in taken:
+                    break
+            taken.add(reference)
+            transaction.source_reference = reference
+            transaction.save(update_fields=['source_reference'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_transaction_blood_product_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_duplicate_references, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('source_reference', ''), _negated=True), fields=('hospital', 'source_reference'), name='uniq_transaction_hospital_source_ref'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_ingestqueueitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('blood_product_type', models.CharField(choices=[('whole_blood', 'Whole Blood'), ('plasma', 'Plasma'), ('platelets', 'Platelets')], default='whole_blood', max_length=20)),
+                ('units', models.IntegerField()),
+                ('as_of', models.DateTimeField(help_text='ingested_at of the last ledger row covered')),
+                ('last_transaction_id', models.UUIDField(help_text='Ledger cursor tie-breaker within as_of')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='api.hospital')),
+            ],
+            options={
+                'ordering': ['-as_of'],
+                'indexes': [models.Index(fields=['as_of', 'last_transaction_id'], name='stockcheckpoint_cursor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_stockcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donorprofile',
+            index=models.Index(fields=['blood_group', 'location_consent'], name='donor_group_consent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hospitalreq',
+            index=models.Index(condition=models.Q(('fulfilled', False)), fields=['-is_critical', '-created_at'], name='hospitalreq_open_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(condition=models.Q(('resolved_at__isnull', True)), fields=['hospital', 'blood_group'], name='stockalert_open_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['ingested_at', 'id'], name='transaction_ingested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['hospital', 'ingested_at'], name='transaction_hosp_ingested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp', 'units_change'], name='transaction_ts_units_idx'),
+        ),
+    ]
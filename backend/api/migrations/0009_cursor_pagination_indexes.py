@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_hosp_ingested_idx',
+        ),
+        migrations.AddIndex(
+            model_name='smsnotificationlog',
+            index=models.Index(fields=['sent_at', 'id'], name='smslog_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['triggered_at', 'id'], name='stockalert_triggered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['hospital', 'ingested_at', 'id'], name='transaction_hosp_ingested_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='ingest_burst',
+            field=models.PositiveIntegerField(blank=True, help_text='Events that may arrive at once after an idle period (blank: INGEST_THROTTLE_BURST)', null=True),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='ingest_rate_per_minute',
+            field=models.PositiveIntegerField(blank=True, help_text='Sustained ingest events per minute (blank: INGEST_THROTTLE_RATE, 0: unlimited)', null=True),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:25
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Sum
+
+GROUP_FIELDS = {
+    'A+': 'units_a_pos', 'A-': 'units_a_neg', 'B+': 'units_b_pos', 'B-': 'units_b_neg',
+    'AB+': 'units_ab_pos', 'AB-': 'units_ab_neg', 'O+': 'units_o_pos', 'O-': 'units_o_neg',
+}
+
+
+def build_snapshots(apps, schema_editor):
+    Hospital = apps.get_model('api', 'Hospital')
+    BloodStock = apps.get_model('api', 'BloodStock')
+    HospitalStockSnapshot = apps.get_model('api', 'HospitalStockSnapshot')
+
+    stock = defaultdict(list)
+    rows = (
+        BloodStock.objects.order_by()
+        .values('hospital_id', 'blood_group')
+        .annotate(units=Sum('units_available'), updated=Max('updated_at'))
+    )
+    for row in rows:
+        stock[row['hospital_id']].append(row)
+
+    snapshots = []
+    for hospital in Hospital.objects.all():
+        fields = {field: 0 for field in GROUP_FIELDS.values()}
+        group_updated_at = {}
+        updated = [row['updated'] for row in stock[hospital.id] if row['blood_group'] in GROUP_FIELDS]
+        for row in stock[hospital.id]:
+            if row['blood_group'] in GROUP_FIELDS:
+                fields[GROUP_FIELDS[row['blood_group']]] = row['units']
+                group_updated_at[row['blood_group']] = row['updated'].isoformat()
+        snapshots.append(HospitalStockSnapshot(
+            hospital=hospital,
+            code=hospital.code,
+            name=hospital.name,
+            city=hospital.city,
+            address=hospital.address,
+            latitude=float(hospital.latitude) if hospital.latitude is not None else None,
+            longitude=float(hospital.longitude) if hospital.longitude is not None else None,
+            is_active=hospital.is_active,
+            total_units=sum(fields.values()),
+            group_updated_at=group_updated_at,
+            last_updated=max(updated) if updated else None,
+            **fields,
+        ))
+    HospitalStockSnapshot.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_hospital_ingest_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HospitalStockSnapshot',
+            fields=[
+                ('hospital', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_snapshot', serialize=False, to='api.hospital')),
+                ('code', models.CharField(max_length=50)),
+                ('name', models.CharField(max_length=200)),
+                ('city', models.CharField(max_length=100)),
+                ('address', models.TextField(blank=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('units_a_pos', models.IntegerField(default=0)),
+                ('units_a_neg', models.IntegerField(default=0)),
+                ('units_b_pos', models.IntegerField(default=0)),
+                ('units_b_neg', models.IntegerField(default=0)),
+                ('units_ab_pos', models.IntegerField(default=0)),
+                ('units_ab_neg', models.IntegerField(default=0)),
+                ('units_o_pos', models.IntegerField(default=0)),
+                ('units_o_neg', models.IntegerField(default=0)),
+                ('total_units', models.IntegerField(default=0)),
+                ('group_updated_at', models.JSONField(blank=True, default=dict)),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['name'],
+                'indexes': [models.Index(fields=['is_active', 'city'], name='stocksnapshot_active_city_idx')],
+            },
+        ),
+        migrations.RunPython(build_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:39
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def build_aggregates(apps, schema_editor):
+    BloodStock = apps.get_model('api', 'BloodStock')
+    StockAggregate = apps.get_model('api', 'StockAggregate')
+
+    rows = (
+        BloodStock.objects.filter(hospital__is_active=True).order_by()
+        .values('hospital__city', 'blood_group', 'blood_product_type')
+        .annotate(units=Sum('units_available'), hospitals=Count('id'), updated=Max('updated_at'))
+    )
+    StockAggregate.objects.bulk_create([
+        StockAggregate(
+            city=row['hospital__city'],
+            blood_group=row['blood_group'],
+            blood_product_type=row['blood_product_type'],
+            units_available=row['units'],
+            hospital_count=row['hospitals'],
+            last_updated=row['updated'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_stock_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('blood_product_type', models.CharField(choices=[('whole_blood', 'Whole Blood'), ('plasma', 'Plasma'), ('platelets', 'Platelets')], default='whole_blood', max_length=20)),
+                ('units_available', models.IntegerField(default=0)),
+                ('hospital_count', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['city', 'blood_group'],
+                'unique_together': {('city', 'blood_group', 'blood_product_type')},
+            },
+        ),
+        migrations.RunPython(build_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+FTS_TABLE = 'api_searchdocument_fts'
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, city, address,
+        content='api_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER api_searchdocument_fts_insert AFTER INSERT ON api_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, city, address) VALUES (new.id, new.title, new.city, new.address);
+    END""",
+    f"""CREATE TRIGGER api_searchdocument_fts_delete AFTER DELETE ON api_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, city, address)
+        VALUES ('delete', old.id, old.title, old.city, old.address);
+    END""",
+    f"""CREATE TRIGGER api_searchdocument_fts_update AFTER UPDATE ON api_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, city, address)
+        VALUES ('delete', old.id, old.title, old.city, old.address);
+        INSERT INTO {FTS_TABLE}(rowid, title, city, address) VALUES (new.id, new.title, new.city, new.address);
+    END""",
+]
+SQLITE_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_update',
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_delete',
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_insert',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+# Must match api.search.PG_SEARCH_VECTOR for the planner to use the index.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(address, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                # Search falls back to substring matching.
+                return
+        for sql in SQLITE_INDEX_SQL:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX searchdocument_vector_idx ON api_searchdocument USING gin (({PG_SEARCH_VECTOR}))'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_DROP_SQL:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS searchdocument_vector_idx')
+
+
+def build_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('api', 'SearchDocument')
+    sources = [
+        ('hospital', apps.get_model('api', 'Hospital'),
+         lambda h: (h.name, h.city, h.address, h.is_active)),
+        ('hospital_request', apps.get_model('api', 'HospitalReq'),
+         lambda r: (r.hospital_name, r.district, r.address, not r.fulfilled)),
+        ('blood_bank', apps.get_model('api', 'BloodBank'),
+         lambda b: (b.name, b.district, b.address, True)),
+        ('drive', apps.get_model('api', 'DonationDrive'),
+         lambda d: (d.title, d.city, d.location, d.status in ('planned', 'active'))),
+    ]
+    for kind, model, fields in sources:
+        documents = []
+        for instance in model.objects.order_by().iterator(chunk_size=2000):
+            title, city, address, is_active = fields(instance)
+            documents.append(SearchDocument(
+                kind=kind, object_id=str(instance.pk), title=title, city=city,
+                address=address, is_active=is_active,
+            ))
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_stock_aggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('hospital', 'Hospital'), ('hospital_request', 'Hospital Request'), ('blood_bank', 'Blood Bank'), ('drive', 'Donation Drive')], max_length=20)),
+                ('object_id', models.CharField(max_length=64)),
+                ('title', models.CharField(max_length=200)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('address', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
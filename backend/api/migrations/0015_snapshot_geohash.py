@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+from api.geo import encode_geohash
+
+
+def fill_geohashes(apps, schema_editor):
+    HospitalStockSnapshot = apps.get_model('api', 'HospitalStockSnapshot')
+
+    snapshots = list(HospitalStockSnapshot.objects.filter(latitude__isnull=False, longitude__isnull=False))
+    for snapshot in snapshots:
+        snapshot.geohash = encode_geohash(snapshot.latitude, snapshot.longitude)
+    HospitalStockSnapshot.objects.bulk_update(snapshots, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospitalstocksnapshot',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='hospitalstocksnapshot',
+            index=models.Index(fields=['geohash'], name='stocksnapshot_geohash_idx'),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_snapshot_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestqueueitem',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Apply attempts that raised a database error'),
+        ),
+    ]
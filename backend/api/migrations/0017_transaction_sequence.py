@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_ingestqueueitem_attempts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockcheckpoint',
+            name='stockcheckpoint_cursor_idx',
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='last_sequence',
+            field=models.PositiveIntegerField(default=0, help_text='sequence of the last ledger row covered'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Position in its ingest batch; orders ledger rows ingested at the same instant'),
+        ),
+        migrations.AddIndex(
+            model_name='stockcheckpoint',
+            index=models.Index(fields=['as_of', 'last_sequence', 'last_transaction_id'], name='stockcheckpoint_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['ingested_at', 'sequence', 'id'], name='transaction_replay_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:55
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def write_opening_balances(apps, schema_editor):
+    """
+    Back stock that predates the ledger with an opening-balance row.
+
+    Seeded and hand-set stock used to be written with no ledger row, so a
+    replay of the ledger undercounted it. Each stock key whose replayed
+    ledger (same zero clamp as ingest) differs from its BloodStock row gets
+    one adjustment row for the difference, ingested now, so replaying the
+    ledger from here on reproduces the current stock.
+    """
+    Transaction = apps.get_model('api', 'Transaction')
+    BloodStock = apps.get_model('api', 'BloodStock')
+
+    replayed = {}
+    ledger = Transaction.objects.order_by('ingested_at', 'sequence', 'id').values_list(
+        'hospital_id', 'blood_group', 'blood_product_type', 'units_change'
+    )
+    for hospital_id, group, product, change in ledger.iterator(chunk_size=5000):
+        key = (hospital_id, group, product)
+        replayed[key] = max(0, replayed.get(key, 0) + change)
+
+    now = timezone.now()
+    rows = []
+    stock = BloodStock.objects.order_by().values_list(
+        'hospital_id', 'blood_group', 'blood_product_type', 'units_available'
+    )
+    for hospital_id, group, product, units in stock.iterator(chunk_size=5000):
+        difference = units - replayed.get((hospital_id, group, product), 0)
+        if difference:
+            rows.append(Transaction(
+                hospital_id=hospital_id,
+                blood_group=group,
+                blood_product_type=product,
+                units_change=difference,
+                timestamp=now,
+                sequence=len(rows),
+                notes='Opening balance',
+                is_adjustment=True,
+            ))
+    Transaction.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_transaction_sequence'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_ts_units_idx',
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='is_adjustment',
+            field=models.BooleanField(default=False, help_text='Stock set by hand or an opening balance, not a donation or issue'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp', 'units_change', 'is_adjustment'], name='transaction_ts_units_idx'),
+        ),
+        migrations.RunPython(write_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 03:03
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_transaction_adjustments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('file_format', models.CharField(max_length=10)),
+                ('report', models.JSONField(default=dict, help_text='Parse and validation report of the upload')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_imports', to='api.hospital')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ingestqueueitem',
+            name='import_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queue_items', to='api.fileimportjob'),
+        ),
+    ]
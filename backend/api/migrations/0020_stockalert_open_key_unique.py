@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 03:14
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def resolve_duplicate_open_alerts(apps, schema_editor):
+    """Keep the newest open alert per (hospital, blood group) and resolve the rest."""
+    StockAlert = apps.get_model('api', 'StockAlert')
+    seen = set()
+    duplicates = []
+    open_alerts = StockAlert.objects.filter(resolved_at__isnull=True).order_by(
+        'hospital_id', 'blood_group', '-triggered_at', '-id'
+    ).values_list('id', 'hospital_id', 'blood_group')
+    for pk, hospital_id, blood_group in open_alerts.iterator(chunk_size=5000):
+        if (hospital_id, blood_group) in seen:
+            duplicates.append(pk)
+        seen.add((hospital_id, blood_group))
+    now = timezone.now()
+    for start in range(0, len(duplicates), 500):
+        StockAlert.objects.filter(pk__in=duplicates[start:start + 500]).update(resolved_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_file_import_job'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockalert',
+            name='stockalert_open_key_idx',
+        ),
+        migrations.RunPython(resolve_duplicate_open_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('hospital', 'blood_group'), name='stockalert_open_key_uniq'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.dispatch import Signal
 from django.utils import timezone
 import uuid
 import random
@@ -127,6 +128,12 @@ class DonorProfile(models.Model):
     location_verified_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Donor matching filters on blood group + consent
+            models.Index(fields=['blood_group', 'location_consent'], name='donor_group_consent_idx'),
+        ]
+    
     def can_donate(self):
         """Check if donor can donate (56 days have passed since last donation)"""
         if not self.last_donation_date:
@@ -244,6 +251,16 @@ class HospitalReq(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     fulfilled = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Open requests listing: critical first, newest first
+            models.Index(
+                fields=['-is_critical', '-created_at'],
+                condition=models.Q(fulfilled=False),
+                name='hospitalreq_open_priority_idx',
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.hospital_name} - {self.blood_type_needed}"
 
@@ -470,6 +487,23 @@ class MedicineRedemption(models.Model):
         return f"{self.donor.user.username} - {self.medicine_reward.name}"
 
 
+# Sent after a queryset update() of hospitals (bulk_update included), which
+# skips post_save, with the updated ``cities`` as {pk: city before the update};
+# receivers drop cached state and refresh the read models as post_save does.
+hospitals_updated = Signal()
+
+
+class HospitalQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Read before the update, which may move rows out of this filter.
+        cities = dict(self.order_by().values_list('pk', 'city'))
+        rows = super().update(**kwargs)
+        hospitals_updated.send(sender=self.model, cities=cities)
+        return rows
+
+    update.alters_data = True
+
+
 class Hospital(models.Model):
     """Registered hospital/blood bank that sends automated events."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -481,9 +515,19 @@ class Hospital(models.Model):
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     api_key_hash = models.CharField(max_length=128)
     is_active = models.BooleanField(default=True)
+    ingest_rate_per_minute = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Sustained ingest events per minute (blank: INGEST_THROTTLE_RATE, 0: unlimited)",
+    )
+    ingest_burst = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Events that may arrive at once after an idle period (blank: INGEST_THROTTLE_BURST)",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = HospitalQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Hospital"
         verbose_name_plural = "Hospitals"
@@ -497,19 +541,92 @@ class Transaction(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='transactions')
     blood_group = models.CharField(max_length=3, choices=BLOOD_GROUP_CHOICES)
+    blood_product_type = models.CharField(max_length=20, choices=BLOOD_PRODUCT_CHOICES, default='whole_blood')
     units_change = models.IntegerField(help_text="Positive for donation received, negative for units issued")
     timestamp = models.DateTimeField()
     ingested_at = models.DateTimeField(auto_now_add=True)
+    sequence = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Position in its ingest batch; orders ledger rows ingested at the same instant",
+    )
     source_reference = models.CharField(max_length=100, blank=True)
     notes = models.CharField(max_length=255, blank=True)
+    is_adjustment = models.BooleanField(
+        default=False,
+        help_text="Stock set by hand or an opening balance, not a donation or issue",
+    )
 
     class Meta:
         ordering = ['-ingested_at']
+        indexes = [
+            # Ledger ordering and replay cursor
+            models.Index(fields=['ingested_at', 'id'], name='transaction_ingested_idx'),
+            # Ledger replay order (api.ledger)
+            models.Index(fields=['ingested_at', 'sequence', 'id'], name='transaction_replay_idx'),
+            # Per-hospital ledger listing (cursor pagination key)
+            models.Index(fields=['hospital', 'ingested_at', 'id'], name='transaction_hosp_ingested_idx'),
+            # Analytics range sums over event time (adjustments excluded)
+            models.Index(fields=['timestamp', 'units_change', 'is_adjustment'], name='transaction_ts_units_idx'),
+        ]
+        constraints = [
+            # Idempotency key for hospital retries; blank references are not deduplicated.
+            models.UniqueConstraint(
+                fields=['hospital', 'source_reference'],
+                condition=~models.Q(source_reference=''),
+                name='uniq_transaction_hospital_source_ref',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.hospital.code} {self.blood_group} {self.units_change}"
 
 
+class FileImportJob(models.Model):
+    """An uploaded export whose rows were handed to the ingest queue."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='file_imports')
+    file_name = models.CharField(max_length=255, blank=True)
+    file_format = models.CharField(max_length=10)
+    report = models.JSONField(default=dict, help_text="Parse and validation report of the upload")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.hospital.code} {self.file_name} ({self.created_at:%Y-%m-%d %H:%M})"
+
+
+class IngestQueueItem(models.Model):
+    """Durable queue of accepted ingest events awaiting the apply worker."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('applied', 'Applied'),
+        ('failed', 'Failed'),
+    ]
+
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='ingest_queue')
+    payload = models.JSONField(help_text="Validated IngestTransactionSerializer payload")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0, help_text="Apply attempts that raised a database error")
+    import_job = models.ForeignKey(
+        FileImportJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='queue_items',
+    )
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='ingestqueue_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.hospital.code} ({self.status})"
+
+
 class BloodStock(models.Model):
     """Materialized current stock per hospital and blood group."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -528,6 +645,167 @@ class BloodStock(models.Model):
         return f"{self.hospital.code} {self.blood_group} ({product_display}): {self.units_available}"
 
 
+# Column of HospitalStockSnapshot holding each blood group's units.
+SNAPSHOT_GROUP_FIELDS = {
+    'A+': 'units_a_pos',
+    'A-': 'units_a_neg',
+    'B+': 'units_b_pos',
+    'B-': 'units_b_neg',
+    'AB+': 'units_ab_pos',
+    'AB-': 'units_ab_neg',
+    'O+': 'units_o_pos',
+    'O-': 'units_o_neg',
+}
+
+
+class HospitalStockSnapshot(models.Model):
+    """Denormalized public read model: one row per hospital with its stock vector.
+
+    Units are summed across product types. Maintained by
+    ``api.stock_service.refresh_stock_snapshot`` in the same transaction as
+    every BloodStock change; do not edit directly.
+    """
+    hospital = models.OneToOneField(
+        Hospital, on_delete=models.CASCADE, primary_key=True, related_name='stock_snapshot'
+    )
+    code = models.CharField(max_length=50)
+    name = models.CharField(max_length=200)
+    city = models.CharField(max_length=100)
+    address = models.TextField(blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Geohash of the coordinates (see api.geo); '' when unlocated.
+    geohash = models.CharField(max_length=12, blank=True, default='')
+    is_active = models.BooleanField(default=True)
+    units_a_pos = models.IntegerField(default=0)
+    units_a_neg = models.IntegerField(default=0)
+    units_b_pos = models.IntegerField(default=0)
+    units_b_neg = models.IntegerField(default=0)
+    units_ab_pos = models.IntegerField(default=0)
+    units_ab_neg = models.IntegerField(default=0)
+    units_o_pos = models.IntegerField(default=0)
+    units_o_neg = models.IntegerField(default=0)
+    total_units = models.IntegerField(default=0)
+    # Blood group -> ISO time of its latest stock update; only groups that have stock rows.
+    group_updated_at = models.JSONField(default=dict, blank=True)
+    last_updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_active', 'city'], name='stocksnapshot_active_city_idx'),
+            models.Index(fields=['geohash'], name='stocksnapshot_geohash_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.code} snapshot: {self.total_units} units"
+
+    def stock_by_group(self):
+        """Units per blood group, for groups that have stock rows."""
+        return {
+            group: getattr(self, field)
+            for group, field in SNAPSHOT_GROUP_FIELDS.items()
+            if group in self.group_updated_at
+        }
+
+
+class StockAggregate(models.Model):
+    """Stock summed over a city's active hospitals, per blood group and product.
+
+    Backs the city and national totals. Maintained by
+    ``api.stock_service.refresh_stock_aggregates`` right after every
+    BloodStock change commits; do not edit directly.
+    """
+    city = models.CharField(max_length=100)
+    blood_group = models.CharField(max_length=3, choices=BLOOD_GROUP_CHOICES)
+    blood_product_type = models.CharField(max_length=20, choices=BLOOD_PRODUCT_CHOICES, default='whole_blood')
+    units_available = models.IntegerField(default=0)
+    # Active hospitals with a stock row for this key.
+    hospital_count = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('city', 'blood_group', 'blood_product_type')
+        ordering = ['city', 'blood_group']
+
+    def __str__(self):
+        return f"{self.city} {self.blood_group} ({self.blood_product_type}): {self.units_available}"
+
+
+class StockChange(models.Model):
+    """Append-only log of changed BloodStock keys, read by the delta-sync feed.
+
+    The auto-increment id is the change sequence clients sync from. Hospital
+    is not a constrained foreign key so deletions stay in the log after the
+    hospital is gone. Written by ``api.stock_changes.record_stock_changes``.
+    """
+    hospital = models.ForeignKey(
+        Hospital, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    blood_group = models.CharField(max_length=3, choices=BLOOD_GROUP_CHOICES)
+    blood_product_type = models.CharField(max_length=20, choices=BLOOD_PRODUCT_CHOICES, default='whole_blood')
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.hospital_id} {self.blood_group} {self.blood_product_type}"
+
+
+class SearchDocument(models.Model):
+    """Searchable text of a hospital, hospital request, blood bank or drive.
+
+    One row per source object, kept in sync by signals. The full-text
+    index over it (FTS5 on SQLite, tsvector on PostgreSQL) is created by
+    migration; see ``api.search``.
+    """
+    KIND_CHOICES = [
+        ('hospital', 'Hospital'),
+        ('hospital_request', 'Hospital Request'),
+        ('blood_bank', 'Blood Bank'),
+        ('drive', 'Donation Drive'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=64)
+    title = models.CharField(max_length=200)
+    city = models.CharField(max_length=100, blank=True)
+    address = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
+
+
+class StockCheckpoint(models.Model):
+    """Replayed ledger state of one stock key at a position in the ledger.
+
+    Checkpoints written by one ``rebuild_stock`` pass share the same
+    (as_of, last_transaction_id) cursor and together form a full snapshot.
+    """
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    blood_group = models.CharField(max_length=3, choices=BLOOD_GROUP_CHOICES)
+    blood_product_type = models.CharField(max_length=20, choices=BLOOD_PRODUCT_CHOICES, default='whole_blood')
+    units = models.IntegerField()
+    as_of = models.DateTimeField(help_text="ingested_at of the last ledger row covered")
+    last_sequence = models.PositiveIntegerField(default=0, help_text="sequence of the last ledger row covered")
+    last_transaction_id = models.UUIDField(help_text="Ledger cursor tie-breaker within as_of")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-as_of']
+        indexes = [
+            models.Index(fields=['as_of', 'last_sequence', 'last_transaction_id'], name='stockcheckpoint_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hospital.code} {self.blood_group} @ {self.as_of:%Y-%m-%d %H:%M}: {self.units}"
+
+
 class StockAlert(models.Model):
     """Track low stock alerts for hospitals."""
     ALERT_LEVELS = [
@@ -548,6 +826,18 @@ class StockAlert(models.Model):
     
     class Meta:
         ordering = ['-triggered_at']
+        indexes = [
+            # Admin alert listing (cursor pagination key)
+            models.Index(fields=['triggered_at', 'id'], name='stockalert_triggered_idx'),
+        ]
+        constraints = [
+            # One open alert per stock key; also the open alert lookup index.
+            models.UniqueConstraint(
+                fields=['hospital', 'blood_group'],
+                condition=models.Q(resolved_at__isnull=True),
+                name='stockalert_open_key_uniq',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.hospital.code} {self.blood_group} - {self.alert_level}"
@@ -664,6 +954,10 @@ class SMSNotificationLog(models.Model):
     
     class Meta:
         ordering = ['-sent_at']
+        indexes = [
+            # Admin log listing (cursor pagination key)
+            models.Index(fields=['sent_at', 'id'], name='smslog_sent_idx'),
+        ]
         verbose_name = 'SMS Notification Log'
         verbose_name_plural = 'SMS Notification Logs'
     
@@ -0,0 +1,207 @@
+"""
+BloodSync Nepal - Nearest Stock
+k-nearest hospitals holding a blood group, by distance rather than city.
+
+Active, located hospitals are bucketed into an in-process grid of
+``NEARBY_GRID_CELL_DEGREES`` cells. A search walks rings of cells outward
+from the origin, checks the stock of the hospitals it meets in batches,
+and stops once the next ring cannot hold anything closer than the k-th
+hit or reaches ``NEARBY_MAX_KM``, so it only reads stock rows of hospitals
+near the origin.
+
+The grid is rebuilt after ``NEARBY_GRID_TTL`` seconds, which bounds
+staleness across worker processes; within a process it is dropped whenever
+a Hospital is saved or deleted (see ``api.signals``).
+"""
+
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Max, Sum
+
+from .geo import haversine_km
+from .models import BloodStock, Hospital
+
+KM_PER_DEGREE = 111.19
+
+# Fewest candidates whose stock is checked in one query.
+MIN_STOCK_BATCH = 64
+
+NEARBY_HOSPITAL_FIELDS = ('id', 'code', 'name', 'city', 'address', 'latitude', 'longitude')
+
+
+class HospitalGrid:
+    """In-process grid index of active hospital coordinates, rebuilt lazily."""
+
+    def __init__(self, ttl, cell_degrees):
+        self.ttl = ttl
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._index = None
+        # Bumped on every clear so a build that raced an invalidation is not kept.
+        self.generation = 0
+        self.builds = 0
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def _build(self):
+        cells = defaultdict(list)
+        max_abs_lat = 0.0
+        hospitals = Hospital.objects.filter(
+            is_active=True, latitude__isnull=False, longitude__isnull=False
+        ).order_by().values(*NEARBY_HOSPITAL_FIELDS)
+        for hospital in hospitals:
+            lat, lng = float(hospital['latitude']), float(hospital['longitude'])
+            cells[self._cell(lat, lng)].append((lat, lng, hospital))
+            max_abs_lat = max(max_abs_lat, abs(lat))
+        rows = [row for row, _ in cells] or [0]
+        cols = [col for _, col in cells] or [0]
+        return {
+            'cells': dict(cells),
+            'rows': (min(rows), max(rows)),
+            'cols': (min(cols), max(cols)),
+            'max_abs_lat': max_abs_lat,
+            'expires_at': time.monotonic() + self.ttl,
+        }
+
+    def index(self):
+        with self._lock:
+            index, generation = self._index, self.generation
+        if index is not None and index['expires_at'] > time.monotonic():
+            return index
+        index = self._build()
+        with self._lock:
+            if generation == self.generation:
+                self._index = index
+                self.builds += 1
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self.generation += 1
+
+    def rings(self, lat, lng):
+        """
+        Yield (reach_km, [(distance_km, hospital), ...]) for rings of cells
+        around a point, innermost first. Hospitals not yet yielded are at
+        least ``reach_km`` away.
+
+        Only the rings and cells that overlap the occupied bounding box are
+        visited, so an origin far outside the grid costs no more than one
+        inside it.
+        """
+        index = self.index()
+        cells = index['cells']
+        if not cells:
+            return
+        row0, col0 = self._cell(lat, lng)
+        min_row, max_row = index['rows']
+        min_col, max_col = index['cols']
+        # Every point outside ring d is at least d cells away along one axis;
+        # a degree of longitude is shortest at the highest latitude involved.
+        max_abs_lat = min(max(index['max_abs_lat'], abs(lat)) + self.cell_degrees, 89.0)
+        km_per_ring = self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(max_abs_lat))
+        first_ring = max(0, min_row - row0, row0 - max_row, min_col - col0, col0 - max_col)
+        last_ring = max(row0 - min_row, max_row - row0, col0 - min_col, max_col - col0)
+
+        for ring in range(first_ring, last_ring + 1):
+            found = []
+            edge_cols = [col for col in (col0 - ring, col0 + ring) if min_col <= col <= max_col]
+            full_cols = range(max(col0 - ring, min_col), min(col0 + ring, max_col) + 1)
+            for row in range(max(row0 - ring, min_row), min(row0 + ring, max_row) + 1):
+                on_edge = row in (row0 - ring, row0 + ring)
+                for col in (full_cols if on_edge else edge_cols):
+                    for point_lat, point_lng, hospital in cells.get((row, col), ()):
+                        found.append((haversine_km(lat, lng, point_lat, point_lng), hospital))
+            yield ring * km_per_ring, found
+
+
+hospital_grid = HospitalGrid(
+    ttl=settings.NEARBY_GRID_TTL,
+    cell_degrees=settings.NEARBY_GRID_CELL_DEGREES,
+)
+
+
+def nearest_hospitals_with_stock(lat, lng, blood_group, product=None, min_units=1, k=5,
+                                 max_km=None, exclude=None):
+    """
+    The ``k`` closest active hospitals holding at least ``min_units`` of a
+    blood group, across city and district borders.
+
+    Args:
+        lat, lng: origin coordinates
+        blood_group: blood group code
+        product: blood product type; default units summed over all products
+        min_units: minimum units held
+        k: maximum number of hospitals
+        max_km: search radius in kilometers, at most ``NEARBY_MAX_KM``
+            (the default)
+        exclude: optional hospital id to skip (the origin hospital)
+
+    Returns:
+        list of dicts with hospital details, distance_km, units_available
+        and updated_at, closest first
+    """
+    max_km = settings.NEARBY_MAX_KM if max_km is None else min(max_km, settings.NEARBY_MAX_KM)
+    stock = BloodStock.objects.filter(blood_group=blood_group)
+    if product:
+        stock = stock.filter(blood_product_type=product)
+
+    best = []  # max-heap of (-distance, tiebreak, hospital, holding)
+    pending = {}
+    batch_size = max(MIN_STOCK_BATCH, 4 * k)
+
+    def check_stock():
+        # One query per batch of candidates; batches double so a rare group
+        # found far away still takes few queries.
+        holdings = (
+            stock.filter(hospital_id__in=pending).order_by().values('hospital_id')
+            .annotate(units=Sum('units_available'), updated=Max('updated_at'))
+            .filter(units__gte=min_units)
+        )
+        for holding in holdings:
+            distance, hospital = pending[holding['hospital_id']]
+            entry = (-distance, str(hospital['id']), hospital, holding)
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+        pending.clear()
+
+    for reach, found in hospital_grid.rings(float(lat), float(lng)):
+        for distance, hospital in found:
+            if hospital['id'] != exclude and distance <= max_km:
+                pending[hospital['id']] = (distance, hospital)
+        if reach > max_km:
+            break
+        if len(pending) >= batch_size:
+            check_stock()
+            batch_size *= 2
+            if len(best) == k and -best[0][0] <= reach:
+                break
+    if pending:
+        check_stock()
+
+    results = []
+    for distance, _, hospital, holding in sorted(best, reverse=True):
+        results.append({
+            'hospital': {
+                'id': str(hospital['id']),
+                'code': hospital['code'],
+                'name': hospital['name'],
+                'city': hospital['city'],
+                'address': hospital['address'],
+                'latitude': float(hospital['latitude']),
+                'longitude': float(hospital['longitude']),
+            },
+            'distance_km': round(-distance, 2),
+            'units_available': holding['units'],
+            'updated_at': holding['updated'].isoformat(),
+        })
+    return results
@@ -0,0 +1,36 @@
+"""
+BloodSync Nepal - Pagination
+Keyset (cursor) pagination for append-heavy listings.
+
+Unlike the global ``PageNumberPagination`` these never run ``COUNT(*)`` or
+``OFFSET``: each page is an index seek past the last row of the previous
+page, so page cost does not grow with the table. Pages are navigated with
+the opaque ``next``/``previous`` links only.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination with a client-selectable page size."""
+
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class LedgerCursorPagination(KeysetPagination):
+    """Transaction ledger, newest first (``transaction_ingested_idx``)."""
+
+    ordering = ('-ingested_at', '-id')
+
+
+class StockAlertCursorPagination(KeysetPagination):
+    """Stock alerts, most recently triggered first."""
+
+    ordering = ('-triggered_at', '-id')
+
+
+class SMSLogCursorPagination(KeysetPagination):
+    """SMS notification log, most recently sent first."""
+
+    ordering = ('-sent_at', '-id')
@@ -0,0 +1,37 @@
+"""
+BloodSync Nepal - Parsers
+MessagePack request bodies for bandwidth-constrained clients.
+
+Send ``Content-Type: application/msgpack``. Timestamps may be strings (as
+in JSON) or native MessagePack timestamps. ``msgpack`` is optional:
+without it the parser is simply not offered.
+"""
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.settings import api_settings
+
+from .renderers import MSGPACK_MEDIA_TYPE, msgpack
+
+
+class MessagePackParser(BaseParser):
+    """Parse a MessagePack request body."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3, strict_map_key=True)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc or type(exc).__name__}')
+
+
+def with_msgpack(parser_classes):
+    """Append MessagePackParser to a parser list when msgpack is installed."""
+    if msgpack is None:
+        return list(parser_classes)
+    return [*parser_classes, MessagePackParser]
+
+
+# Default parsers plus MessagePack, for views that accept edge-device uploads.
+COMPACT_PARSER_CLASSES = with_msgpack(api_settings.DEFAULT_PARSER_CLASSES)
@@ -0,0 +1,47 @@
+"""
+BloodSync Nepal - Renderers
+MessagePack output for bandwidth-constrained clients.
+
+Clients opt in with ``Accept: application/msgpack``; JSON stays the
+default. ``msgpack`` is optional: without it the renderer is simply not
+offered.
+"""
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render response data as MessagePack."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    # Reuse DRF's JSON fallbacks for datetimes, decimals, UUIDs and lazy strings.
+    _encode_default = staticmethod(JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self._encode_default, datetime=False)
+
+
+def with_msgpack(renderer_classes):
+    """Append MessagePackRenderer to a renderer list when msgpack is installed."""
+    if msgpack is None:
+        return list(renderer_classes)
+    return [*renderer_classes, MessagePackRenderer]
+
+
+# Default renderers plus MessagePack, for views that serve edge devices.
+COMPACT_RENDERER_CLASSES = with_msgpack(api_settings.DEFAULT_RENDERER_CLASSES)
@@ -0,0 +1,221 @@
+"""
+BloodSync Nepal - Search
+Prefix search over hospital, hospital request, blood bank and drive names,
+cities and addresses.
+
+Each source object is mirrored into a ``SearchDocument`` row by signals.
+On SQLite an FTS5 table indexes those rows (kept in sync by triggers); on
+PostgreSQL a GIN index covers a weighted tsvector of them. Both match every
+query word as a prefix ("bir hos" finds "Bir Hospital") and rank title
+matches above city and address matches. Other databases fall back to
+substring matching on the document table. ``matching_ids`` matches titles
+only, for the name filters of the list endpoints.
+"""
+
+import re
+from functools import lru_cache
+
+from django.db import connections, models
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Replace
+
+from .models import BloodBank, DonationDrive, Hospital, HospitalReq, SearchDocument
+
+FTS_TABLE = 'api_searchdocument_fts'
+
+# Shared by the PostgreSQL index (see migration 0014) and its queries; keep in sync.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(address, '')), 'C')"
+)
+
+MAX_QUERY_WORDS = 8
+
+
+def _hospital_document(hospital):
+    return {'title': hospital.name, 'city': hospital.city, 'address': hospital.address,
+            'is_active': hospital.is_active}
+
+
+def _hospital_request_document(request):
+    return {'title': request.hospital_name, 'city': request.district, 'address': request.address,
+            'is_active': not request.fulfilled}
+
+
+def _blood_bank_document(bank):
+    return {'title': bank.name, 'city': bank.district, 'address': bank.address, 'is_active': True}
+
+
+def _drive_document(drive):
+    return {'title': drive.title, 'city': drive.city, 'address': drive.location,
+            'is_active': drive.status in ('planned', 'active')}
+
+
+# Source model -> (SearchDocument.kind, document builder)
+SEARCH_SOURCES = {
+    Hospital: ('hospital', _hospital_document),
+    HospitalReq: ('hospital_request', _hospital_request_document),
+    BloodBank: ('blood_bank', _blood_bank_document),
+    DonationDrive: ('drive', _drive_document),
+}
+
+
+def _documents(model, instances):
+    kind, build = SEARCH_SOURCES[model]
+    return [SearchDocument(kind=kind, object_id=str(instance.pk), **build(instance)) for instance in instances]
+
+
+def index_object(instance):
+    """Create or refresh the search document of a saved source object."""
+    SearchDocument.objects.bulk_create(
+        _documents(type(instance), [instance]),
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['title', 'city', 'address', 'is_active'],
+    )
+
+
+def unindex_object(instance):
+    kind, _ = SEARCH_SOURCES[type(instance)]
+    SearchDocument.objects.filter(kind=kind, object_id=str(instance.pk)).delete()
+
+
+def rebuild_search_index():
+    """Rebuild every search document from the source tables; returns the count."""
+    SearchDocument.objects.all().delete()
+    count = 0
+    for model in SEARCH_SOURCES:
+        documents = _documents(model, model.objects.order_by().iterator(chunk_size=2000))
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+        count += len(documents)
+    return count
+
+
+def query_words(query):
+    return re.findall(r'\w+', (query or '').lower())[:MAX_QUERY_WORDS]
+
+
+@lru_cache(maxsize=None)
+def _has_fts_table(alias):
+    return FTS_TABLE in connections[alias].introspection.table_names()
+
+
+def _search_sql(vendor, alias, words, kinds, active_only):
+    """Return (sql, params) selecting kind, object_id, title, city, address, score; or None."""
+    filters = []
+    if active_only:
+        filters.append('d.is_active')
+    if kinds:
+        filters.append(f"d.kind IN ({', '.join(['%s'] * len(kinds))})")
+    where = ''.join(f' AND {condition}' for condition in filters)
+
+    if vendor == 'sqlite' and _has_fts_table(alias):
+        # bm25 is lower-is-better; weights are title, city, address
+        return (
+            f'SELECT d.kind, d.object_id, d.title, d.city, d.address, '
+            f'-bm25({FTS_TABLE}, 10.0, 4.0, 1.0) AS score '
+            f'FROM {FTS_TABLE} JOIN api_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s{where} ORDER BY score DESC, d.title',
+            [' '.join(f'"{word}"*' for word in words), *kinds],
+        )
+    if vendor == 'postgresql':
+        return (
+            f'SELECT d.kind, d.object_id, d.title, d.city, d.address, '
+            f'ts_rank({PG_SEARCH_VECTOR}, q) AS score '
+            f"FROM api_searchdocument d, to_tsquery('simple', %s) q "
+            f'WHERE ({PG_SEARCH_VECTOR}) @@ q{where} ORDER BY score DESC, d.title',
+            [' & '.join(f'{word}:*' for word in words), *kinds],
+        )
+    return None
+
+
+def search_documents(query, kinds=None, limit=10, active_only=True, alias='default'):
+    """
+    Ranked prefix search.
+
+    Args:
+        query: free text; every word must match the start of a word
+        kinds: optional list of SearchDocument kinds to restrict to
+        limit: maximum results
+        active_only: skip inactive hospitals, fulfilled requests and
+            finished or cancelled drives
+
+    Returns:
+        list of dicts with kind, id, title, city, address and score
+        (higher is better)
+    """
+    words = query_words(query)
+    if not words:
+        return []
+    kinds = list(kinds or [])
+    connection = connections[alias]
+    search = _search_sql(connection.vendor, alias, words, kinds, active_only)
+
+    if search is None:
+        documents = SearchDocument.objects.using(alias).order_by('title')
+        for word in words:
+            documents = documents.filter(
+                Q(title__icontains=word) | Q(city__icontains=word) | Q(address__icontains=word)
+            )
+        if active_only:
+            documents = documents.filter(is_active=True)
+        if kinds:
+            documents = documents.filter(kind__in=kinds)
+        rows = [
+            (doc.kind, doc.object_id, doc.title, doc.city, doc.address, 0.0)
+            for doc in documents[:limit]
+        ]
+    else:
+        sql, params = search
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} LIMIT %s', [*params, limit])
+            rows = cursor.fetchall()
+
+    return [
+        {'kind': kind, 'id': object_id, 'title': title, 'city': city, 'address': address,
+         'score': round(score, 6)}
+        for kind, object_id, title, city, address, score in rows
+    ]
+
+
+def _object_pk(model, alias):
+    """``SearchDocument.object_id`` as the database stores ``model``'s primary key."""
+    if isinstance(model._meta.pk, models.UUIDField):
+        if connections[alias].features.has_native_uuid_field:
+            return Cast('object_id', models.UUIDField())
+        # Stored as 32 hex digits; object_id is the hyphenated form.
+        return Replace('object_id', Value('-'), Value(''))
+    return Cast('object_id', models.BigIntegerField())
+
+
+def matching_ids(query, kind, alias='default'):
+    """
+    Subquery of primary keys of ``kind`` objects whose title matches ``query``.
+
+    Every query word must match the start of a word of the title; city and
+    address are not searched. Use as ``filter(pk__in=matching_ids(...))``.
+    """
+    model = next(model for model, (source_kind, _) in SEARCH_SOURCES.items() if source_kind == kind)
+    documents = SearchDocument.objects.using(alias).filter(kind=kind).order_by()
+    words = query_words(query)
+    if not words:
+        return documents.none().values_list('object_id')
+
+    vendor = connections[alias].vendor
+    if vendor == 'sqlite' and _has_fts_table(alias):
+        documents = documents.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [' '.join(f'title: "{word}"*' for word in words)],
+        ))
+    elif vendor == 'postgresql':
+        documents = documents.filter(RawSQL(
+            f"({PG_SEARCH_VECTOR}) @@ to_tsquery('simple', %s)",
+            [' & '.join(f'{word}:*A' for word in words)],
+            output_field=models.BooleanField(),
+        ))
+    else:
+        for word in words:
+            documents = documents.filter(title__icontains=word)
+    return documents.values_list(_object_pk(model, alias))
@@ -129,16 +129,19 @@ class TransactionSerializer(serializers.ModelSerializer):
             'id',
             'hospital',
             'blood_group',
+            'blood_product_type',
             'units_change',
             'timestamp',
             'ingested_at',
             'source_reference',
             'notes',
+            'is_adjustment',
         ]
 
 
 class IngestTransactionSerializer(serializers.Serializer):
     blood_group = serializers.ChoiceField(choices=BLOOD_GROUP_CHOICES)
+    blood_product_type = serializers.ChoiceField(choices=BLOOD_PRODUCT_CHOICES, default='whole_blood')
     units_change = serializers.IntegerField()
     timestamp = serializers.DateTimeField()
     source_reference = serializers.CharField(required=False, allow_blank=True, max_length=100)
@@ -245,6 +248,30 @@ class NearbyDonorRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError('Provide either hospital_id or hospital_code')
         return attrs
 
+class NearestStockQuerySerializer(serializers.Serializer):
+    """Validate nearest-stock query params: an origin hospital or coordinates."""
+    hospital = serializers.CharField(required=False, max_length=50)
+    lat = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    lng = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    blood_group = serializers.ChoiceField(choices=BLOOD_GROUP_CHOICES)
+    product = serializers.ChoiceField(choices=BLOOD_PRODUCT_CHOICES, required=False)
+    min_units = serializers.IntegerField(default=1, min_value=1)
+    k = serializers.IntegerField(default=5, min_value=1, max_value=50)
+    radius_km = serializers.FloatField(required=False, min_value=0.1)
+
+    def validate(self, attrs):
+        has_point = attrs.get('lat') is not None and attrs.get('lng') is not None
+        if not attrs.get('hospital') and not has_point:
+            raise serializers.ValidationError('Provide either hospital or lat and lng')
+        return attrs
+
+class TransferPlanQuerySerializer(serializers.Serializer):
+    """Validate transfer-plan query params."""
+    blood_group = serializers.ChoiceField(choices=BLOOD_GROUP_CHOICES, required=False)
+    product = serializers.ChoiceField(choices=BLOOD_PRODUCT_CHOICES, required=False)
+    max_km = serializers.FloatField(required=False, min_value=1)
+    safety_units = serializers.IntegerField(required=False, min_value=15)
+
 class SMSNotificationLogSerializer(serializers.ModelSerializer):
     """Serializer for SMS notification logs"""
     class Meta:
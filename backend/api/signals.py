@@ -0,0 +1,95 @@
+"""
+BloodSync Nepal - Model Signals
+Keep in-process caches and read models in step with the models they mirror.
+"""
+
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import hospital_key_cache
+from .models import (
+    BloodBank, BloodStock, DonationDrive, Hospital, HospitalReq, HospitalStockSnapshot, hospitals_updated,
+)
+from .nearby import hospital_grid
+from .search import index_object, unindex_object
+from .stock_cache import bump_stock_version
+from .stock_alerts import evaluate_stock_alerts
+from .stock_changes import record_stock_changes
+from .stock_service import refresh_stock_aggregates, refresh_stock_snapshot
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+@receiver(hospitals_updated, sender=Hospital)
+def invalidate_hospital_caches(sender, **kwargs):
+    """A saved hospital may have been re-keyed, moved or deactivated; drop cached keys and locations."""
+    # Again after commit: a request in between may have cached the old rows.
+    for cache in (hospital_key_cache, hospital_grid):
+        cache.clear()
+        db_transaction.on_commit(cache.clear)
+
+
+@receiver(post_delete, sender=Hospital)
+def invalidate_public_stock_cache(sender, instance, **kwargs):
+    """A deleted hospital disappears from every public listing and city total."""
+    bump_stock_version()
+    refresh_stock_aggregates(instance.city)
+
+
+@receiver(post_save, sender=Hospital)
+def sync_stock_snapshot_metadata(sender, instance, raw=False, **kwargs):
+    """Copy renamed, moved or deactivated hospital details into the read models."""
+    if raw:
+        return
+    previous_city = HospitalStockSnapshot.objects.filter(hospital=instance).values_list('city', flat=True).first()
+    refresh_stock_snapshot(instance, metadata=True)
+    for city in {instance.city, previous_city or instance.city}:
+        refresh_stock_aggregates(city)
+    # Stock rows embed hospital details, so mirrors must refetch them.
+    record_stock_changes(instance.pk)
+
+
+@receiver(hospitals_updated, sender=Hospital)
+def sync_updated_hospitals(sender, cities, **kwargs):
+    """The queryset-update counterpart of ``sync_stock_snapshot_metadata`` and the search index."""
+    hospitals = Hospital.objects.filter(pk__in=list(cities))
+    for hospital in hospitals:
+        refresh_stock_snapshot(hospital, metadata=True)
+        record_stock_changes(hospital.pk)
+        index_object(hospital)
+    for city in {*cities.values(), *(hospital.city for hospital in hospitals)}:
+        refresh_stock_aggregates(city)
+
+
+@receiver(post_save, sender=BloodStock)
+@receiver(post_delete, sender=BloodStock)
+def refresh_snapshot_on_stock_save(sender, instance, raw=False, origin=None, **kwargs):
+    """Direct BloodStock edits (admin, shell) bypass stock_service; refresh here."""
+    if raw:
+        return
+    record_stock_changes(instance.hospital_id, [(instance.blood_group, instance.blood_product_type)])
+    if isinstance(origin, Hospital) or getattr(origin, 'model', None) is Hospital:
+        # The hospital (and its snapshot) is being deleted, alone or in a queryset.
+        return
+    stock = refresh_stock_snapshot(instance.hospital, groups={instance.blood_group})
+    refresh_stock_aggregates(instance.hospital.city, [(instance.blood_group, instance.blood_product_type)])
+    if instance.blood_group in stock:
+        evaluate_stock_alerts(instance.hospital, {instance.blood_group: stock[instance.blood_group]})
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_save, sender=HospitalReq)
+@receiver(post_save, sender=BloodBank)
+@receiver(post_save, sender=DonationDrive)
+def update_search_document(sender, instance, **kwargs):
+    """Keep the search index in step with names, cities and addresses."""
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Hospital)
+@receiver(post_delete, sender=HospitalReq)
+@receiver(post_delete, sender=BloodBank)
+@receiver(post_delete, sender=DonationDrive)
+def remove_search_document(sender, instance, **kwargs):
+    unindex_object(instance)
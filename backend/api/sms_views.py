@@ -4,9 +4,12 @@ SMS API Views for sending SMS messages directly from backend
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.views import APIView
 from django.core.validators import validate_email
+from .models import SMSNotificationLog
+from .pagination import SMSLogCursorPagination
+from .serializers import SMSNotificationLogSerializer
 from .sms_service import (
     send_sms, send_bulk_sms, send_blood_request_sms, 
     TWILIO_ENABLED, SPARROW_ENABLED, SMS_PASAL_ENABLED, SMS_ENABLED, SMS_PROVIDER
@@ -131,6 +134,27 @@ class SMSViewSet(viewsets.ViewSet):
         })
 
 
+class SMSNotificationLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Browse the SMS notification log (admin only).
+    Filters: ?status=sent|failed|read, ?blood_request=<id>
+    """
+    queryset = SMSNotificationLog.objects.all()
+    serializer_class = SMSNotificationLogSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = SMSLogCursorPagination
+
+    def get_queryset(self):
+        queryset = SMSNotificationLog.objects.all()
+        status_param = self.request.query_params.get('status')
+        if status_param:
+            queryset = queryset.filter(status=status_param)
+        blood_request = self.request.query_params.get('blood_request')
+        if blood_request:
+            queryset = queryset.filter(blood_request_id=blood_request)
+        return queryset
+
+
 class SMSAPIView(APIView):
     """
     Simple API view for sending SMS
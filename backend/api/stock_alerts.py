@@ -0,0 +1,208 @@
+"""
+BloodSync Nepal - Stock Alert Evaluation
+Open, escalate and resolve StockAlerts from the stock a change touched.
+
+An alert is kept per (hospital, blood group), from the units the hospital
+holds of that group across all products (the figure the public stock
+snapshot shows). ``stock_service`` evaluates the groups each stock change
+touched in the same transaction, so alerts follow ingest as it happens;
+``sweep_stock_alerts`` (run by ``utils.check_and_create_alerts``)
+re-evaluates every key in bulk as a safety net.
+
+Both lock the open alerts they read until they commit, and every UPDATE
+only matches an alert still open and in the state it was read in, so a
+sweep working from older stock cannot overwrite a newer evaluation.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import BloodStock, StockAlert
+
+# (level, threshold) pairs, most urgent first: stock below the threshold is at that level.
+ALERT_THRESHOLDS = [
+    ('emergency', 3),
+    ('critical', 5),
+    ('low', 15),
+]
+
+# Fields of an open alert that follow its stock, and the fields read to compare them.
+ALERT_STATE_FIELDS = ('alert_level', 'threshold', 'current_units')
+OPEN_ALERT_FIELDS = ('id', 'hospital_id', 'blood_group', *ALERT_STATE_FIELDS)
+
+# Primary keys per UPDATE (or count), within every backend's parameter limit.
+UPDATE_BATCH_SIZE = 500
+
+ALERT_SEVERITY = {level: rank for rank, (level, _) in enumerate(reversed(ALERT_THRESHOLDS), start=1)}
+
+
+def alert_threshold(units):
+    """(level, threshold) of the most urgent level ``units`` is below, or None."""
+    for level, threshold in ALERT_THRESHOLDS:
+        if units < threshold:
+            return level, threshold
+    return None
+
+
+def _reconcile(units_by_key, open_alerts):
+    """
+    Alerts to create and open alerts to change for the given stock levels.
+
+    Args:
+        units_by_key: dict (hospital_id, blood_group) -> units held across products
+        open_alerts: dict (hospital_id, blood_group) -> list of open StockAlerts
+
+    Returns:
+        (new alerts, changed alerts as (alert, previous state, escalated),
+        primary keys of alerts to resolve, counts)
+    """
+    counts = {'opened': 0, 'escalated': 0, 'resolved': 0}
+    created, changed, resolved = [], [], []
+    for (hospital_id, blood_group), units in units_by_key.items():
+        level = alert_threshold(units)
+        alerts = open_alerts.get((hospital_id, blood_group), [])
+        if level is None:
+            resolved.extend(alert.pk for alert in alerts)
+        elif not alerts:
+            created.append(StockAlert(
+                hospital_id=hospital_id,
+                blood_group=blood_group,
+                alert_level=level[0],
+                threshold=level[1],
+                current_units=units,
+            ))
+        else:
+            for alert in alerts:
+                previous = tuple(getattr(alert, field) for field in ALERT_STATE_FIELDS)
+                if previous == (*level, units):
+                    continue
+                escalated = ALERT_SEVERITY[level[0]] > ALERT_SEVERITY[alert.alert_level]
+                if escalated:
+                    counts['escalated'] += 1
+                alert.alert_level, alert.threshold = level
+                alert.current_units = units
+                changed.append((alert, previous, escalated))
+    counts['opened'] = len(created)
+    counts['resolved'] = len(resolved)
+    return created, changed, resolved, counts
+
+
+def _update(pks, guard, **fields):
+    """Update the alerts among ``pks`` that are still open and match ``guard``."""
+    updated = 0
+    for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+        updated += StockAlert.objects.filter(
+            pk__in=pks[start:start + UPDATE_BATCH_SIZE], resolved_at__isnull=True, **guard
+        ).update(**fields)
+    return updated
+
+
+def _apply(created, changed, resolved, counts):
+    if created:
+        # A key whose alert was opened since it was read keeps that alert
+        # (one open alert per key is a unique constraint).
+        StockAlert.objects.bulk_create(created, ignore_conflicts=True)
+        pks = [alert.pk for alert in created]
+        counts['opened'] = sum(
+            StockAlert.objects.filter(pk__in=pks[start:start + UPDATE_BATCH_SIZE]).count()
+            for start in range(0, len(pks), UPDATE_BATCH_SIZE)
+        )
+    # Alerts moving between the same two states share one UPDATE, with the
+    # previous state in the WHERE so an alert changed since it was read is
+    # skipped. A state is a level and unit count below the last threshold,
+    # so the number of UPDATEs is bounded however many alerts change, where
+    # bulk_update's CASE per row grows with the alerts.
+    # Only an escalation touches notified, so a notification sent meanwhile
+    # is not undone.
+    by_state = defaultdict(list)
+    for alert, previous, escalated in changed:
+        state = tuple(getattr(alert, field) for field in ALERT_STATE_FIELDS)
+        by_state[(state, previous, escalated)].append(alert.pk)
+    for (state, previous, escalated), pks in by_state.items():
+        fields = dict(zip(ALERT_STATE_FIELDS, state))
+        if escalated:
+            fields['notified'] = False
+        _update(pks, dict(zip(ALERT_STATE_FIELDS, previous)), **fields)
+    if resolved:
+        counts['resolved'] = _update(resolved, {}, resolved_at=timezone.now())
+    return counts
+
+
+def _open_alerts(alerts):
+    # Locked in key order, so a sweep and an inline evaluation cannot deadlock.
+    open_alerts = defaultdict(list)
+    alerts = (
+        alerts.filter(resolved_at__isnull=True)
+        .select_for_update()
+        .order_by('hospital_id', 'blood_group', 'pk')
+        .only(*OPEN_ALERT_FIELDS)
+    )
+    for alert in alerts:
+        open_alerts[(alert.hospital_id, alert.blood_group)].append(alert)
+    return open_alerts
+
+
+def evaluate_stock_alerts(hospital, units_by_group):
+    """
+    Bring the hospital's open alerts in line with its current stock.
+
+    A group below a threshold opens an alert, or moves its open alert to
+    the new level (an escalation is marked for notification again); a
+    group back at or above every threshold resolves its open alert.
+
+    Runs in the caller's transaction when there is one, which then holds
+    the locks on the hospital's open alerts until it commits.
+
+    Args:
+        hospital: Hospital instance
+        units_by_group: dict blood group -> units held across products,
+            for the groups whose stock changed
+
+    Returns:
+        dict with the number of alerts opened, escalated and resolved
+    """
+    if not units_by_group:
+        return {'opened': 0, 'escalated': 0, 'resolved': 0}
+    with db_transaction.atomic():
+        open_alerts = _open_alerts(
+            StockAlert.objects.filter(hospital=hospital, blood_group__in=list(units_by_group))
+        )
+        created, changed, resolved, counts = _reconcile(
+            {(hospital.pk, blood_group): units for blood_group, units in sorted(units_by_group.items())},
+            open_alerts,
+        )
+        return _apply(created, changed, resolved, counts)
+
+
+def sweep_stock_alerts(hospitals=None):
+    """
+    Re-evaluate the alerts of every hospital and blood group that has stock.
+
+    Reads all stock levels and all open alerts in one query each and writes
+    the differences in bulk, so the cost does not grow with queries per row.
+    The open alerts are locked before the stock is read and stay locked
+    until the differences are written, in one transaction.
+
+    Args:
+        hospitals: optional Hospital queryset to limit the sweep to
+
+    Returns:
+        dict with the number of alerts opened, escalated and resolved
+    """
+    stock = BloodStock.objects.order_by()
+    alerts = StockAlert.objects.all()
+    if hospitals is not None:
+        stock = stock.filter(hospital__in=hospitals)
+        alerts = alerts.filter(hospital__in=hospitals)
+    with db_transaction.atomic():
+        open_alerts = _open_alerts(alerts)
+        units_by_key = {
+            (hospital_id, blood_group): units
+            for hospital_id, blood_group, units in stock.values('hospital_id', 'blood_group')
+            .annotate(units=Sum('units_available')).values_list('hospital_id', 'blood_group', 'units')
+        }
+        created, changed, resolved, counts = _reconcile(units_by_key, open_alerts)
+        return _apply(created, changed, resolved, counts)
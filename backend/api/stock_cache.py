@@ -0,0 +1,194 @@
+"""
+BloodSync Nepal - Public Stock Response Cache
+Reuse public stock responses until stock or hospital data changes.
+
+Cached entries are keyed by a global "stock version" kept in the Django
+cache. Every write that reaches the public read model (see
+``stock_service.refresh_stock_snapshot``) bumps the version, so old entries
+are never read again and simply expire. Response data is cached before
+rendering, so JSON and MessagePack clients share entries.
+
+Responses also carry an ETag built from the same version and key, so a
+poll with a matching ``If-None-Match`` gets 304 before the view runs or
+the cache is read. A per-process cache gives each worker its own version,
+and a worker that never handles a write would answer 304 forever, so
+ETags are only sent when the default cache is shared by every worker
+(``stock_version_shared``; ``api.checks`` warns otherwise). The async
+public views (``api.async_views``) use the same keys and ETags, so sync and
+async workers share entries.
+"""
+
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+STOCK_VERSION_KEY = 'public-stock:version'
+_ENTRY_KEY = 'public-stock:{}:{}:{}'
+
+# Cache backends private to one process: each worker would keep its own version.
+PER_PROCESS_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def stock_version_shared():
+    """Whether every worker reads the same stock version (and ETags are safe)."""
+    return settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHE_BACKENDS
+
+
+def get_stock_version():
+    """Return the current stock version, creating it if missing."""
+    version = cache.get(STOCK_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost version key never revisits old entries.
+        cache.add(STOCK_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(STOCK_VERSION_KEY)
+    return version
+
+
+async def aget_stock_version():
+    """Async ``get_stock_version``."""
+    version = await cache.aget(STOCK_VERSION_KEY)
+    if version is None:
+        await cache.aadd(STOCK_VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(STOCK_VERSION_KEY)
+    return version
+
+
+def _incr_version():
+    # On a file-based cache incr is a read and a write, so concurrent bumps
+    # may land on the same number; the version still moves past every
+    # cached entry, which is all invalidation needs.
+    try:
+        cache.incr(STOCK_VERSION_KEY)
+    except ValueError:
+        cache.add(STOCK_VERSION_KEY, time.time_ns(), None)
+
+
+def bump_stock_version():
+    """
+    Invalidate cached public stock responses.
+
+    Bumps now and again when the surrounding transaction commits, so a
+    response built from pre-commit data under the new version is discarded
+    as well.
+    """
+    _incr_version()
+    db_transaction.on_commit(_incr_version)
+
+
+class _HitCounter:
+    """Per-view counts of 304s, cache hits and misses."""
+
+    OUTCOMES = ('not_modified', 'hits', 'misses')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, name, outcome):
+        with self._lock:
+            counts = self._counts.setdefault(name, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = {name: dict(view) for name, view in self._counts.items()}
+        views = {}
+        for name, view in sorted(counts.items()):
+            served = view['not_modified'] + view['hits']
+            views[name] = {**view, 'hit_ratio': round(served / (served + view['misses']), 4)}
+        served = sum(view['not_modified'] + view['hits'] for view in counts.values())
+        total = served + sum(view['misses'] for view in counts.values())
+        return {
+            'hit_ratio': round(served / total, 4) if total else None,
+            'views': views,
+        }
+
+
+stock_cache_counter = _HitCounter()
+
+
+def response_digest(name, query, kwargs):
+    """Digest of a view name, its query string (a ``QueryDict``) and URL kwargs."""
+    params = '&'.join(
+        f'{key}={value}'
+        for key, values in sorted(query.lists())
+        for value in values
+    )
+    return hashlib.md5(
+        f'{name}|{params}|{sorted(kwargs.items())}'.encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+def response_etag(version, digest, fmt):
+    """ETag for a response, or None when the stock version is per process."""
+    if not stock_version_shared():
+        return None
+    return '"{}-{}-{}"'.format(version, digest[:16], fmt)
+
+
+def entry_key(version, name, digest):
+    return _ENTRY_KEY.format(version, name, digest)
+
+
+def etag_matches(request, etag):
+    if etag is None:
+        return False
+    header = request.headers.get('If-None-Match', '')
+    return etag in {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+
+def with_validators(response, etag):
+    if etag is not None:
+        response['ETag'] = etag
+    # Clients may keep the body but must revalidate before reusing it.
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def cache_stock_response(name):
+    """
+    Cache a public GET view's response data per stock version and answer
+    conditional GETs.
+
+    The key covers the query string and URL kwargs; the ETag additionally
+    covers the negotiated media type. Only 200 responses are stored. Wrap
+    function views under ``@api_view``; wrap class-based view methods with
+    ``method_decorator``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            digest = response_digest(name, request.query_params, kwargs)
+            version = get_stock_version()
+            etag = response_etag(version, digest, request.accepted_renderer.format)
+
+            if etag_matches(request, etag):
+                stock_cache_counter.record(name, 'not_modified')
+                return with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+            key = entry_key(version, name, digest)
+            cached = cache.get(key)
+            if cached is not None:
+                stock_cache_counter.record(name, 'hits')
+                return with_validators(Response(cached), etag)
+
+            stock_cache_counter.record(name, 'misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.PUBLIC_STOCK_CACHE_TIMEOUT)
+                with_validators(response, etag)
+            return response
+        return wrapper
+    return decorator
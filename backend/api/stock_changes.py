@@ -0,0 +1,130 @@
+"""
+BloodSync Nepal - Stock Change Feed
+Delta sync for mirrors of the stock list (``/api/stock/``).
+
+Every BloodStock mutation appends its (hospital, blood group, product) key
+to the ``StockChange`` log. A mirror takes the current cursor, downloads the
+full list once, then asks for changes since its cursor and receives only
+the current state of the keys changed since, plus the keys that were
+deleted.
+
+Log rows are written inside the transaction that changes the stock, so a
+change and its log entry commit or roll back together. Their ids are taken
+when the row is inserted but become visible at commit, so on databases that
+assign ids before commit (PostgreSQL) a reader can see id N+1 while N is
+still open. The feed therefore never moves the cursor across a gap in the
+ids unless the row after the gap is older than
+``STOCK_CHANGES_SETTLE_SECONDS``; by then the missing id belongs to a
+transaction that rolled back (or ran longer than the settle time).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import BloodStock, StockChange
+
+
+class CursorExpired(Exception):
+    """The requested cursor is older than the retained change log."""
+
+
+def record_stock_changes(hospital_id, keys=None):
+    """
+    Append changed stock keys to the change log.
+
+    Call inside the transaction that changed the stock.
+
+    Args:
+        hospital_id: Hospital primary key
+        keys: iterable of (blood_group, blood_product_type); default every
+            stock row of the hospital
+    """
+    if keys is None:
+        keys = BloodStock.objects.filter(hospital_id=hospital_id).order_by().values_list(
+            'blood_group', 'blood_product_type'
+        )
+    keys = list(keys)
+    if not keys:
+        return
+
+    StockChange.objects.bulk_create([
+        StockChange(hospital_id=hospital_id, blood_group=blood_group, blood_product_type=blood_product_type)
+        for blood_group, blood_product_type in keys
+    ])
+
+
+def _horizon():
+    return timezone.now() - timedelta(seconds=settings.STOCK_CHANGES_SETTLE_SECONDS)
+
+
+def current_cursor():
+    """Newest cursor a client can start from without missing a change."""
+    horizon = _horizon()
+    cursor = (
+        StockChange.objects.filter(changed_at__lte=horizon).order_by('-id').values_list('id', flat=True).first()
+        or 0
+    )
+    recent = StockChange.objects.filter(id__gt=cursor).order_by('id').values_list('id', flat=True)
+    for seq in recent.iterator():
+        if seq != cursor + 1:
+            break
+        cursor = seq
+    return cursor
+
+
+def changes_since(since, limit):
+    """
+    Return (rows, deleted, cursor, has_more) for changes after ``since``.
+
+    ``rows`` are the current BloodStock rows (hospital preloaded) of changed
+    keys, in change order; ``deleted`` are the changed keys that no longer
+    have a row, as (hospital_id, blood_group, blood_product_type).
+
+    Raises:
+        CursorExpired: if changes after ``since`` were already pruned
+    """
+    oldest = StockChange.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is not None and since < oldest - 1:
+        raise CursorExpired
+
+    horizon = _horizon()
+    changes = list(
+        StockChange.objects.filter(id__gt=since).order_by('id')
+        .values_list('id', 'changed_at', 'hospital_id', 'blood_group', 'blood_product_type')[:limit + 1]
+    )
+    has_more = len(changes) > limit
+    cursor = since
+    changed = {}
+    for seq, changed_at, *key in changes[:limit]:
+        if seq != cursor + 1 and changed_at > horizon:
+            # The ids before this one may still commit; wait for them.
+            has_more = False
+            break
+        cursor = seq
+        key = tuple(key)
+        changed.pop(key, None)  # keep keys in order of their latest change
+        changed[key] = seq
+
+    current = {}
+    if changed:
+        rows = BloodStock.objects.filter(
+            hospital_id__in={key[0] for key in changed},
+            blood_group__in={key[1] for key in changed},
+            blood_product_type__in={key[2] for key in changed},
+        ).select_related('hospital').order_by()
+        current = {(row.hospital_id, row.blood_group, row.blood_product_type): row for row in rows}
+
+    rows = [current[key] for key in changed if key in current]
+    deleted = [key for key in changed if key not in current]
+    return rows, deleted, cursor, has_more
+
+
+def prune_stock_changes(older_than):
+    """Delete log entries older than ``older_than``, always keeping the newest one."""
+    newest = StockChange.objects.order_by('-id').values_list('id', flat=True).first()
+    if newest is None:
+        return 0
+    deleted, _ = StockChange.objects.filter(changed_at__lt=older_than, id__lt=newest).delete()
+    return deleted
@@ -0,0 +1,297 @@
+"""
+BloodSync Nepal - Live Stock Events
+Fan-out of stock changes to Server-Sent Events listeners.
+
+``stock_service.refresh_stock_snapshot`` publishes one compact event per
+hospital change after the transaction commits (``publish_stock_event``).
+Each process keeps recent events in a ring buffer so reconnecting clients
+can resume from ``Last-Event-ID``; a client that fell further behind gets a
+``reset`` event and should refetch the full stock.
+
+With ``STOCK_STREAM_REDIS_URL`` set, events are appended to a capped Redis
+stream and every process serving listeners relays that stream into its
+local buffer from one reader thread, so a change made by any worker (the
+ingest worker included) reaches listeners on all of them, and event ids
+resume on any process. Without it only listeners in the process that made
+the change are notified.
+
+Publishing wakes every waiting listener at once; listeners then read from
+the shared buffer, so one ingest reaches any number of listeners without
+extra database reads. The stream is served only under ASGI, where an idle
+listener is a waiter on the event loop; under WSGI each would hold a worker
+thread for up to ``STOCK_STREAM_MAX_SECONDS``.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Redis stream ids are "<milliseconds>-<counter>"; packed into one integer
+# they keep their order and fit the broker's integer sequence.
+_STREAM_COUNTER_BITS = 20
+# How long the relay blocks on XREAD before checking in again, and how long
+# it waits before reconnecting after a Redis error.
+RELAY_BLOCK_MS = 5000
+RELAY_RETRY_SECONDS = 1
+
+
+class StockEventBroker:
+    """Ring buffer of stock events plus a condition listeners wait on."""
+
+    def __init__(self, buffer_size):
+        # Event ids are "<epoch>-<sequence>" so ids from another buffer never resume here.
+        self.epoch = str(time.time_ns())
+        self.buffer_size = buffer_size
+        self._events = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._last_seq = 0
+        # Events up to this sequence may be missing from the buffer.
+        self._horizon = 0
+        self._async_waiters = set()
+        self.published = 0
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    def rebase(self, epoch, seq):
+        """Empty the buffer and continue from ``seq`` of another event source."""
+        with self._condition:
+            self.epoch = epoch
+            self._events.clear()
+            self._last_seq = self._horizon = seq
+
+    def publish(self, payload, seq=None):
+        """
+        Append an event and wake all listeners.
+
+        ``seq`` is the event's position in a shared stream (increasing, not
+        necessarily contiguous); events at or before the newest buffered one
+        are ignored. Default: the next local sequence number.
+        """
+        with self._condition:
+            if seq is None:
+                seq = self._last_seq + 1
+            elif seq <= self._last_seq:
+                return
+            if len(self._events) == self._events.maxlen:
+                self._horizon = self._events[0][0]
+            self._last_seq = seq
+            self._events.append((seq, payload))
+            self.published += 1
+            self._condition.notify_all()
+            for loop, event in self._async_waiters:
+                loop.call_soon_threadsafe(event.set)
+
+    def parse_event_id(self, event_id):
+        """
+        Return the sequence to resume after, or None if ``event_id`` cannot
+        be resumed from this buffer.
+        """
+        epoch, _, seq = (event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def events_after(self, seq):
+        """
+        Return (events, complete, last_seq) for events newer than ``seq``.
+
+        ``complete`` is False when some of them already left the buffer.
+        """
+        with self._condition:
+            if seq >= self._last_seq:
+                return [], True, self._last_seq
+            events = [event for event in self._events if event[0] > seq]
+            return events, seq >= self._horizon, self._last_seq
+
+    async def await_after(self, seq, timeout):
+        """Wait on the running event loop until an event newer than ``seq`` exists or ``timeout`` passes."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            if self._last_seq > seq:
+                return True
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+
+    def format_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+def stream_seq(entry_id):
+    """Broker sequence of a Redis stream entry id."""
+    milliseconds, _, counter = entry_id.partition('-')
+    return (int(milliseconds) << _STREAM_COUNTER_BITS) | int(counter)
+
+
+class RedisStockEventRelay:
+    """Carry stock events between processes through a capped Redis stream."""
+
+    def __init__(self, url, key, broker):
+        self.key = key
+        self.broker = broker
+        self.client = redis.Redis.from_url(url)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def publish(self, payload):
+        self.client.xadd(
+            self.key,
+            {'data': json.dumps(payload, separators=(',', ':'))},
+            maxlen=self.broker.buffer_size,
+            approximate=True,
+        )
+
+    def ensure_started(self):
+        """Load the buffered events and start the reader thread, once per process."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # The epoch lives with the stream: a flushed Redis starts a new one.
+            epoch_key = f'{self.key}:epoch'
+            self.client.set(epoch_key, time.time_ns(), nx=True)
+            entries = self.client.xrevrange(self.key, count=self.broker.buffer_size)[::-1]
+            last_id = entries[0][0].decode() if entries else '0-0'
+            # Anything older than the first loaded entry may have been trimmed.
+            self.broker.rebase(self.client.get(epoch_key).decode(), max(0, stream_seq(last_id) - 1))
+            for entry_id, fields in entries:
+                last_id = self._deliver(entry_id, fields)
+            self._thread = threading.Thread(
+                target=self._run, args=(last_id,), name='stock-event-relay', daemon=True
+            )
+            self._thread.start()
+
+    def _deliver(self, entry_id, fields):
+        entry_id = entry_id.decode()
+        self.broker.publish(json.loads(fields[b'data']), seq=stream_seq(entry_id))
+        return entry_id
+
+    def _run(self, last_id):
+        while True:
+            try:
+                for _, entries in self.client.xread({self.key: last_id}, block=RELAY_BLOCK_MS) or []:
+                    for entry_id, fields in entries:
+                        last_id = self._deliver(entry_id, fields)
+            except redis.RedisError:
+                logger.exception('Stock event relay lost its Redis connection; retrying')
+                time.sleep(RELAY_RETRY_SECONDS)
+
+
+stock_events = StockEventBroker(settings.STOCK_STREAM_BUFFER_SIZE)
+stock_event_relay = (
+    RedisStockEventRelay(settings.STOCK_STREAM_REDIS_URL, settings.STOCK_STREAM_REDIS_KEY, stock_events)
+    if settings.STOCK_STREAM_REDIS_URL and redis is not None else None
+)
+
+
+def publish_stock_event(payload):
+    """Publish a stock event to every listener: through Redis when configured, else in this process."""
+    if stock_event_relay is None:
+        stock_events.publish(payload)
+        return
+    try:
+        stock_event_relay.publish(payload)
+    except redis.RedisError:
+        # Runs after commit: the stock change stands, listeners catch up on their next refetch.
+        logger.exception('Could not publish stock event for %s', payload['hospital'])
+
+
+def event_matches(payload, city=None, hospital=None, blood_group=None):
+    """Apply the stream filters; returns the (possibly narrowed) payload or None."""
+    if city and payload['city'].lower() != city.lower():
+        return None
+    if hospital and payload['hospital'] != hospital:
+        return None
+    if blood_group:
+        if blood_group not in payload['changed']:
+            return None
+        payload = {
+            **payload,
+            'changed': [blood_group],
+            'stock': {blood_group: payload['stock'].get(blood_group, 0)},
+        }
+    return payload
+
+
+def format_sse(data, event=None, event_id=None):
+    """Encode one SSE frame."""
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _start_frames(last_event_id):
+    """Return (frames, seq) to open a stream with."""
+    frames = [f'retry: {settings.STOCK_STREAM_RETRY_MS}\n\n']
+    seq = stock_events.parse_event_id(last_event_id) if last_event_id else None
+    if seq is None:
+        seq = stock_events.last_seq
+        if last_event_id:
+            frames.append(format_sse({'reason': 'cannot resume'}, event='reset', event_id=stock_events.format_id(seq)))
+    return frames, seq
+
+
+def _pending_frames(seq, filters):
+    """Return (frames, seq) for buffered events newer than ``seq``."""
+    events, complete, last_seq = stock_events.events_after(seq)
+    if not complete:
+        seq = last_seq
+        return [format_sse({'reason': 'missed events'}, event='reset', event_id=stock_events.format_id(seq))], seq
+    frames = []
+    for event_seq, payload in events:
+        seq = event_seq
+        matched = event_matches(payload, **filters)
+        if matched is not None:
+            frames.append(format_sse(matched, event='stock', event_id=stock_events.format_id(seq)))
+    return frames, seq
+
+
+async def astream_stock_events(last_event_id=None, city=None, hospital=None, blood_group=None,
+                               heartbeat=None, max_seconds=None):
+    """
+    Yield SSE frames for matching stock events.
+
+    Starts after ``last_event_id`` when it can be resumed, otherwise at the
+    newest event (sending ``reset`` if a resume was requested but is not
+    possible). Sends a comment frame every ``heartbeat`` seconds of silence
+    and ends after ``max_seconds`` so clients reconnect (and resume). An
+    idle listener holds no thread, only a waiter on the event loop.
+    """
+    if stock_event_relay is not None:
+        await sync_to_async(stock_event_relay.ensure_started)()
+    heartbeat = heartbeat or settings.STOCK_STREAM_HEARTBEAT_SECONDS
+    deadline = time.monotonic() + (max_seconds or settings.STOCK_STREAM_MAX_SECONDS)
+    filters = {'city': city, 'hospital': hospital, 'blood_group': blood_group}
+
+    frames, seq = _start_frames(last_event_id)
+    for frame in frames:
+        yield frame
+    while time.monotonic() < deadline:
+        frames, seq = _pending_frames(seq, filters)
+        for frame in frames:
+            yield frame
+        if not await stock_events.await_after(seq, min(heartbeat, max(0, deadline - time.monotonic()))):
+            yield ': keep-alive\n\n'
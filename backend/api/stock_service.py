@@ -0,0 +1,352 @@
+"""
+BloodSync Nepal - Stock Mutation Service
+Every change to BloodStock goes through this module.
+
+Stock rows are changed with a single conditional UPDATE
+(``units = MAX(floor, units + delta)``) instead of a locked
+read-modify-write, so the row lock is held only from the UPDATE until the
+surrounding transaction commits. Missing rows are upserted.
+
+Every change also refreshes the hospital's ``HospitalStockSnapshot`` (the
+public read model) and evaluates the changed groups' ``StockAlert``s
+(``stock_alerts``) in the same transaction, bumps the public stock cache
+version and, after commit, refreshes the city's ``StockAggregate`` rows,
+logs the changed keys for the delta-sync feed (``stock_changes``) and
+publishes a live stock event.
+"""
+
+import threading
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .geo import encode_geohash
+from .models import SNAPSHOT_GROUP_FIELDS, BloodStock, HospitalStockSnapshot, StockAggregate, Transaction
+from .stock_alerts import evaluate_stock_alerts
+from .stock_cache import bump_stock_version
+from .stock_changes import record_stock_changes
+from .stock_events import publish_stock_event
+
+
+def fold_stock_deltas(items):
+    """
+    Fold ordered ingest events into one stock update per stock key.
+
+    Each event clamps stock at zero (``max(0, units + change)``). A run of
+    such clamps composes into ``max(floor, units + delta)``, so the whole run
+    can be applied to a ``BloodStock`` row in a single step while giving the
+    same result as applying the events one by one.
+
+    Args:
+        items: iterable of validated ingest payloads, in arrival order
+
+    Returns:
+        dict mapping (blood_group, blood_product_type) -> (floor, delta)
+    """
+    folded = {}
+    for item in items:
+        key = (item['blood_group'], item.get('blood_product_type', 'whole_blood'))
+        floor, delta = folded.get(key, (0, 0))
+        change = item['units_change']
+        folded[key] = (max(0, floor + change), delta + change)
+    return folded
+
+
+def _stock_key_filter(hospital, blood_group, blood_product_type):
+    return BloodStock.objects.filter(
+        hospital=hospital,
+        blood_group=blood_group,
+        blood_product_type=blood_product_type,
+    )
+
+
+def _upsert(hospital, blood_group, blood_product_type, update_kwargs, insert_units):
+    """Run ``update_kwargs`` against the stock row, creating it if missing."""
+    if _stock_key_filter(hospital, blood_group, blood_product_type).update(**update_kwargs):
+        return
+
+    try:
+        with db_transaction.atomic():
+            # bulk_create skips post_save; callers refresh the snapshot once.
+            BloodStock.objects.bulk_create([BloodStock(
+                hospital=hospital,
+                blood_group=blood_group,
+                blood_product_type=blood_product_type,
+                units_available=insert_units,
+            )])
+    except IntegrityError:
+        # A concurrent writer created the row first; apply on top of it.
+        _stock_key_filter(hospital, blood_group, blood_product_type).update(**update_kwargs)
+
+
+def apply_stock_deltas(hospital, folded):
+    """
+    Apply folded stock deltas for one hospital.
+
+    Must be called inside the caller's transaction. Keys are written in a
+    stable order so concurrent callers cannot deadlock.
+
+    Args:
+        hospital: Hospital instance
+        folded: dict mapping (blood_group, blood_product_type) -> (floor, delta),
+            as produced by ``fold_stock_deltas``
+    """
+    now = timezone.now()
+    for (blood_group, blood_product_type), (floor, delta) in sorted(folded.items()):
+        _upsert(
+            hospital,
+            blood_group,
+            blood_product_type,
+            {
+                'units_available': Greatest(F('units_available') + delta, Value(floor)),
+                'updated_at': now,
+            },
+            max(floor, delta),
+        )
+    if folded:
+        groups = {blood_group for blood_group, _ in folded}
+        record_stock_changes(hospital.pk, sorted(folded))
+        stock = refresh_stock_snapshot(hospital, groups=groups)
+        refresh_stock_aggregates(hospital.city, folded)
+        evaluate_stock_alerts(hospital, {group: stock[group] for group in groups if group in stock})
+
+
+def set_stock_level(hospital, blood_group, units, blood_product_type='whole_blood'):
+    """
+    Overwrite the stock level for one key (seeding and manual corrections).
+
+    The change is written to the ledger as an adjustment row
+    (``is_adjustment``), so replaying the ledger reproduces the new level.
+
+    Args:
+        hospital: Hospital instance
+        blood_group: str, blood group code
+        units: int, new absolute number of units (clamped at zero)
+        blood_product_type: str, product code
+    """
+    units = max(0, units)
+    now = timezone.now()
+    with db_transaction.atomic():
+        previous = _stock_key_filter(hospital, blood_group, blood_product_type).select_for_update().values_list(
+            'units_available', flat=True
+        ).first() or 0
+        _upsert(
+            hospital,
+            blood_group,
+            blood_product_type,
+            {'units_available': units, 'updated_at': now},
+            units,
+        )
+        if units != previous:
+            Transaction.objects.create(
+                hospital=hospital,
+                blood_group=blood_group,
+                blood_product_type=blood_product_type,
+                units_change=units - previous,
+                timestamp=now,
+                notes='Stock level set',
+                is_adjustment=True,
+            )
+        record_stock_changes(hospital.pk, [(blood_group, blood_product_type)])
+        stock = refresh_stock_snapshot(hospital, groups={blood_group})
+        refresh_stock_aggregates(hospital.city, [(blood_group, blood_product_type)])
+        if blood_group in stock:
+            evaluate_stock_alerts(hospital, {blood_group: stock[blood_group]})
+
+
+def _snapshot_metadata(hospital):
+    return {
+        'code': hospital.code,
+        'name': hospital.name,
+        'city': hospital.city,
+        'address': hospital.address,
+        'latitude': float(hospital.latitude) if hospital.latitude is not None else None,
+        'longitude': float(hospital.longitude) if hospital.longitude is not None else None,
+        'geohash': encode_geohash(hospital.latitude, hospital.longitude),
+        'is_active': hospital.is_active,
+    }
+
+
+def refresh_stock_snapshot(hospital, metadata=False, groups=None):
+    """
+    Recompute the hospital's public stock snapshot from its BloodStock rows.
+
+    Call inside the transaction that changed stock. Hospital metadata is
+    copied only when the snapshot is created or ``metadata`` is true (on
+    Hospital save), so a stale cached Hospital cannot overwrite it.
+
+    Args:
+        hospital: Hospital instance
+        metadata: also copy name, city, coordinates and status
+        groups: blood groups whose stock changed, for the live event
+            (default: all groups)
+
+    Returns:
+        dict blood group -> units held across products
+    """
+    fields = {field: 0 for field in SNAPSHOT_GROUP_FIELDS.values()}
+    group_updated_at = {}
+    last_updated = None
+    rows = (
+        BloodStock.objects.filter(hospital=hospital)
+        .order_by()
+        .values('blood_group')
+        .annotate(units=Sum('units_available'), updated=Max('updated_at'))
+    )
+    for row in rows:
+        field = SNAPSHOT_GROUP_FIELDS.get(row['blood_group'])
+        if field is None:
+            continue
+        fields[field] = row['units']
+        group_updated_at[row['blood_group']] = row['updated'].isoformat()
+        if last_updated is None or row['updated'] > last_updated:
+            last_updated = row['updated']
+
+    fields.update(
+        total_units=sum(fields.values()),
+        group_updated_at=group_updated_at,
+        last_updated=last_updated,
+    )
+    if metadata:
+        fields.update(_snapshot_metadata(hospital))
+
+    snapshot = HospitalStockSnapshot.objects.filter(hospital=hospital)
+    if not snapshot.update(**fields):
+        try:
+            with db_transaction.atomic():
+                HospitalStockSnapshot.objects.create(hospital=hospital, **{**_snapshot_metadata(hospital), **fields})
+        except IntegrityError:
+            snapshot.update(**fields)
+    bump_stock_version()
+
+    stock = {group: fields[field] for group, field in SNAPSHOT_GROUP_FIELDS.items()}
+    event = {
+        'hospital': hospital.code,
+        'city': hospital.city,
+        'changed': sorted(groups) if groups is not None else list(SNAPSHOT_GROUP_FIELDS),
+        'stock': stock,
+        'total_units': fields['total_units'],
+        'is_active': hospital.is_active,
+        'updated_at': last_updated.isoformat() if last_updated else None,
+    }
+    db_transaction.on_commit(lambda: publish_stock_event(event))
+    return stock
+
+
+# City -> changed keys (None for every key) waiting for this thread's transaction to commit.
+_pending_aggregates = threading.local()
+
+
+def _pending_cities():
+    if not hasattr(_pending_aggregates, 'cities'):
+        _pending_aggregates.cities = {}
+    return _pending_aggregates.cities
+
+
+def refresh_stock_aggregates(city, keys=None):
+    """
+    Bring a city's ``StockAggregate`` rows up to date once the current transaction commits.
+
+    Changes are collected per thread and folded, so a transaction that
+    touches a city many times (a queued ingest batch) refreshes each of its
+    keys once. The refresh runs after commit, one city per short
+    transaction, so aggregate rows are never locked for the length of the
+    stock write, and no transaction holds the rows of two cities at once.
+
+    Args:
+        city: Hospital.city value
+        keys: iterable of (blood_group, blood_product_type) that changed
+            (default: every key the city has stock or aggregates for)
+    """
+    pending = _pending_cities()
+    if keys is None:
+        pending[city] = None
+    elif pending.get(city, set()) is not None:
+        pending.setdefault(city, set()).update(keys)
+    db_transaction.on_commit(_flush_stock_aggregates)
+
+
+def _flush_stock_aggregates():
+    """Recompute every pending city; later hooks of the same commit find nothing left."""
+    pending = _pending_cities()
+    cities = dict(pending)
+    pending.clear()
+    for city in sorted(cities):
+        _recompute_stock_aggregates(city, cities[city])
+
+
+def _recompute_stock_aggregates(city, keys=None):
+    """
+    Recompute a city's ``StockAggregate`` rows from BloodStock.
+
+    The rows are created if missing and locked in key order before summing,
+    so concurrent refreshes of the same city take turns and each sums the
+    other's committed changes. Hospitals in other cities are not touched.
+    """
+    stock = BloodStock.objects.filter(hospital__city=city).order_by()
+    if keys is None:
+        keys = set(stock.values_list('blood_group', 'blood_product_type')) | set(
+            StockAggregate.objects.filter(city=city).values_list('blood_group', 'blood_product_type')
+        )
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    key_filter = {
+        'blood_group__in': {blood_group for blood_group, _ in keys},
+        'blood_product_type__in': {product for _, product in keys},
+    }
+
+    with db_transaction.atomic():
+        StockAggregate.objects.bulk_create(
+            [StockAggregate(city=city, blood_group=blood_group, blood_product_type=product)
+             for blood_group, product in keys],
+            ignore_conflicts=True,
+        )
+        aggregates = {
+            (row.blood_group, row.blood_product_type): row
+            for row in StockAggregate.objects.select_for_update()
+            .filter(city=city, **key_filter)
+            .order_by('blood_group', 'blood_product_type')
+        }
+        totals = {
+            (row['blood_group'], row['blood_product_type']): row
+            for row in stock.filter(hospital__is_active=True, **key_filter)
+            .values('blood_group', 'blood_product_type')
+            .annotate(units=Sum('units_available'), hospitals=Count('id'), updated=Max('updated_at'))
+        }
+
+        changed = []
+        for key in keys:
+            aggregate = aggregates[key]
+            total = totals.get(key, {})
+            aggregate.units_available = total.get('units', 0)
+            aggregate.hospital_count = total.get('hospitals', 0)
+            aggregate.last_updated = total.get('updated')
+            changed.append(aggregate)
+        StockAggregate.objects.bulk_update(changed, ['units_available', 'hospital_count', 'last_updated'])
+
+
+def get_stock_rows(hospital, keys):
+    """
+    Read current stock for the given keys of one hospital in one query.
+
+    Args:
+        hospital: Hospital instance
+        keys: iterable of (blood_group, blood_product_type)
+
+    Returns:
+        dict mapping (blood_group, blood_product_type) -> BloodStock
+    """
+    query = Q()
+    for blood_group, blood_product_type in keys:
+        query |= Q(blood_group=blood_group, blood_product_type=blood_product_type)
+    if not query:
+        return {}
+
+    stock_by_key = {}
+    for row in BloodStock.objects.filter(hospital=hospital).filter(query).order_by():
+        row.hospital = hospital
+        stock_by_key[(row.blood_group, row.blood_product_type)] = row
+    return stock_by_key
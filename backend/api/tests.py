@@ -0,0 +1,545 @@
+import math
+import re
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction as db_transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .geo import cell_size, covering_cells, encode_geohash
+from .models import (
+    BloodStock, DonorProfile, Hospital, HospitalReq, SMSNotificationLog, StockAlert, StockChange, Transaction,
+)
+from .nearby import hospital_grid, nearest_hospitals_with_stock
+from .stock_alerts import _apply, _open_alerts, _reconcile, sweep_stock_alerts
+from .stock_changes import prune_stock_changes
+from .stock_service import apply_stock_deltas, fold_stock_deltas, set_stock_level
+from .transfers import CANDIDATE_SUPPLIERS, SHORTAGE_LEVELS, _shortage_levels, plan_transfers, solve_transfers
+
+
+class HotQueryPlanTests(TestCase):
+    """
+    Run EXPLAIN on the hot queries and fail if any of them falls back to a
+    full table scan (or a sort that ignores the index).
+    """
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables always favour a seq scan; ask the planner
+            # whether an index path exists at all.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET enable_seqscan = on')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, ordered=False):
+        plan = self.explain(queryset)
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'sqlite':
+            full_scan = re.search(rf'\bSCAN {table}\b(?! USING)', plan)
+            sorted_in_temp = 'USE TEMP B-TREE FOR ORDER BY' in plan
+        else:
+            full_scan = re.search(rf'Seq Scan on {table}\b', plan)
+            sorted_in_temp = bool(re.search(r'^\s*(->\s*)?Sort\b', plan, re.MULTILINE))
+        self.assertFalse(full_scan, f'Full table scan on {table}:\n{plan}')
+        if ordered:
+            self.assertFalse(sorted_in_temp, f'ORDER BY on {table} does not use an index:\n{plan}')
+
+    def test_analytics_donation_range_sum(self):
+        week_ago = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            Transaction.objects.filter(timestamp__gte=week_ago, units_change__gt=0, is_adjustment=False)
+            .order_by().values_list('units_change')
+        )
+
+    def test_analytics_transaction_count(self):
+        week_ago = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            Transaction.objects.filter(timestamp__gte=week_ago, is_adjustment=False).order_by().values_list('id')
+        )
+
+    def test_ledger_ordering(self):
+        self.assertUsesIndex(Transaction.objects.order_by('-ingested_at')[:20], ordered=True)
+
+    def test_ledger_ordering_per_hospital(self):
+        self.assertUsesIndex(
+            Transaction.objects.filter(hospital_id=uuid.uuid4()).order_by('-ingested_at')[:20],
+            ordered=True,
+        )
+
+    def test_ledger_cursor_page(self):
+        position = timezone.now()
+        self.assertUsesIndex(
+            Transaction.objects.filter(ingested_at__lt=position).order_by('-ingested_at', '-id')[:21],
+            ordered=True,
+        )
+
+    def test_ledger_cursor_page_per_hospital(self):
+        self.assertUsesIndex(
+            Transaction.objects.filter(hospital_id=uuid.uuid4(), ingested_at__lt=timezone.now())
+            .order_by('-ingested_at', '-id')[:21],
+            ordered=True,
+        )
+
+    def test_alert_cursor_page(self):
+        self.assertUsesIndex(StockAlert.objects.order_by('-triggered_at', '-id')[:21], ordered=True)
+
+    def test_sms_log_cursor_page(self):
+        self.assertUsesIndex(SMSNotificationLog.objects.order_by('-sent_at', '-id')[:21], ordered=True)
+
+    def test_open_alert_lookup(self):
+        self.assertUsesIndex(
+            StockAlert.objects.filter(
+                hospital_id=uuid.uuid4(), blood_group='O+', resolved_at__isnull=True
+            )
+        )
+
+    def test_open_alerts_for_hospital(self):
+        self.assertUsesIndex(
+            StockAlert.objects.filter(
+                hospital_id=uuid.uuid4(), blood_group__in=['O+', 'O-'], resolved_at__isnull=True
+            )
+        )
+
+    def test_open_hospital_requests(self):
+        self.assertUsesIndex(
+            HospitalReq.objects.filter(fulfilled=False).order_by('-is_critical', '-created_at'),
+            ordered=True,
+        )
+
+    def test_donor_matching(self):
+        self.assertUsesIndex(DonorProfile.objects.filter(blood_group='O+', location_consent=True))
+
+
+class IdempotencyKeyMigrationTests(TransactionTestCase):
+    """Retry duplicates already in the ledger must not block the unique constraint."""
+
+    before = [('api', '0004_transaction_blood_product_type')]
+    after = [('api', '0005_transaction_idempotency_key')]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_are_rekeyed(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        Hospital = apps.get_model('api', 'Hospital')
+        OldTransaction = apps.get_model('api', 'Transaction')
+        hospital = Hospital.objects.create(code='H1', name='H1', api_key_hash='x')
+        other = Hospital.objects.create(code='H2', name='H2', api_key_hash='x')
+        now = timezone.now()
+        for reference, owner in [('R1', hospital), ('R1', hospital), ('R1', hospital), ('R1~dup1', hospital),
+                                 ('R1', other), ('', hospital), ('', hospital)]:
+            OldTransaction.objects.create(
+                hospital=owner, blood_group='O+', units_change=1, timestamp=now, source_reference=reference
+            )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+
+        references = sorted(
+            Transaction.objects.filter(hospital_id=hospital.pk).values_list('source_reference', flat=True)
+        )
+        self.assertEqual(references, ['', '', 'R1', 'R1~dup1', 'R1~dup2', 'R1~dup3'])
+        self.assertEqual(Transaction.objects.filter(hospital_id=other.pk, source_reference='R1').count(), 1)
+
+
+class NearestStockTests(TestCase):
+    """k-nearest search over the hospital grid."""
+
+    def setUp(self):
+        # Hospitals about 5 km apart on a line east of Kathmandu, each holding 10 units of O-.
+        self.hospitals = []
+        for number in range(8):
+            hospital = Hospital.objects.create(
+                code=f'NEAR-{number}', name=f'Hospital {number}', api_key_hash='x',
+                latitude='27.700000', longitude=f'{85.3 + number * 0.05:.6f}',
+            )
+            BloodStock.objects.create(hospital=hospital, blood_group='O-', units_available=10)
+            self.hospitals.append(hospital)
+        hospital_grid.clear()
+
+    def codes(self, results):
+        return [result['hospital']['code'] for result in results]
+
+    def test_k_closest_in_order(self):
+        results = nearest_hospitals_with_stock(27.7, 85.31, 'O-', k=3)
+        self.assertEqual(self.codes(results), ['NEAR-0', 'NEAR-1', 'NEAR-2'])
+        self.assertEqual([r['distance_km'] for r in results], sorted(r['distance_km'] for r in results))
+
+    def test_min_units_skips_hospitals(self):
+        BloodStock.objects.filter(hospital=self.hospitals[0]).update(units_available=2)
+        results = nearest_hospitals_with_stock(27.7, 85.3, 'O-', k=2, min_units=5)
+        self.assertEqual(self.codes(results), ['NEAR-1', 'NEAR-2'])
+
+    def test_exclude(self):
+        origin = self.hospitals[3]
+        results = nearest_hospitals_with_stock(
+            origin.latitude, origin.longitude, 'O-', k=2, exclude=origin.id
+        )
+        self.assertNotIn('NEAR-3', self.codes(results))
+        self.assertEqual(sorted(self.codes(results)), ['NEAR-2', 'NEAR-4'])
+
+    def test_radius_km(self):
+        results = nearest_hospitals_with_stock(27.7, 85.3, 'O-', k=8, max_km=12)
+        self.assertEqual(self.codes(results), ['NEAR-0', 'NEAR-1', 'NEAR-2'])
+        self.assertTrue(all(r['distance_km'] <= 12 for r in results))
+
+    def test_far_origin_terminates(self):
+        # The walk covers only rings that overlap the occupied cells, however far the origin.
+        rings = list(hospital_grid.rings(-90.0, -180.0))
+        index = hospital_grid.index()
+        span = max(index['rows'][1] - index['rows'][0], index['cols'][1] - index['cols'][0])
+        self.assertLessEqual(len(rings), span + 1)
+        self.assertEqual(nearest_hospitals_with_stock(-90, -180, 'O-'), [])
+
+    def test_default_radius_caps_search(self):
+        with self.settings(NEARBY_MAX_KM=8):
+            results = nearest_hospitals_with_stock(27.7, 85.3, 'O-', k=8, max_km=100)
+        self.assertEqual(self.codes(results), ['NEAR-0', 'NEAR-1'])
+
+
+class GeohashTests(TestCase):
+    """Geohash encoding and bounding-box covers."""
+
+    def test_encode_known_point(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744), 'u4pruydqq')
+        self.assertEqual(encode_geohash(42.6, -5.6, precision=5), 'ezs42')
+        self.assertEqual(encode_geohash(None, 85.3), '')
+
+    def test_prefix_is_coarser_cell(self):
+        full = encode_geohash(27.7172, 85.3240)
+        for precision in range(1, 9):
+            self.assertEqual(encode_geohash(27.7172, 85.3240, precision), full[:precision])
+
+    def test_cover_contains_box(self):
+        south, west, north, east = 27.60, 85.20, 27.80, 85.45
+        cells = covering_cells(south, west, north, east)
+        self.assertLessEqual(len(cells), 16)
+        self.assertEqual(len({len(cell) for cell in cells}), 1)
+        for lat in (south, (south + north) / 2, north):
+            for lng in (west, (west + east) / 2, east):
+                self.assertTrue(any(encode_geohash(lat, lng).startswith(cell) for cell in cells), (lat, lng))
+
+    def test_cover_is_finest_within_limit(self):
+        # A box inside one finest cell is covered by exactly that cell.
+        self.assertEqual(covering_cells(27.71720, 85.32400, 27.71721, 85.32401),
+                         [encode_geohash(27.717205, 85.324005)])
+        # Finer cells would need more than max_cells.
+        cells = covering_cells(27.60, 85.20, 27.80, 85.45, max_cells=4)
+        lat_size, lng_size = cell_size(len(cells[0]) + 1)
+        self.assertGreater(math.ceil(0.2 / lat_size) * math.ceil(0.25 / lng_size), 4)
+
+    def test_whole_world(self):
+        self.assertEqual(len(covering_cells(-90, -180, 90, 180, max_cells=32)), 32)
+
+
+class MapViewportTests(TestCase):
+    """Viewport markers: clusters when zoomed out, hospitals when zoomed in."""
+
+    url = '/api/v1/public/map-viewport/'
+
+    def setUp(self):
+        for number, (lat, lng) in enumerate([(27.700, 85.300), (27.701, 85.301), (28.200, 83.980)]):
+            hospital = Hospital.objects.create(
+                code=f'MAP-{number}', name=f'Map Hospital {number}', api_key_hash='x',
+                latitude=f'{lat:.6f}', longitude=f'{lng:.6f}',
+            )
+            set_stock_level(hospital, 'O+', 4)
+
+    def viewport(self, bbox, zoom):
+        return self.client.get(self.url, {'bbox': bbox, 'zoom': zoom})
+
+    def test_bbox_validation(self):
+        for bbox, zoom in [('', 10), ('85,27,86', 10), ('85,28,86,27', 10), ('85,27,86,91', 10),
+                           ('85,27,nan,28', 10), ('85,27,86,28', 30), ('85,27,86,28', 'x')]:
+            response = self.viewport(bbox, zoom)
+            self.assertEqual(response.status_code, 400, (bbox, zoom))
+            self.assertIn('error', response.json())
+
+    def test_clusters_when_zoomed_out(self):
+        data = self.viewport('85.2,27.6,85.4,27.8', 8).json()
+        self.assertEqual((data['mode'], data['hospitals'], data['count']), ('clusters', [], 2))
+        cluster, = data['clusters']
+        self.assertEqual((cluster['hospital_count'], cluster['total_units']), (2, 8))
+        self.assertEqual(cluster['stock']['O+'], 8)
+        self.assertNotIn('hospital', cluster)
+
+    def test_single_hospital_cluster_names_it(self):
+        data = self.viewport('83.9,28.1,84.1,28.3', 8).json()
+        cluster, = data['clusters']
+        self.assertEqual(cluster['hospital']['code'], 'MAP-2')
+
+    def test_hospitals_when_zoomed_in(self):
+        with self.settings(MAP_CLUSTER_MAX_ZOOM=11):
+            data = self.viewport('85.2,27.6,85.4,27.8', 14).json()
+        self.assertEqual((data['mode'], data['clusters']), ('hospitals', []))
+        self.assertEqual(sorted(hospital['code'] for hospital in data['hospitals']), ['MAP-0', 'MAP-1'])
+
+
+class TransferPlanTests(TestCase):
+    """Min-cost transfers from surplus to shortage hospitals."""
+
+    penalties = [penalty for _, _, penalty in SHORTAGE_LEVELS]
+
+    def test_known_optimum_beats_nearest_first(self):
+        # Each supplier can fill one shortage's emergency and critical units.
+        # Nearest-first would send supplier 0 to shortage 0 (50 + 5000 unit-m);
+        # the optimum sends it to shortage 1 instead (500 + 100).
+        flows = solve_transfers(
+            [5, 5], [_shortage_levels(0), _shortage_levels(0)], self.penalties, [[10, 100], [20, 1000]]
+        )
+        self.assertEqual(flows, {(0, 1): 5, (1, 0): 5})
+
+    def test_urgent_shortage_first(self):
+        # Three units go to the far emergency, not the near critical shortage.
+        flows = solve_transfers(
+            [3], [_shortage_levels(4), _shortage_levels(0)], self.penalties, [[1000, 900000]]
+        )
+        self.assertEqual(flows, {(0, 1): 3})
+
+    def test_pricing_adds_suppliers_beyond_candidates(self):
+        # Shortage 0 has CANDIDATE_SUPPLIERS near suppliers, all taken by
+        # shortage 1 for which they are the only ones; shortage 0 must then
+        # be served by the far supplier it was not linked to at first.
+        near = CANDIDATE_SUPPLIERS
+        distances = [[100, 200] for _ in range(near)] + [[50000, 10 ** 9]]
+        flows = solve_transfers(
+            [1] * near + [3], [_shortage_levels(12), [near, 0, 0]], self.penalties, distances
+        )
+        self.assertEqual(sum(units for (i, j), units in flows.items() if j == 1), near)
+        self.assertEqual(flows.get((near, 0)), 3)
+
+    def test_max_distance(self):
+        self.assertEqual(solve_transfers([5], [_shortage_levels(0)], self.penalties, [[50000]], max_m=10000), {})
+
+    def create_network(self):
+        # One supplier with 10 spare O- units, a shortage 5 km away and one about 140 km away.
+        supplier = Hospital.objects.create(code='TR-S', name='Supplier', api_key_hash='x',
+                                           latitude='27.700000', longitude='85.300000')
+        near = Hospital.objects.create(code='TR-N', name='Near', api_key_hash='x',
+                                       latitude='27.700000', longitude='85.350000')
+        far = Hospital.objects.create(code='TR-F', name='Far', api_key_hash='x', city='Pokhara',
+                                      latitude='28.200000', longitude='83.980000')
+        BloodStock.objects.create(hospital=supplier, blood_group='O-', units_available=30)
+        BloodStock.objects.create(hospital=near, blood_group='O-', units_available=0)
+        BloodStock.objects.create(hospital=far, blood_group='O-', units_available=0)
+
+    def test_plan_shares_spare_units_by_urgency(self):
+        self.create_network()
+        plan = plan_transfers(blood_groups=['O-'], safety_units=20)
+        self.assertEqual({t['to']['code']: t['units'] for t in plan['transfers']}, {'TR-N': 5, 'TR-F': 5})
+        summary, = plan['summary']
+        self.assertEqual((summary['spare_units'], summary['transferred_units']), (10, 10))
+        self.assertEqual(summary['still_short'], {'emergency': 0, 'critical': 0, 'low': 2})
+
+    def test_plan_max_km(self):
+        self.create_network()
+        plan = plan_transfers(blood_groups=['O-'], safety_units=20, max_km=50)
+        self.assertEqual([(t['to']['code'], t['units']) for t in plan['transfers']], [('TR-N', 10)])
+        self.assertEqual(plan['summary'][0]['still_short'], {'emergency': 1, 'critical': 0, 'low': 1})
+
+    def test_admin_endpoint(self):
+        self.create_network()
+        url = '/api/v1/admin/transfer-plan/'
+        client = APIClient()
+        self.assertEqual(client.get(url).status_code, 401)
+        client.force_authenticate(get_user_model().objects.create_user('transfer-admin', is_staff=True))
+        self.assertEqual(client.get(url, {'max_km': 0}).status_code, 400)
+        data = client.get(url, {'blood_group': 'O-', 'max_km': 50}).json()
+        self.assertEqual([(t['to']['code'], t['units']) for t in data['transfers']], [('TR-N', 10)])
+        self.assertEqual(data['max_km'], 50)
+
+
+class StockAlertTests(TestCase):
+    """Alerts follow the stock a change touched, per hospital and blood group."""
+
+    def setUp(self):
+        self.hospital = Hospital.objects.create(code='ALERT-1', name='Alert Hospital', api_key_hash='x')
+
+    def open_alerts(self, blood_group='O-'):
+        return list(StockAlert.objects.filter(
+            hospital=self.hospital, blood_group=blood_group, resolved_at__isnull=True
+        ))
+
+    def ingest(self, *changes):
+        with db_transaction.atomic():
+            apply_stock_deltas(self.hospital, fold_stock_deltas(
+                {'blood_group': blood_group, 'blood_product_type': product, 'units_change': change}
+                for blood_group, product, change in changes
+            ))
+
+    def test_open(self):
+        set_stock_level(self.hospital, 'O-', 10)
+        alert, = self.open_alerts()
+        self.assertEqual((alert.alert_level, alert.threshold, alert.current_units), ('low', 15, 10))
+        self.assertFalse(alert.notified)
+
+    def test_no_alert_above_thresholds(self):
+        set_stock_level(self.hospital, 'O-', 15)
+        self.assertEqual(self.open_alerts(), [])
+
+    def test_escalation_resets_notified(self):
+        set_stock_level(self.hospital, 'O-', 10)
+        StockAlert.objects.filter(hospital=self.hospital).update(notified=True)
+
+        set_stock_level(self.hospital, 'O-', 8)
+        alert, = self.open_alerts()
+        self.assertEqual((alert.alert_level, alert.current_units, alert.notified), ('low', 8, True))
+
+        set_stock_level(self.hospital, 'O-', 2)
+        escalated, = self.open_alerts()
+        self.assertEqual(escalated.pk, alert.pk)
+        self.assertEqual((escalated.alert_level, escalated.threshold, escalated.current_units), ('emergency', 3, 2))
+        self.assertFalse(escalated.notified)
+
+    def test_de_escalation_keeps_notified(self):
+        set_stock_level(self.hospital, 'O-', 2)
+        StockAlert.objects.filter(hospital=self.hospital).update(notified=True)
+        set_stock_level(self.hospital, 'O-', 4)
+        alert, = self.open_alerts()
+        self.assertEqual((alert.alert_level, alert.threshold, alert.notified), ('critical', 5, True))
+
+    def test_resolve(self):
+        set_stock_level(self.hospital, 'O-', 4)
+        alert, = self.open_alerts()
+        set_stock_level(self.hospital, 'O-', 20)
+        self.assertEqual(self.open_alerts(), [])
+        alert.refresh_from_db()
+        self.assertIsNotNone(alert.resolved_at)
+
+        set_stock_level(self.hospital, 'O-', 1)
+        reopened, = self.open_alerts()
+        self.assertNotEqual(reopened.pk, alert.pk)
+
+    def test_ingest_path(self):
+        self.ingest(('O-', 'whole_blood', 12), ('A+', 'whole_blood', 30))
+        alert, = self.open_alerts()
+        self.assertEqual((alert.alert_level, alert.current_units), ('low', 12))
+        self.assertEqual(self.open_alerts('A+'), [])
+
+        # Units are counted across products of the group.
+        self.ingest(('O-', 'plasma', 5))
+        self.assertEqual(self.open_alerts(), [])
+
+        self.ingest(('O-', 'whole_blood', -12), ('O-', 'plasma', -3), ('A+', 'whole_blood', -40))
+        alert, = self.open_alerts()
+        self.assertEqual((alert.alert_level, alert.current_units), ('emergency', 2))
+        a_pos, = self.open_alerts('A+')
+        self.assertEqual((a_pos.alert_level, a_pos.current_units), ('emergency', 0))
+
+    def test_rolled_back_ingest_leaves_alerts(self):
+        set_stock_level(self.hospital, 'O-', 20)
+        with self.assertRaises(RuntimeError), db_transaction.atomic():
+            apply_stock_deltas(self.hospital, fold_stock_deltas(
+                [{'blood_group': 'O-', 'units_change': -19}]
+            ))
+            self.assertEqual(len(self.open_alerts()), 1)
+            raise RuntimeError
+        self.assertEqual(self.open_alerts(), [])
+
+    def test_sweep_catches_up_with_bulk_writes(self):
+        set_stock_level(self.hospital, 'O-', 10)
+        set_stock_level(self.hospital, 'A+', 40)
+        # bulk_update bypasses stock_service, so only the sweep sees these.
+        stock = list(BloodStock.objects.filter(hospital=self.hospital).order_by('blood_group'))
+        stock[0].units_available, stock[1].units_available = 1, 30
+        BloodStock.objects.bulk_update(stock, ['units_available'])
+
+        counts = sweep_stock_alerts(Hospital.objects.filter(pk=self.hospital.pk))
+        self.assertEqual(counts, {'opened': 1, 'escalated': 0, 'resolved': 1})
+        self.assertEqual(self.open_alerts(), [])
+        a_pos, = self.open_alerts('A+')
+        self.assertEqual((a_pos.alert_level, a_pos.current_units), ('emergency', 1))
+        self.assertEqual(sweep_stock_alerts(), {'opened': 0, 'escalated': 0, 'resolved': 0})
+
+    def test_stale_sweep_result_does_not_overwrite(self):
+        set_stock_level(self.hospital, 'O-', 10)
+        key = (self.hospital.pk, 'O-')
+        with db_transaction.atomic():
+            stale = _reconcile({key: 4}, _open_alerts(StockAlert.objects.filter(hospital=self.hospital)))
+        # The alert moves on after the sweep read it.
+        set_stock_level(self.hospital, 'O-', 8)
+        StockAlert.objects.filter(hospital=self.hospital).update(notified=True)
+        _apply(*stale)
+        alert, = self.open_alerts()
+        self.assertEqual((alert.alert_level, alert.current_units, alert.notified), ('low', 8, True))
+
+
+class StockChangeFeedTests(TestCase):
+    """Delta-sync feed over the stock change log."""
+
+    url = '/api/v1/stock/changes/'
+
+    def setUp(self):
+        self.hospital = Hospital.objects.create(code='FEED-1', name='Feed Hospital', api_key_hash='x')
+
+    def changes(self, since, **params):
+        query = '&'.join(f'{name}={value}' for name, value in {'since': since, **params}.items())
+        return self.client.get(f'{self.url}?{query}').json()
+
+    def test_cursor_then_changes_since(self):
+        set_stock_level(self.hospital, 'A+', 5)
+        cursor = self.client.get(self.url).json()['cursor']
+        self.assertEqual(self.changes(cursor)['changes'], [])
+
+        set_stock_level(self.hospital, 'O-', 2)
+        set_stock_level(self.hospital, 'A+', 7)
+        page = self.changes(cursor)
+        # Keys come once each, in order of their latest change, with their current level.
+        self.assertEqual(
+            [(row['blood_group'], row['units_available']) for row in page['changes']], [('O-', 2), ('A+', 7)]
+        )
+        self.assertFalse(page['has_more'])
+        self.assertEqual(self.changes(page['cursor'])['changes'], [])
+
+    def test_paging(self):
+        for blood_group in ('A+', 'B+', 'O+'):
+            set_stock_level(self.hospital, blood_group, 3)
+        first = self.changes(0, page_size=2)
+        self.assertEqual([row['blood_group'] for row in first['changes']], ['A+', 'B+'])
+        self.assertTrue(first['has_more'])
+        second = self.changes(first['cursor'], page_size=2)
+        self.assertEqual([row['blood_group'] for row in second['changes']], ['O+'])
+        self.assertFalse(second['has_more'])
+
+    def test_deleted_rows(self):
+        set_stock_level(self.hospital, 'AB-', 4)
+        cursor = self.client.get(self.url).json()['cursor']
+        BloodStock.objects.get(hospital=self.hospital, blood_group='AB-').delete()
+        page = self.changes(cursor)
+        self.assertEqual(page['changes'], [])
+        self.assertEqual(page['deleted'], [
+            {'hospital': str(self.hospital.pk), 'blood_group': 'AB-', 'blood_product_type': 'whole_blood'}
+        ])
+
+    def test_waits_for_a_recent_gap(self):
+        set_stock_level(self.hospital, 'A+', 5)
+        cursor = self.client.get(self.url).json()['cursor']
+        # An id taken by a stock write that has not committed yet.
+        later = StockChange.objects.create(id=cursor + 2, hospital_id=self.hospital.pk, blood_group='B+')
+        page = self.changes(cursor)
+        self.assertEqual((page['changes'], page['cursor']), ([], cursor))
+        self.assertEqual(self.client.get(self.url).json()['cursor'], cursor)
+
+        # Once the gap is older than the settle time it is taken as a rollback.
+        StockChange.objects.filter(pk=later.pk).update(changed_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.changes(cursor)['cursor'], later.pk)
+
+    def test_expired_cursor(self):
+        set_stock_level(self.hospital, 'A+', 5)
+        set_stock_level(self.hospital, 'A+', 6)
+        StockChange.objects.update(changed_at=timezone.now() - timedelta(days=30))
+        prune_stock_changes(timezone.now() - timedelta(days=7))
+        response = self.client.get(f'{self.url}?since=0')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.client.get(f'{self.url}?since=x').status_code, 400)
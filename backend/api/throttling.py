@@ -0,0 +1,158 @@
+"""
+BloodSync Nepal - Ingest Throttling
+Per-hospital token buckets for the ingest endpoints.
+
+Each hospital refills at ``ingest_rate_per_minute`` events per minute up to
+``ingest_burst`` events (falling back to ``INGEST_THROTTLE_RATE`` /
+``INGEST_THROTTLE_BURST``). A batch costs one token per event. Over-limit
+calls get 429 with ``Retry-After``.
+
+The bucket lives in the ``throttle`` cache (Redis, so every worker shares
+it, or local memory for one process; see ``api.checks``). It is stored as a
+single "theoretical arrival time" (the moment the bucket would be full
+again, in microseconds) and reserved with an atomic ``incr``, so workers
+contending for a busy bucket cannot spend the same tokens twice. A rejected
+call refunds its reservation. The key expires when the bucket is full
+again, so an idle bucket restarts through ``cache.add`` rather than an
+overwrite that could drop a concurrent reservation.
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from rest_framework.throttling import BaseThrottle
+
+from .models import Hospital
+
+_BUCKET_KEY = 'ingest-throttle:bucket:{}'
+_COUNTER_KEY = 'ingest-throttle:{}:{}:{}'
+_COUNTER_TIMEOUT = 180
+
+cache = ConnectionProxy(caches, 'throttle')
+
+
+def hospital_limits(hospital):
+    """Return (events_per_minute, burst) for a hospital; rate 0 means unlimited."""
+    rate = hospital.ingest_rate_per_minute
+    if rate is None:
+        rate = settings.INGEST_THROTTLE_RATE
+    burst = hospital.ingest_burst
+    if burst is None:
+        burst = settings.INGEST_THROTTLE_BURST
+    return rate, max(1, burst)
+
+
+def _incr(key, delta, initial, timeout):
+    """``cache.incr`` that creates the key on first use."""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, initial, timeout):
+            return initial
+        return cache.incr(key, delta)
+
+
+def _record(hospital_id, outcome, events):
+    minute = int(time.time() // 60)
+    _incr(_COUNTER_KEY.format(outcome, hospital_id, minute), events, events, _COUNTER_TIMEOUT)
+
+
+def consume_tokens(hospital, cost=1):
+    """
+    Take ``cost`` tokens from the hospital's bucket.
+
+    A call larger than the burst is admitted only when the bucket is full
+    and leaves it in debt, so oversized batches are slowed, not rejected
+    forever.
+
+    Returns:
+        0 if admitted, otherwise seconds until the call would be admitted
+    """
+    rate, burst = hospital_limits(hospital)
+    if not rate:
+        _record(hospital.pk, 'accepted', cost)
+        return 0
+
+    interval = 60_000_000 // rate  # microseconds per token
+    charge = cost * interval
+    now = time.time_ns() // 1000
+    key = _BUCKET_KEY.format(hospital.pk)
+
+    tat = _incr(key, charge, now + charge, _full_in(now + charge, now))
+
+    allowance = max(burst * interval, charge)
+    if tat - now > allowance:
+        cache.decr(key, charge)
+        _record(hospital.pk, 'rejected', cost)
+        return (tat - now - allowance) / 1_000_000
+
+    # Expire the bucket once it has refilled. A concurrent call may shorten
+    # this by its own charge at most; the timeout is rounded up to a second.
+    cache.touch(key, _full_in(tat, now))
+    _record(hospital.pk, 'accepted', cost)
+    return 0
+
+
+def _full_in(tat, now):
+    """Whole seconds until a bucket with theoretical arrival time ``tat`` is full."""
+    return max(1, math.ceil((tat - now) / 1_000_000))
+
+
+class HospitalIngestThrottle(BaseThrottle):
+    """
+    Token-bucket throttle keyed on the authenticated Hospital.
+
+    Views may define ``get_throttle_cost(request)`` to charge more than one
+    token per call.
+    """
+
+    def allow_request(self, request, view):
+        hospital = request.user
+        if not isinstance(hospital, Hospital):
+            # Unauthenticated calls are rejected by the view itself.
+            return True
+        get_cost = getattr(view, 'get_throttle_cost', None)
+        cost = max(1, get_cost(request)) if get_cost else 1
+        self._wait = consume_tokens(hospital, cost)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+def ingest_throttle_stats():
+    """
+    Per-hospital accepted/rejected events for the current and previous minute,
+    busiest first. Counters are shared by all workers through the cache.
+    """
+    minute = int(time.time() // 60)
+    hospitals = list(Hospital.objects.filter(is_active=True).only(
+        'id', 'code', 'ingest_rate_per_minute', 'ingest_burst'
+    ))
+    keys = [
+        _COUNTER_KEY.format(outcome, hospital.pk, bucket)
+        for hospital in hospitals
+        for outcome in ('accepted', 'rejected')
+        for bucket in (minute - 1, minute)
+    ]
+    counts = cache.get_many(keys)
+
+    rows = []
+    for hospital in hospitals:
+        row = {'hospital': hospital.code}
+        for outcome in ('accepted', 'rejected'):
+            row[f'{outcome}_last_minute'] = counts.get(_COUNTER_KEY.format(outcome, hospital.pk, minute - 1), 0)
+            row[f'{outcome}_this_minute'] = counts.get(_COUNTER_KEY.format(outcome, hospital.pk, minute), 0)
+        if any(row[name] for name in row if name != 'hospital'):
+            row['rate_per_minute'], row['burst'] = hospital_limits(hospital)
+            rows.append(row)
+
+    rows.sort(
+        key=lambda row: (row['accepted_last_minute'] + row['rejected_last_minute'],
+                         row['accepted_this_minute'] + row['rejected_this_minute']),
+        reverse=True,
+    )
+    return rows
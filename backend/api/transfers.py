@@ -0,0 +1,331 @@
+"""
+BloodSync Nepal - Transfer Planner
+Network-wide plan of inter-hospital blood transfers for current shortages.
+
+For every blood group and product, hospitals below the low-stock alert
+threshold are demand nodes and hospitals above ``TRANSFER_SAFETY_UNITS``
+are supply nodes (their units above that level). A min-cost flow decides
+how many units move between which hospitals:
+
+* shortages are filled emergency units first (up to 3), then critical
+  (up to 5), then low (up to 15), so scarce supply goes where it is most
+  needed, and
+* among plans that fill the same shortages, the one with the fewest
+  unit-kilometres wins.
+
+The flow is solved by successive shortest paths (Dijkstra with node
+potentials). To keep the graph small, each shortage is first linked to
+its nearest suppliers only. The final potentials then price every
+unlinked pair, and any pair that could lower the cost is added before
+solving again, so the result is optimal for the complete network.
+"""
+
+import heapq
+import math
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import BLOOD_GROUP_CHOICES, BLOOD_PRODUCT_CHOICES, BloodStock, Hospital
+
+# Alert levels (as in ``stock_alerts.ALERT_THRESHOLDS``) a shortage is filled
+# through, most urgent first, with the per-unit penalty for leaving it unfilled.
+# Costs are in metres; each penalty outweighs any route cost of the level below.
+SHORTAGE_LEVELS = [
+    ('emergency', 3, 10 ** 17),
+    ('critical', 5, 10 ** 13),
+    ('low', 15, 10 ** 9),
+]
+
+EARTH_DIAMETER_M = 2 * 6371000
+
+# Suppliers each shortage is linked to before pricing adds more.
+CANDIDATE_SUPPLIERS = 8
+
+
+class _Network:
+    """Residual graph for successive-shortest-path min-cost flow."""
+
+    def __init__(self, nodes):
+        self.adjacent = [[] for _ in range(nodes)]
+        self.to, self.capacity, self.cost = [], [], []
+
+    def add_edge(self, u, v, capacity, cost):
+        """Add u -> v and its residual pair; returns the index of u -> v (the pair is ``index ^ 1``)."""
+        edge = len(self.to)
+        self.adjacent[u].append(edge)
+        self.adjacent[v].append(edge + 1)
+        self.to += [v, u]
+        self.capacity += [capacity, 0]
+        self.cost += [cost, -cost]
+        return edge
+
+    def min_cost_flow(self, source, sink, potential):
+        """
+        Augment along shortest paths while that lowers the total cost.
+
+        ``potential`` must give every residual edge a non-negative reduced
+        cost; it is kept that way and returned for pricing. Paths are
+        searched backwards from the sink: only shortages at the most urgent
+        unfilled level are near it, so a search settles few nodes.
+        """
+        to, capacity, cost, adjacent = self.to, self.capacity, self.cost, self.adjacent
+        while True:
+            distance = {sink: 0}
+            via = {}
+            settled = []
+            heap = [(0, sink)]
+            while heap:
+                d, v = heapq.heappop(heap)
+                if d > distance[v]:
+                    continue
+                settled.append(v)
+                if v == source:
+                    break
+                base = d - potential[v]
+                for edge in adjacent[v]:
+                    # The residual edge u -> v paired with v -> u
+                    inbound = edge ^ 1
+                    if capacity[inbound]:
+                        u = to[edge]
+                        nd = base + cost[inbound] + potential[u]
+                        if nd < distance.get(u, nd + 1):
+                            distance[u] = nd
+                            via[u] = inbound
+                            heapq.heappush(heap, (nd, u))
+            if not settled or settled[-1] != source:
+                return potential
+
+            # Lowering every other node by the source distance as well would
+            # not change any reduced cost, so only settled nodes are updated.
+            reach = distance[source]
+            for v in settled:
+                potential[v] -= distance[v] - reach
+            if potential[sink] - potential[source] >= 0:
+                # The cheapest augmenting path no longer lowers the cost.
+                return potential
+
+            units = None
+            u = source
+            while u != sink:
+                edge = via[u]
+                units = capacity[edge] if units is None else min(units, capacity[edge])
+                u = to[edge]
+            u = source
+            while u != sink:
+                edge = via[u]
+                capacity[edge] -= units
+                capacity[edge ^ 1] += units
+                u = to[edge]
+
+
+def solve_transfers(supplies, shortages, penalties, distances, max_m=None):
+    """
+    Optimal transfers for one blood group and product.
+
+    Args:
+        supplies: spare units per supplier
+        shortages: units missing at each level, per shortage
+        penalties: per-unit penalty of leaving each level unfilled
+        distances: metres from every supplier (rows) to every shortage
+        max_m: optional longest transfer in metres
+
+    Returns:
+        dict (supplier index, shortage index) -> units
+    """
+    if not supplies or not shortages:
+        return {}
+    supplier_count, shortage_count = len(supplies), len(shortages)
+    first_shortage = 1 + supplier_count
+    first_level = first_shortage + shortage_count
+    source = 0
+    spare = first_level + len(penalties)
+    sink = spare + 1
+
+    linked = set()
+    for j in range(shortage_count):
+        nearest = sorted(
+            (row[j], i) for i, row in enumerate(distances) if max_m is None or row[j] <= max_m
+        )
+        linked.update((i, j) for _, i in nearest[:CANDIDATE_SUPPLIERS])
+
+    while True:
+        network = _Network(sink + 1)
+        for i, units in enumerate(supplies):
+            network.add_edge(source, 1 + i, units, 0)
+            # Keeping spare units costs nothing. This keeps the sink reachable
+            # while any supply is left, so the final potentials also rule
+            # out augmenting paths through pairs that are not linked yet.
+            network.add_edge(1 + i, spare, units, 0)
+        network.add_edge(spare, sink, sum(supplies), 0)
+        route_edges = {
+            (i, j): network.add_edge(1 + i, first_shortage + j, sum(shortages[j]), distances[i][j])
+            for i, j in sorted(linked)
+        }
+        for j, levels in enumerate(shortages):
+            for level, units in enumerate(levels):
+                if units:
+                    network.add_edge(first_shortage + j, first_level + level, units, 0)
+        for level, penalty in enumerate(penalties):
+            network.add_edge(first_level + level, sink, sum(levels[level] for levels in shortages), -penalty)
+
+        # Starting potentials that give every edge a non-negative reduced cost
+        # (suppliers and the spare node stay at 0).
+        potential = [0] * (sink + 1)
+        nearest = {}
+        for i, j in route_edges:
+            nearest[j] = min(nearest.get(j, distances[i][j]), distances[i][j])
+        for j, metres in nearest.items():
+            potential[first_shortage + j] = metres
+        for level in range(len(penalties)):
+            potential[first_level + level] = min(
+                (potential[first_shortage + j] for j, levels in enumerate(shortages) if levels[level]),
+                default=0,
+            )
+        potential[sink] = min(0, *(potential[first_level + level] - penalty for level, penalty in enumerate(penalties)))
+        potential = network.min_cost_flow(source, sink, potential)
+
+        cheaper = set()
+        for i, row in enumerate(distances):
+            supplier_potential = potential[1 + i]
+            for j, metres in enumerate(row):
+                if (metres + supplier_potential < potential[first_shortage + j]
+                        and (max_m is None or metres <= max_m) and (i, j) not in linked):
+                    cheaper.add((i, j))
+        if not cheaper:
+            return {
+                key: network.capacity[edge ^ 1]
+                for key, edge in route_edges.items() if network.capacity[edge ^ 1]
+            }
+        linked |= cheaper
+
+
+def _shortage_levels(units):
+    """Units needed to lift ``units`` through each alert level, most urgent first."""
+    levels = []
+    floor = units
+    for _, threshold, _ in SHORTAGE_LEVELS:
+        levels.append(max(0, threshold - floor))
+        floor = max(floor, threshold)
+    return levels
+
+
+def _distance_matrix(sources, targets):
+    """Haversine metres from every source (rows) to every target hospital."""
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    return [
+        [
+            round(EARTH_DIAMETER_M * asin(sqrt(
+                sin((target['lat'] - source['lat']) / 2) ** 2
+                + source['cos_lat'] * target['cos_lat'] * sin((target['lng'] - source['lng']) / 2) ** 2
+            )))
+            for target in targets
+        ]
+        for source in sources
+    ]
+
+
+def _level(units):
+    for name, threshold, _ in SHORTAGE_LEVELS:
+        if units < threshold:
+            return name
+    return None
+
+
+def plan_transfers(blood_groups=None, products=None, max_km=None, safety_units=None):
+    """
+    Plan transfers from surplus to shortage hospitals across the country.
+
+    Args:
+        blood_groups: blood groups to plan (default: all)
+        products: blood product types to plan (default: all)
+        max_km: optional longest transfer in kilometres
+        safety_units: units a supplier keeps (default ``TRANSFER_SAFETY_UNITS``)
+
+    Returns:
+        dict with the transfers (largest first within each group), a
+        summary per blood group and product, and the solve time
+    """
+    started = time.perf_counter()
+    safety = settings.TRANSFER_SAFETY_UNITS if safety_units is None else safety_units
+    low = SHORTAGE_LEVELS[-1][1]
+    blood_groups = blood_groups or [code for code, _ in BLOOD_GROUP_CHOICES]
+    products = products or [code for code, _ in BLOOD_PRODUCT_CHOICES]
+
+    hospitals = {
+        row['id']: row
+        for row in Hospital.objects.filter(
+            is_active=True, latitude__isnull=False, longitude__isnull=False
+        ).order_by().values('id', 'code', 'name', 'city', 'latitude', 'longitude')
+    }
+    for hospital in hospitals.values():
+        hospital['lat'] = math.radians(float(hospital['latitude']))
+        hospital['lng'] = math.radians(float(hospital['longitude']))
+        hospital['cos_lat'] = math.cos(hospital['lat'])
+
+    nodes = defaultdict(lambda: ([], []))  # (group, product) -> (supplies, shortages)
+    rows = BloodStock.objects.filter(
+        hospital_id__in=list(hospitals), blood_group__in=blood_groups, blood_product_type__in=products,
+    ).exclude(units_available__range=(low, safety)).order_by('hospital__code').values_list(
+        'hospital_id', 'blood_group', 'blood_product_type', 'units_available'
+    )
+    for hospital_id, blood_group, product, units in rows:
+        supplies, shortages = nodes[(blood_group, product)]
+        if units > safety:
+            supplies.append((hospitals[hospital_id], units - safety))
+        elif units < low:
+            shortages.append((hospitals[hospital_id], units))
+
+    transfers, summary = [], []
+    for (blood_group, product), (supplies, shortages) in sorted(nodes.items()):
+        distances = _distance_matrix([hospital for hospital, _ in supplies], [hospital for hospital, _ in shortages])
+        flows = solve_transfers(
+            [units for _, units in supplies],
+            [_shortage_levels(units) for _, units in shortages],
+            [penalty for _, _, penalty in SHORTAGE_LEVELS],
+            distances,
+            max_m=max_km * 1000 if max_km is not None else None,
+        )
+        received = defaultdict(int)
+        group_transfers = []
+        for (i, j), units in flows.items():
+            source, target = supplies[i][0], shortages[j][0]
+            received[j] += units
+            group_transfers.append({
+                'blood_group': blood_group,
+                'blood_product_type': product,
+                'from': {'code': source['code'], 'name': source['name'], 'city': source['city']},
+                'to': {'code': target['code'], 'name': target['name'], 'city': target['city']},
+                'units': units,
+                'distance_km': round(distances[i][j] / 1000, 1),
+            })
+        group_transfers.sort(key=lambda transfer: (-transfer['units'], transfer['distance_km']))
+        transfers.extend(group_transfers)
+
+        unmet = defaultdict(int)
+        for j, (_, units) in enumerate(shortages):
+            level = _level(units + received[j])
+            if level:
+                unmet[level] += 1
+        summary.append({
+            'blood_group': blood_group,
+            'blood_product_type': product,
+            'shortage_hospitals': len(shortages),
+            'shortage_units': sum(low - units for _, units in shortages),
+            'spare_units': sum(units for _, units in supplies),
+            'transferred_units': sum(flows.values()),
+            'unit_km': round(sum(
+                units * distances[i][j] for (i, j), units in flows.items()
+            ) / 1000, 1),
+            'still_short': {name: unmet[name] for name, _, _ in SHORTAGE_LEVELS},
+        })
+
+    return {
+        'transfers': transfers,
+        'summary': summary,
+        'safety_units': safety,
+        'target_units': low,
+        'max_km': max_km,
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.decorators import api_view, permission_classes
@@ -7,10 +8,12 @@ from rest_framework import status
 from .views import (
     DonorProfileViewSet, HospitalReqViewSet, BloodBankViewSet,
     DonationViewSet, StoreItemViewSet, RedemptionViewSet, AIHealthViewSet,
-    HospitalViewSet, TransactionViewSet, TransactionIngestView, StockView,
+    HospitalViewSet, TransactionViewSet, TransactionIngestView, TransactionBatchIngestView,
+    TransactionFileImportView, FileImportJobView, TransactionExportView, IngestQueueStatsView, MetricsView, StockView,
+    StockChangesView,
     BloodRequestViewSet,
 )
-from .sms_views import SMSViewSet, SMSAPIView
+from .sms_views import SMSViewSet, SMSAPIView, SMSNotificationLogViewSet
 from .reward_views import (
     MoneyRewardViewSet, DiscountRewardViewSet, DiscountRedemptionViewSet,
     MedicineRewardViewSet, MedicineRedemptionViewSet,
@@ -19,7 +22,9 @@ from .bloodsync_views import (
     PublicBloodStockView, BloodAvailabilityByCityView, AdminAnalyticsView,
     StockAlertViewSet, DonationDriveViewSet, hospital_list_public,
     check_stock_alerts, blood_stock_map_data, NearbyDonorLocatorView, priority_hospitals,
+    stock_stream, search_public, map_viewport, nearest_stock, TransferPlanView,
 )
+from . import async_views
 
 # Blood Group Update Endpoint
 @api_view(['PUT'])
@@ -76,6 +81,28 @@ router.register(r'blood-requests', BloodRequestViewSet, basename='blood-request'
 
 # SMS endpoints
 router.register(r'sms', SMSViewSet, basename='sms')
+router.register(r'sms-logs', SMSNotificationLogViewSet, basename='sms-log')
+
+# Public stock endpoints, sync (WSGI) and async (ASGI) implementations.
+sync_public_stock_patterns = [
+    path('v1/public/blood-stock/', PublicBloodStockView.as_view(), name='public-blood-stock'),
+    path('v1/public/hospitals/', hospital_list_public, name='public-hospitals'),
+    path('v1/public/priority-hospitals/', priority_hospitals, name='priority-hospitals'),
+    path('v1/public/map-data/', blood_stock_map_data, name='map-data'),
+    path('v1/public/map-viewport/', map_viewport, name='map-viewport'),
+    path('v1/public/stock-stream/', stock_stream, name='stock-stream'),
+]
+async_public_stock_patterns = [
+    path('v1/public/blood-stock/', async_views.public_blood_stock, name='public-blood-stock'),
+    path('v1/public/hospitals/', async_views.hospital_list_public, name='public-hospitals'),
+    path('v1/public/priority-hospitals/', async_views.priority_hospitals, name='priority-hospitals'),
+    path('v1/public/map-data/', async_views.blood_stock_map_data, name='map-data'),
+    path('v1/public/map-viewport/', async_views.map_viewport, name='map-viewport'),
+    path('v1/public/stock-stream/', async_views.stock_stream, name='stock-stream'),
+]
+public_stock_patterns = (
+    async_public_stock_patterns if settings.ASYNC_PUBLIC_VIEWS else sync_public_stock_patterns
+)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -85,18 +112,26 @@ urlpatterns = [
     
     # Hospital Integration API (Protected)
     path('v1/ingest/transaction/', TransactionIngestView.as_view(), name='ingest-transaction'),
+    path('v1/ingest/transactions/batch/', TransactionBatchIngestView.as_view(), name='ingest-transaction-batch'),
+    path('v1/ingest/transactions/upload/', TransactionFileImportView.as_view(), name='ingest-transaction-upload'),
+    path('v1/ingest/transactions/upload/<uuid:job_id>/', FileImportJobView.as_view(), name='ingest-transaction-upload-job'),
     
     # Public Query API
-    path('v1/public/blood-stock/', PublicBloodStockView.as_view(), name='public-blood-stock'),
+    *public_stock_patterns,
+    path('v1/public/search/', search_public, name='public-search'),
+    path('v1/public/nearest-stock/', nearest_stock, name='nearest-stock'),
     path('v1/public/blood-availability/<str:city>/', BloodAvailabilityByCityView.as_view(), name='blood-availability-city'),
-    path('v1/public/hospitals/', hospital_list_public, name='public-hospitals'),
-    path('v1/public/priority-hospitals/', priority_hospitals, name='priority-hospitals'),
-    path('v1/public/map-data/', blood_stock_map_data, name='map-data'),
     
+    path('v1/stock/changes/', StockChangesView.as_view(), name='stock-changes'),
+
     # Admin API (Protected)
     path('v1/admin/analytics/national/', AdminAnalyticsView.as_view(), name='admin-analytics'),
     path('v1/admin/check-alerts/', check_stock_alerts, name='check-alerts'),
     path('v1/admin/locate-donors/', NearbyDonorLocatorView.as_view(), name='locate-donors'),
+    path('v1/admin/transfer-plan/', TransferPlanView.as_view(), name='transfer-plan'),
+    path('v1/admin/ingest-queue/', IngestQueueStatsView.as_view(), name='ingest-queue-stats'),
+    path('v1/admin/metrics/', MetricsView.as_view(), name='admin-metrics'),
+    path('v1/admin/export/transactions/', TransactionExportView.as_view(), name='export-transactions'),
     
     # Legacy endpoints
     path('ingest/transactions/', TransactionIngestView.as_view(), name='ingest-transaction-legacy'),
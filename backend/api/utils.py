@@ -4,64 +4,29 @@ Alert system, notifications, and helper functions
 """
 
 from django.utils import timezone
-from django.db.models import Sum, Q
+from django.db.models import Count, Sum, Q
 from math import radians, cos, sin, asin, sqrt
-from .models import BloodStock, StockAlert, Hospital, DonationDrive, BLOOD_GROUP_CHOICES, DonorProfile
+from .models import (
+    BloodStock, StockAggregate, StockAlert, Hospital, DonationDrive, BLOOD_GROUP_CHOICES, DonorProfile
+)
+from .nearby import nearest_hospitals_with_stock
+from .stock_alerts import sweep_stock_alerts
 
 
 def check_and_create_alerts():
     """
-    Check all blood stocks and create alerts for low/critical levels.
+    Re-evaluate the stock alerts of every hospital and blood group.
     Returns the number of new alerts created.
-    
-    Thresholds:
+
+    Stock changes evaluate the groups they touch as they happen (see
+    ``api.stock_alerts``); this sweep catches anything that bypassed them.
+
+    Thresholds (units held across products):
     - Emergency: < 3 units
     - Critical: < 5 units
     - Low: < 15 units
     """
-    alerts_created = 0
-    
-    for stock in BloodStock.objects.select_related('hospital'):
-        alert_level = None
-        threshold = 0
-        
-        if stock.units_available < 3:
-            alert_level = 'emergency'
-            threshold = 3
-        elif stock.units_available < 5:
-            alert_level = 'critical'
-            threshold = 5
-        elif stock.units_available < 15:
-            alert_level = 'low'
-            threshold = 15
-        
-        if alert_level:
-            # Check if there's already an active alert for this combination
-            existing_alert = StockAlert.objects.filter(
-                hospital=stock.hospital,
-                blood_group=stock.blood_group,
-                resolved_at__isnull=True
-            ).first()
-            
-            if not existing_alert:
-                # Create new alert
-                StockAlert.objects.create(
-                    hospital=stock.hospital,
-                    blood_group=stock.blood_group,
-                    alert_level=alert_level,
-                    threshold=threshold,
-                    current_units=stock.units_available
-                )
-                alerts_created += 1
-        else:
-            # Stock is sufficient, resolve any existing alerts
-            StockAlert.objects.filter(
-                hospital=stock.hospital,
-                blood_group=stock.blood_group,
-                resolved_at__isnull=True
-            ).update(resolved_at=timezone.now())
-    
-    return alerts_created
+    return sweep_stock_alerts()['opened']
 
 
 def suggest_donation_drives():
@@ -227,50 +192,50 @@ def calculate_national_statistics():
     Returns:
         dict with comprehensive statistics
     """
-    total_hospitals = Hospital.objects.filter(is_active=True).count()
+    # Hospitals per city (active only)
+    city_hospitals = dict(
+        Hospital.objects.filter(is_active=True).order_by().values('city')
+        .annotate(count=Count('id')).values_list('city', 'count')
+    )
+    total_hospitals = sum(city_hospitals.values())
+    
+    # Stock totals are maintained per (city, blood group, product) by stock_service
+    aggregates = StockAggregate.objects.order_by()
     
     # Total units by blood group
-    blood_group_totals = {}
-    for bg_code, bg_name in BLOOD_GROUP_CHOICES:
-        total = BloodStock.objects.filter(blood_group=bg_code).aggregate(
-            total=Sum('units_available')
-        )['total'] or 0
-        blood_group_totals[bg_code] = total
+    blood_group_totals = dict.fromkeys((bg_code for bg_code, _ in BLOOD_GROUP_CHOICES), 0)
+    blood_group_totals.update(
+        aggregates.values('blood_group').annotate(total=Sum('units_available')).values_list('blood_group', 'total')
+    )
     
     # Overall total
     total_units = sum(blood_group_totals.values())
     
     # Critical hospitals (any blood group < 5)
-    critical_hospitals = set()
-    for stock in BloodStock.objects.filter(units_available__lt=5):
-        critical_hospitals.add(stock.hospital.id)
+    critical_hospitals = BloodStock.objects.filter(units_available__lt=5).values('hospital_id').distinct().count()
     
     # Active alerts
     active_alerts = StockAlert.objects.filter(resolved_at__isnull=True).count()
     
     # City-wise breakdown
-    cities = Hospital.objects.filter(is_active=True).values_list('city', flat=True).distinct()
+    city_totals = dict(
+        aggregates.values('city').annotate(total=Sum('units_available')).values_list('city', 'total')
+    )
     city_stats = {}
     
-    for city in cities:
-        city_total = BloodStock.objects.filter(
-            hospital__city=city,
-            hospital__is_active=True
-        ).aggregate(total=Sum('units_available'))['total'] or 0
-        
-        city_hospitals = Hospital.objects.filter(city=city, is_active=True).count()
-        
+    for city, hospitals_count in city_hospitals.items():
+        city_total = city_totals.get(city, 0)
         city_stats[city] = {
             'total_units': city_total,
-            'hospitals_count': city_hospitals,
-            'avg_units_per_hospital': round(city_total / city_hospitals, 1) if city_hospitals > 0 else 0
+            'hospitals_count': hospitals_count,
+            'avg_units_per_hospital': round(city_total / hospitals_count, 1) if hospitals_count > 0 else 0
         }
     
     return {
         'total_hospitals': total_hospitals,
         'total_units': total_units,
         'blood_group_distribution': blood_group_totals,
-        'critical_hospitals_count': len(critical_hospitals),
+        'critical_hospitals_count': critical_hospitals,
         'active_alerts': active_alerts,
         'city_statistics': city_stats,
         'timestamp': timezone.now().isoformat()
@@ -311,42 +276,28 @@ def send_low_stock_notification(alert):
     return True
 
 
-def get_nearby_hospitals_with_stock(hospital, blood_group, radius_km=50):
+def get_nearby_hospitals_with_stock(hospital, blood_group, radius_km=50, k=10, min_units=6, product=None):
     """
-    Find nearby hospitals with available stock of a specific blood group.
-    This is a simplified version - in production, use PostGIS for accurate distance calculation.
-    
+    Find the nearest other hospitals with available stock of a blood group,
+    regardless of city or district.
+
     Args:
         hospital: Hospital instance
         blood_group: str, blood group code
         radius_km: int, search radius in kilometers
-    
+        k: int, maximum number of hospitals
+        min_units: int, minimum units held
+        product: str, blood product type (default: all products)
+
     Returns:
-        list of hospitals with stock information
+        list of hospitals with stock information and distance, closest first
     """
-    # Simple implementation - filter by same city
-    # In production, calculate actual distance using lat/long
-    nearby = Hospital.objects.filter(
-        is_active=True,
-        city=hospital.city
-    ).exclude(id=hospital.id)
-    
-    results = []
-    for h in nearby:
-        stock = h.stock.filter(blood_group=blood_group, units_available__gt=5).first()
-        if stock:
-            results.append({
-                'hospital': {
-                    'code': h.code,
-                    'name': h.name,
-                    'city': h.city,
-                    'address': h.address
-                },
-                'units_available': stock.units_available,
-                'updated_at': stock.updated_at.isoformat()
-            })
-    
-    return results
+    if hospital.latitude is None or hospital.longitude is None:
+        return []
+    return nearest_hospitals_with_stock(
+        hospital.latitude, hospital.longitude, blood_group,
+        product=product, min_units=min_units, k=k, max_km=radius_km, exclude=hospital.id,
+    )
 
 
 def calculate_distance(lat1, lon1, lat2, lon2):
@@ -1,13 +1,18 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.views import APIView
-from django.db import transaction as db_transaction
 from django.db.models import Q, Count, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 import base64
+import math
 from io import BytesIO
 from .models import (
     DonorProfile,
@@ -23,6 +28,7 @@ from .models import (
     DonationDrive,
     BloodRequest,
     SMSNotificationLog,
+    FileImportJob,
 )
 from .serializers import (
     DonorProfileSerializer, HospitalReqSerializer, BloodBankSerializer,
@@ -35,7 +41,17 @@ from .sms_service import send_blood_request_sms
 from .prediction import predict_blood_needs
 from django.conf import settings
 import os
-from .authentication import HospitalAPIKeyAuthentication
+from .authentication import HospitalAPIKeyAuthentication, hospital_key_cache
+from .ingest import enqueue_transactions, ingest_queue_stats, ingest_transactions
+from .file_import import FILE_FORMATS, detect_format, import_job_status, import_transactions, queue_import
+from .pagination import LedgerCursorPagination
+from .parsers import COMPACT_PARSER_CLASSES
+from .renderers import COMPACT_RENDERER_CLASSES
+from .throttling import HospitalIngestThrottle, consume_tokens, ingest_throttle_stats
+from .search import matching_ids
+from .stock_cache import stock_cache_counter
+from .stock_changes import CursorExpired, changes_since, current_cursor
+from .export import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, astream_export, export_queryset, stream_export
 
 
 class DonorProfileViewSet(viewsets.ModelViewSet):
@@ -321,7 +337,7 @@ class HospitalReqViewSet(viewsets.ModelViewSet):
         # Filter by hospital name
         hospital_name = self.request.query_params.get('hospital_name', None)
         if hospital_name:
-            queryset = queryset.filter(hospital_name__icontains=hospital_name)
+            queryset = queryset.filter(pk__in=matching_ids(hospital_name, 'hospital_request'))
         
         return queryset.order_by('-is_critical', '-created_at')
     
@@ -614,33 +630,77 @@ class HospitalViewSet(viewsets.ReadOnlyModelViewSet):
         if city:
             queryset = queryset.filter(city__icontains=city)
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = queryset.filter(pk__in=matching_ids(search, 'hospital'))
         return queryset
 
 
 class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
-    """View-only access to transaction ledger (for demos/ops)."""
+    """View-only access to transaction ledger (for demos/ops).
+
+    Cursor-paginated on (ingested_at, id). Filters: ``hospital_id``,
+    ``hospital`` (code), ``blood_group`` and ``since``/``until`` (ISO
+    datetimes, bounds on ``ingested_at``).
+    """
 
     queryset = Transaction.objects.select_related('hospital')
     serializer_class = TransactionSerializer
     permission_classes = [AllowAny]
+    pagination_class = LedgerCursorPagination
 
     def get_queryset(self):
         queryset = Transaction.objects.select_related('hospital')
         hospital_id = self.request.query_params.get('hospital_id')
         if hospital_id:
             queryset = queryset.filter(hospital_id=hospital_id)
+        hospital_code = self.request.query_params.get('hospital')
+        if hospital_code:
+            queryset = queryset.filter(hospital__code=hospital_code)
         blood_group = self.request.query_params.get('blood_group')
         if blood_group:
             queryset = queryset.filter(blood_group=blood_group)
+        since = _parse_time_param(self.request, 'since')
+        if since:
+            queryset = queryset.filter(ingested_at__gte=since)
+        until = _parse_time_param(self.request, 'until')
+        if until:
+            queryset = queryset.filter(ingested_at__lt=until)
         return queryset
 
 
+def _parse_time_param(request, name):
+    """Parse an optional ISO datetime query parameter; 400 on bad input."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        # None for malformed input; ValueError for well-formed but impossible
+        # values such as month 13.
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: f'Invalid datetime: {value}'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _use_async_ingest(request):
+    """Resolve ingest mode from ``?mode=sync|async``, falling back to settings."""
+    mode = request.query_params.get('mode')
+    if mode in ('sync', 'async'):
+        return mode == 'async'
+    return settings.INGEST_ASYNC
+
+
 class TransactionIngestView(APIView):
     """Hospital-side ingestion endpoint (API-key protected)."""
 
     authentication_classes = [HospitalAPIKeyAuthentication]
     permission_classes = [AllowAny]
+    parser_classes = COMPACT_PARSER_CLASSES
+    renderer_classes = COMPACT_RENDERER_CLASSES
+    throttle_classes = [HospitalIngestThrottle]
 
     def post(self, request):
         serializer = IngestTransactionSerializer(data=request.data)
@@ -653,41 +713,258 @@ class TransactionIngestView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
-        data = serializer.validated_data
-        with db_transaction.atomic():
-            # Append to transaction ledger
-            txn = Transaction.objects.create(
-                hospital=hospital,
-                blood_group=data['blood_group'],
-                units_change=data['units_change'],
-                timestamp=data['timestamp'],
-                source_reference=data.get('source_reference', ''),
-                notes=data.get('notes', ''),
+        if _use_async_ingest(request):
+            queued = enqueue_transactions(hospital, [serializer.data])[0]
+            return Response(
+                {
+                    "message": "Transaction queued",
+                    "queued": True,
+                    "queue_id": queued.id,
+                },
+                status=status.HTTP_202_ACCEPTED,
             )
 
-            # Update materialized stock with row-level locking
-            stock, _ = BloodStock.objects.select_for_update().get_or_create(
-                hospital=hospital,
-                blood_group=data['blood_group'],
-                defaults={'units_available': 0},
-            )
-            stock.units_available = max(0, stock.units_available + data['units_change'])
-            stock.save()
+        results, stock_by_key = ingest_transactions(hospital, [serializer.validated_data])
+        txn, replayed = results[0]
+        stock = stock_by_key[(txn.blood_group, txn.blood_product_type)]
 
         return Response(
             {
-                "message": "Transaction ingested",
+                "message": "Transaction already ingested" if replayed else "Transaction ingested",
+                "replayed": replayed,
                 "transaction": TransactionSerializer(txn).data,
                 "stock": BloodStockSerializer(stock).data,
             },
+            status=status.HTTP_200_OK if replayed else status.HTTP_202_ACCEPTED,
+        )
+
+
+class TransactionBatchIngestView(APIView):
+    """Batch hospital-side ingestion endpoint (API-key protected).
+
+    Accepts a JSON array of ingest payloads. The whole batch is validated
+    before anything is written; ledger rows are bulk-inserted and each
+    (blood_group, product) stock row is updated once for the batch. Stock
+    is reported once per key under ``stock``, as it stands after the batch;
+    per-item results carry no stock level.
+    """
+
+    authentication_classes = [HospitalAPIKeyAuthentication]
+    permission_classes = [AllowAny]
+    parser_classes = COMPACT_PARSER_CLASSES
+    renderer_classes = COMPACT_RENDERER_CLASSES
+    throttle_classes = [HospitalIngestThrottle]
+
+    def get_throttle_cost(self, request):
+        """One token per event in the batch."""
+        data = request.data
+        return min(len(data), settings.INGEST_BATCH_MAX_ITEMS) if isinstance(data, list) else 1
+
+    def post(self, request):
+        hospital = getattr(request, "user", None)
+        if not isinstance(hospital, Hospital):
+            return Response(
+                {"detail": "Valid X-API-Key header is required."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        serializer = IngestTransactionSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.INGEST_BATCH_MAX_ITEMS,
+        )
+        serializer.is_valid(raise_exception=True)
+
+        if _use_async_ingest(request):
+            queued = enqueue_transactions(hospital, serializer.data)
+            return Response(
+                {
+                    "message": f"{len(queued)} transactions queued",
+                    "queued": True,
+                    "count": len(queued),
+                    "results": [
+                        {"index": index, "status": "queued", "queue_id": item.id}
+                        for index, item in enumerate(queued)
+                    ],
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
+
+        ingested, stock_by_key = ingest_transactions(hospital, serializer.validated_data)
+
+        results = []
+        for index, (txn, replayed) in enumerate(ingested):
+            results.append({
+                "index": index,
+                "status": "duplicate" if replayed else "ingested",
+                "transaction_id": str(txn.id),
+                "blood_group": txn.blood_group,
+                "blood_product_type": txn.blood_product_type,
+                "units_change": txn.units_change,
+            })
+
+        ingested_count = sum(1 for _, replayed in ingested if not replayed)
+        return Response(
+            {
+                "message": f"{ingested_count} transactions ingested",
+                "count": len(results),
+                "ingested": ingested_count,
+                "duplicates": len(results) - ingested_count,
+                "results": results,
+                "stock": BloodStockSerializer(list(stock_by_key.values()), many=True).data,
+            },
             status=status.HTTP_202_ACCEPTED,
         )
 
 
+class TransactionFileImportView(APIView):
+    """Upload a daily LIS export (CSV or NDJSON) for the authenticated hospital.
+
+    POST multipart form with a ``file`` field; the format is taken from
+    ``?file_format=csv|ndjson`` or the file extension. Responds with a
+    row-level error report, with status 400 if the file could not be read
+    to the end. Files over ``FILE_IMPORT_QUEUE_BYTES`` (or any file with
+    ``?mode=async``) are validated and queued for the ingest worker instead,
+    with status 202 and a ``job_id`` to poll. Each chunk is charged to the
+    hospital's ingest throttle by row count; a refused chunk stops the
+    import with status 429, the rows before it kept.
+    """
+
+    authentication_classes = [HospitalAPIKeyAuthentication]
+    permission_classes = [AllowAny]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        hospital = getattr(request, "user", None)
+        if not isinstance(hospital, Hospital):
+            return Response(
+                {"detail": "Valid X-API-Key header is required."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.query_params.get('file_format') or detect_format(upload.name)
+        if file_format not in FILE_FORMATS:
+            return Response(
+                {'error': f"Unsupported file format; use one of {', '.join(FILE_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        def throttle(rows):
+            return consume_tokens(hospital, rows)
+
+        queued = _use_async_ingest(request) or upload.size > settings.FILE_IMPORT_QUEUE_BYTES
+        if queued:
+            job, report = queue_import(hospital, upload, file_format, file_name=upload.name, throttle=throttle)
+            report = {'job_id': str(job.id), **report}
+        else:
+            report = import_transactions(hospital, upload, file_format, throttle=throttle)
+        report['file'] = upload.name
+        report['file_format'] = file_format
+        if report['stopped'] and 'retry_after' in report['stopped']:
+            return Response(
+                report,
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(math.ceil(report['stopped']['retry_after']))},
+            )
+        if report['stopped']:
+            # Chunks before the unreadable line are committed; the report says how far it got.
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK)
+
+
+class FileImportJobView(APIView):
+    """Progress of a queued file import, for the hospital that uploaded it."""
+
+    authentication_classes = [HospitalAPIKeyAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request, job_id):
+        hospital = getattr(request, "user", None)
+        if not isinstance(hospital, Hospital):
+            return Response(
+                {"detail": "Valid X-API-Key header is required."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        job = FileImportJob.objects.filter(hospital=hospital, id=job_id).first()
+        if job is None:
+            return Response({'error': 'Import job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(import_job_status(job))
+
+
+class IngestQueueStatsView(APIView):
+    """Queue depth and apply lag of the asynchronous ingest worker."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(ingest_queue_stats())
+
+
+class MetricsView(APIView):
+    """Operational counters (admin only).
+
+    ``auth_cache`` and ``public_stock_cache`` are per worker process;
+    ``ingest_throttle`` is shared through the cache.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'pid': os.getpid(),
+            'auth_cache': hospital_key_cache.stats(),
+            'ingest_throttle': ingest_throttle_stats(),
+            'public_stock_cache': stock_cache_counter.stats(),
+        })
+
+
+class TransactionExportView(APIView):
+    """Stream a ledger extract as CSV or NDJSON (admin only).
+
+    GET ?file_format=csv|ndjson (default csv). Filters: ``hospital`` (code),
+    ``city``, ``blood_group``, ``since``/``until`` (bounds on ``ingested_at``).
+    Streams under both WSGI and ASGI.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported file format; use one of {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = export_queryset(
+            hospital_code=request.query_params.get('hospital'),
+            city=request.query_params.get('city'),
+            blood_group=request.query_params.get('blood_group'),
+            since=_parse_time_param(request, 'since'),
+            until=_parse_time_param(request, 'until'),
+        )
+        # An ASGI server needs an async iterator to stream; a sync one is buffered whole.
+        stream = astream_export if isinstance(request._request, ASGIRequest) else stream_export
+        response = StreamingHttpResponse(
+            stream(queryset, file_format),
+            content_type=EXPORT_CONTENT_TYPES[file_format],
+        )
+        filename = f"transactions-{timezone.now():%Y%m%d-%H%M%S}.{file_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 class StockView(APIView):
     """Public stock lookup endpoint."""
 
     permission_classes = [AllowAny]
+    renderer_classes = COMPACT_RENDERER_CLASSES
 
     def get(self, request):
         blood_group = request.query_params.get('blood_group')
@@ -765,6 +1042,51 @@ Please provide:
             return Response({'error': error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class StockChangesView(APIView):
+    """
+    Delta feed of stock rows for mirrors of /api/stock/.
+    GET /api/v1/stock/changes/?since=<cursor>&page_size=<n>
+
+    Without ``since`` returns only the current cursor: take it, download
+    /api/stock/ once, then poll with ``since`` and apply ``changes``
+    (current rows, same shape as /api/stock/) and ``deleted`` keys. Keep
+    polling immediately while ``has_more`` is true. 410 means the cursor
+    is older than the retained log; resync from /api/stock/.
+    """
+    permission_classes = [AllowAny]
+    renderer_classes = COMPACT_RENDERER_CLASSES
+    default_page_size = 500
+    max_page_size = 2000
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'changes': [], 'deleted': [], 'cursor': current_cursor(), 'has_more': False})
+        try:
+            since = int(since)
+            page_size = int(request.query_params.get('page_size', self.default_page_size))
+        except ValueError:
+            raise ValidationError({'since': 'since and page_size must be integers'})
+        page_size = max(1, min(page_size, self.max_page_size))
+
+        try:
+            rows, deleted, cursor, has_more = changes_since(since, page_size)
+        except CursorExpired:
+            return Response(
+                {'detail': 'Cursor expired; resync from /api/stock/ and start from a new cursor.'},
+                status=status.HTTP_410_GONE,
+            )
+        return Response({
+            'changes': BloodStockSerializer(rows, many=True).data,
+            'deleted': [
+                {'hospital': str(hospital_id), 'blood_group': blood_group, 'blood_product_type': blood_product_type}
+                for hospital_id, blood_group, blood_product_type in deleted
+            ],
+            'cursor': cursor,
+            'has_more': has_more,
+        })
+
+
 class BloodRequestViewSet(viewsets.ModelViewSet):
     """Manage blood requests and notify nearby donors via SMS."""
 
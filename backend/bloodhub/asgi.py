@@ -0,0 +1,15 @@
+"""
+ASGI config for bloodhub project.
+
+Serve with an ASGI server, e.g. ``uvicorn bloodhub.asgi:application``, and
+set ``ASYNC_PUBLIC_VIEWS=true`` so the public stock endpoints use their
+async implementations.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bloodhub.settings')
+
+application = get_asgi_application()
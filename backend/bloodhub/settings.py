@@ -77,6 +77,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'bloodhub.wsgi.application'
+ASGI_APPLICATION = 'bloodhub.asgi.application'
 
 
 # Database
@@ -145,6 +146,102 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# BloodSync hospital ingestion
+# Maximum number of events accepted by /api/v1/ingest/transactions/batch/ in one request.
+INGEST_BATCH_MAX_ITEMS = int(os.getenv('INGEST_BATCH_MAX_ITEMS', '1000'))
+# When true, ingest endpoints only queue events and `manage.py run_ingest_worker` applies them.
+# Clients can override per request with ?mode=sync or ?mode=async.
+INGEST_ASYNC = os.getenv('INGEST_ASYNC', 'false').lower() == 'true'
+# Uploaded export files larger than this (bytes) are validated in the request but queued
+# for the ingest worker, answering 202 with a job id; smaller files are applied at once.
+FILE_IMPORT_QUEUE_BYTES = int(os.getenv('FILE_IMPORT_QUEUE_BYTES', str(5 * 1024 * 1024)))
+# Queued events whose apply raises a database error are retried by later batches, then
+# marked failed after this many attempts.
+INGEST_MAX_ATTEMPTS = int(os.getenv('INGEST_MAX_ATTEMPTS', '5'))
+# Per-process cache of API-key digest -> Hospital used by HospitalAPIKeyAuthentication.
+# Saving a Hospital clears it locally; the TTL bounds staleness in other processes.
+HOSPITAL_AUTH_CACHE_TTL = int(os.getenv('HOSPITAL_AUTH_CACHE_TTL', '60'))
+HOSPITAL_AUTH_CACHE_SIZE = int(os.getenv('HOSPITAL_AUTH_CACHE_SIZE', '1024'))
+# Per-hospital token bucket on the ingest endpoints; a batch costs one token per event.
+# Hospitals can override both values; a rate of 0 disables throttling.
+INGEST_THROTTLE_RATE = int(os.getenv('INGEST_THROTTLE_RATE', '600'))  # events per minute
+INGEST_THROTTLE_BURST = int(os.getenv('INGEST_THROTTLE_BURST', '1000'))
+
+# Public stock responses are reused until stock or hospital data changes (see
+# api/stock_cache.py); the timeout only bounds how long superseded entries linger.
+PUBLIC_STOCK_CACHE_TIMEOUT = int(os.getenv('PUBLIC_STOCK_CACHE_TIMEOUT', '300'))
+
+# Live stock stream (/api/v1/public/stock-stream/), served only under ASGI
+# (ASYNC_PUBLIC_VIEWS). Events go through a capped Redis stream so listeners on
+# every worker see every change (default REDIS_URL; empty fans out in-process only),
+# and each worker keeps the newest in a ring buffer for Last-Event-ID resume.
+STOCK_STREAM_REDIS_URL = os.getenv('STOCK_STREAM_REDIS_URL', os.getenv('REDIS_URL', ''))
+STOCK_STREAM_REDIS_KEY = os.getenv('STOCK_STREAM_REDIS_KEY', 'bloodsync:stock-events')
+STOCK_STREAM_BUFFER_SIZE = int(os.getenv('STOCK_STREAM_BUFFER_SIZE', '1000'))
+STOCK_STREAM_HEARTBEAT_SECONDS = int(os.getenv('STOCK_STREAM_HEARTBEAT_SECONDS', '15'))
+# Streams end after this long and the browser reconnects (resuming).
+STOCK_STREAM_MAX_SECONDS = int(os.getenv('STOCK_STREAM_MAX_SECONDS', '300'))
+STOCK_STREAM_RETRY_MS = int(os.getenv('STOCK_STREAM_RETRY_MS', '3000'))
+# Delta-sync feed (/api/v1/stock/changes/). Changes are logged inside the stock write;
+# the cursor only crosses a gap in the log ids (a write still open, or rolled back) once
+# the change after it is older than the settle time, which must cover a stock write.
+STOCK_CHANGES_SETTLE_SECONDS = float(os.getenv('STOCK_CHANGES_SETTLE_SECONDS', '30'))
+# `manage.py prune_stock_changes` keeps this many days; older cursors get 410.
+STOCK_CHANGES_RETENTION_DAYS = int(os.getenv('STOCK_CHANGES_RETENTION_DAYS', '7'))
+# Nearest-stock search (api/nearby.py) keeps hospital coordinates in an in-process
+# grid of this cell size; saving a Hospital rebuilds it locally, the TTL bounds
+# staleness in other processes.
+NEARBY_GRID_CELL_DEGREES = float(os.getenv('NEARBY_GRID_CELL_DEGREES', '0.1'))
+NEARBY_GRID_TTL = int(os.getenv('NEARBY_GRID_TTL', '300'))
+# Nearest-stock searches stop at this radius (km); a larger radius_km is capped to it.
+NEARBY_MAX_KM = float(os.getenv('NEARBY_MAX_KM', '500'))
+# /api/v1/public/map-viewport/ clusters hospitals up to this zoom level and
+# returns them individually when zoomed in further.
+MAP_CLUSTER_MAX_ZOOM = int(os.getenv('MAP_CLUSTER_MAX_ZOOM', '11'))
+# Transfer planner (api/transfers.py): supplying hospitals keep this many units of a
+# blood group and product; shortages are filled up to the low-stock alert level (15).
+TRANSFER_SAFETY_UNITS = int(os.getenv('TRANSFER_SAFETY_UNITS', '20'))
+# Route the public stock endpoints to their async views (api/async_views.py).
+# Enable when serving bloodhub.asgi; under WSGI each async view runs in its own event loop.
+ASYNC_PUBLIC_VIEWS = os.getenv('ASYNC_PUBLIC_VIEWS', 'false').lower() == 'true'
+
+# Cache shared by all workers (public stock responses). Set REDIS_URL in
+# production, or CACHE_DIR for a file-based cache on a single host; the
+# local-memory fallback is per process.
+# The ingest token bucket (api/throttling.py) needs an atomic cache.incr, so it
+# has its own alias, which must be Redis or local memory (checked at startup,
+# api/checks.py).
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+    }
+elif os.getenv('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR'),
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -9,6 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bloodhub.settings')
 django.setup()
 
 from api.models import Hospital, BloodStock, HospitalReq
+from api.stock_service import set_stock_level
 
 # Clear existing data
 Hospital.objects.all().delete()
@@ -98,12 +99,7 @@ for hospital_data in hospitals_data:
     
     # Create blood stocks for this hospital
     for blood_group, units in blood_stock_data.items():
-        BloodStock.objects.create(
-            hospital=hospital,
-            blood_group=blood_group,
-            blood_product_type='whole_blood',
-            units_available=units
-        )
+        set_stock_level(hospital, blood_group, units, blood_product_type='whole_blood')
     
     print(f"[+] Created {hospital.name} with {sum(blood_stock_data.values())} total blood units")
 
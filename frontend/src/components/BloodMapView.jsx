@@ -1,5 +1,5 @@
 import { useEffect, useMemo, useState } from 'react'
-import { MapContainer, TileLayer, Marker, Popup, Circle, useMap } from 'react-leaflet'
+import { MapContainer, TileLayer, Marker, Popup, Circle, useMap, useMapEvents } from 'react-leaflet'
 import { motion } from 'framer-motion'
 import L from 'leaflet'
 import 'leaflet/dist/leaflet.css'
@@ -44,24 +44,122 @@ const createCustomIcon = (stockLevel) => {
   })
 }
 
-const MapAutoFit = ({ enabled, points }) => {
+const createClusterIcon = (count) => {
+  const size = count < 10 ? 36 : count < 100 ? 44 : 52
+  return L.divIcon({
+    className: 'custom-marker',
+    html: `
+      <div style="
+        width: ${size}px;
+        height: ${size}px;
+        background-color: rgba(220, 38, 38, 0.85);
+        border: 3px solid white;
+        border-radius: 50%;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.3);
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        color: white;
+        font-weight: 700;
+        font-size: 13px;
+      ">${count}</div>
+    `,
+    iconSize: [size, size],
+    iconAnchor: [size / 2, size / 2],
+    popupAnchor: [0, -size / 2]
+  })
+}
+
+// Whole-country view used when no city is selected
+const NEPAL_BOUNDS = [[26.3, 80.0], [30.5, 88.2]]
+
+const MapRecenter = ({ center, zoom, fitCountry }) => {
   const map = useMap()
 
   useEffect(() => {
-    if (!enabled) return
-    if (!points || points.length === 0) return
+    if (fitCountry) {
+      map.fitBounds(NEPAL_BOUNDS)
+    } else {
+      map.setView(center, zoom)
+    }
+  }, [center, zoom, fitCountry, map])
+
+  return null
+}
 
-    const bounds = L.latLngBounds(points.map(([lat, lng]) => L.latLng(lat, lng)))
-    // Small padding so markers are not on the edge
-    map.fitBounds(bounds, { padding: [40, 40] })
-  }, [enabled, map, points])
+// Reports the visible bounding box and zoom whenever the map settles
+const MapViewportWatcher = ({ onChange }) => {
+  const map = useMapEvents({
+    moveend: () => report(),
+  })
+
+  const report = () => {
+    const bounds = map.getBounds()
+    onChange({
+      bbox: [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()]
+        .map((value) => value.toFixed(4))
+        .join(','),
+      zoom: map.getZoom(),
+    })
+  }
+
+  useEffect(() => {
+    report()
+  }, [])
 
   return null
 }
 
+const ClusterMarker = ({ cluster, bloodGroup }) => {
+  const map = useMap()
+  const units = bloodGroup ? cluster.stock[bloodGroup] : cluster.total_units
+
+  return (
+    <Marker
+      position={[cluster.position.lat, cluster.position.lng]}
+      icon={createClusterIcon(cluster.hospital_count)}
+      eventHandlers={{
+        dblclick: () => map.fitBounds(cluster.bounds, { padding: [40, 40], maxZoom: 14 }),
+      }}
+    >
+      <Popup>
+        <div className="p-2 min-w-[220px]">
+          <h4 className="font-bold text-gray-800 mb-1">
+            {cluster.hospital ? cluster.hospital.name : `${cluster.hospital_count} hospitals`}
+          </h4>
+          <p className="text-xs text-gray-500 mb-2">
+            {bloodGroup ? `${bloodGroup}: ` : 'Total: '}{units} units
+          </p>
+          <div className="grid grid-cols-4 gap-1">
+            {Object.entries(cluster.stock).map(([group, groupUnits]) => (
+              <div
+                key={group}
+                className={`text-center p-1 rounded ${
+                  groupUnits > 0 ? 'bg-green-100 text-green-800' : 'bg-gray-100 text-gray-400'
+                } ${bloodGroup === group ? 'ring-2 ring-primary' : ''}`}
+              >
+                <div className="text-xs font-semibold">{group}</div>
+                <div className="text-xs">{groupUnits}</div>
+              </div>
+            ))}
+          </div>
+          <button
+            onClick={() => map.fitBounds(cluster.bounds, { padding: [40, 40], maxZoom: 14 })}
+            className="mt-3 w-full bg-primary text-white py-2 rounded-lg text-sm hover:bg-red-600 transition-colors"
+          >
+            Zoom in
+          </button>
+        </div>
+      </Popup>
+    </Marker>
+  )
+}
+
 const BloodMapView = ({ bloodGroup, selectedCity, showRadiusDemo = false }) => {
   const [hospitals, setHospitals] = useState([])
-  const [loading, setLoading] = useState(true)
+  const [clusters, setClusters] = useState([])
+  const [viewport, setViewport] = useState(null)
+  const [loading, setLoading] = useState(false)
   const [mapCenter, setMapCenter] = useState([27.7172, 85.3240]) // Kathmandu default
   const [mapZoom, setMapZoom] = useState(12)
 
@@ -81,19 +179,18 @@ const BloodMapView = ({ bloodGroup, selectedCity, showRadiusDemo = false }) => {
   }, [selectedCity])
 
   useEffect(() => {
-    fetchMapData()
-  }, [bloodGroup, selectedCity])
+    if (viewport) fetchMapData(viewport)
+  }, [viewport])
 
-  const fetchMapData = async () => {
+  // Only what is in view: hospitals when zoomed in, server-side clusters when zoomed out
+  const fetchMapData = async ({ bbox, zoom }) => {
     setLoading(true)
     try {
-      // If no city selected, request ALL cities (omit the cities filter entirely)
-      const url = selectedCity
-        ? `http://localhost:8000/api/v1/public/map-data/?cities=${encodeURIComponent(selectedCity)}`
-        : `http://localhost:8000/api/v1/public/map-data/`
-
-      const response = await axios.get(url)
+      const response = await axios.get('http://localhost:8000/api/v1/public/map-viewport/', {
+        params: { bbox, zoom },
+      })
       setHospitals(response.data.hospitals || [])
+      setClusters(response.data.clusters || [])
     } catch (error) {
       console.error('Error fetching map data:', error)
     } finally {
@@ -123,14 +220,15 @@ const BloodMapView = ({ bloodGroup, selectedCity, showRadiusDemo = false }) => {
     return hospital.stock[bloodGroup] !== undefined && hospital.stock[bloodGroup] > 0
   })
 
-  const markerPoints = useMemo(
-    () =>
-      filteredHospitals
-        .filter((h) => h?.position?.lat && h?.position?.lng)
-        .map((h) => [h.position.lat, h.position.lng]),
-    [filteredHospitals]
+  const filteredClusters = useMemo(
+    () => clusters.filter((cluster) => !bloodGroup || cluster.stock[bloodGroup] > 0),
+    [clusters, bloodGroup]
   )
 
+  const visibleCount =
+    filteredHospitals.length +
+    filteredClusters.reduce((count, cluster) => count + cluster.hospital_count, 0)
+
   return (
     <div className="bg-white rounded-2xl shadow-lg overflow-hidden">
       <div className="p-4 bg-gradient-to-r from-primary to-red-600 text-white">
@@ -147,137 +245,137 @@ const BloodMapView = ({ bloodGroup, selectedCity, showRadiusDemo = false }) => {
           )}
         </div>
         <p className="text-sm mt-1 text-white/80">
-          {filteredHospitals.length} hospital{filteredHospitals.length !== 1 ? 's' : ''} found
-          {selectedCity && ` in ${selectedCity}`}
+          {visibleCount} hospital{visibleCount !== 1 ? 's' : ''} in view
         </p>
       </div>
 
-      {loading ? (
-        <div className="h-[500px] flex items-center justify-center">
-          <div className="text-center">
-            <div className="inline-block animate-spin rounded-full h-12 w-12 border-b-2 border-primary mb-2"></div>
-            <p className="text-gray-600">Loading map data...</p>
+      <div className="relative">
+        {loading && (
+          <div className="absolute top-4 right-4 z-[1000] bg-white/95 px-3 py-1 rounded-lg shadow text-xs text-gray-600">
+            Loading map data...
           </div>
-        </div>
-      ) : (
-        <div className="relative">
-          <MapContainer
-            center={mapCenter}
-            zoom={mapZoom}
-            className="h-[500px] w-full"
-            scrollWheelZoom={true}
-          >
-            {/* If user didn't pick a city, fit the map to all markers so non-Kathmandu hospitals are visible */}
-            <MapAutoFit enabled={!selectedCity} points={markerPoints} />
+        )}
+        <MapContainer
+          center={mapCenter}
+          zoom={mapZoom}
+          className="h-[500px] w-full"
+          scrollWheelZoom={true}
+        >
+          {/* If user didn't pick a city, show the whole country */}
+          <MapRecenter center={mapCenter} zoom={mapZoom} fitCountry={!selectedCity} />
+          <MapViewportWatcher onChange={setViewport} />
+
+          <TileLayer
+            attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+            url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
+          />
+          
+          {filteredClusters.map((cluster) => (
+            <ClusterMarker key={cluster.id} cluster={cluster} bloodGroup={bloodGroup} />
+          ))}
 
-            <TileLayer
-              attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
-              url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
-            />
+          {filteredHospitals.map((hospital) => {
+            const stockLevel = getStockLevel(hospital.total_units)
+            const hasBloodGroup = bloodGroup ? hospital.stock[bloodGroup] > 0 : true
             
-            {filteredHospitals.map((hospital) => {
-              const stockLevel = getStockLevel(hospital.total_units)
-              const hasBloodGroup = bloodGroup ? hospital.stock[bloodGroup] > 0 : true
-              
-              if (!hasBloodGroup) return null
-
-              return (
-                <Marker
-                  key={hospital.id}
-                  position={[hospital.position.lat, hospital.position.lng]}
-                  icon={createCustomIcon(stockLevel)}
-                >
-                  <Popup>
-                    <div className="p-2 min-w-[250px]">
-                      <h4 className="font-bold text-lg text-gray-800 mb-2">
-                        {hospital.name}
-                      </h4>
-                      <p className="text-sm text-gray-600 mb-3">
-                        <FaMapMarkerAlt className="inline mr-1" />
-                        {hospital.city}, {hospital.address}
+            if (!hasBloodGroup) return null
+
+            return (
+              <Marker
+                key={hospital.id}
+                position={[hospital.position.lat, hospital.position.lng]}
+                icon={createCustomIcon(stockLevel)}
+              >
+                <Popup>
+                  <div className="p-2 min-w-[250px]">
+                    <h4 className="font-bold text-lg text-gray-800 mb-2">
+                      {hospital.name}
+                    </h4>
+                    <p className="text-sm text-gray-600 mb-3">
+                      <FaMapMarkerAlt className="inline mr-1" />
+                      {hospital.city}, {hospital.address}
+                    </p>
+                    
+                    <div className="mb-3">
+                      <p className={`text-sm font-semibold ${getStockColor(stockLevel)}`}>
+                        Stock Level: {stockLevel}
                       </p>
-                      
-                      <div className="mb-3">
-                        <p className={`text-sm font-semibold ${getStockColor(stockLevel)}`}>
-                          Stock Level: {stockLevel}
-                        </p>
-                        <p className="text-xs text-gray-500">
-                          Total Units: {hospital.total_units}
-                        </p>
-                      </div>
+                      <p className="text-xs text-gray-500">
+                        Total Units: {hospital.total_units}
+                      </p>
+                    </div>
 
-                      <div className="border-t pt-2">
-                        <p className="text-xs font-semibold text-gray-700 mb-1">
-                          Available Blood Groups:
-                        </p>
-                        <div className="grid grid-cols-4 gap-1">
-                          {Object.entries(hospital.stock).map(([group, units]) => (
-                            <div
-                              key={group}
-                              className={`text-center p-1 rounded ${
-                                units > 0 ? 'bg-green-100 text-green-800' : 'bg-gray-100 text-gray-400'
-                              } ${bloodGroup === group ? 'ring-2 ring-primary' : ''}`}
-                            >
-                              <div className="text-xs font-semibold">{group}</div>
-                              <div className="text-xs">{units}</div>
-                            </div>
-                          ))}
-                        </div>
+                    <div className="border-t pt-2">
+                      <p className="text-xs font-semibold text-gray-700 mb-1">
+                        Available Blood Groups:
+                      </p>
+                      <div className="grid grid-cols-4 gap-1">
+                        {Object.entries(hospital.stock).map(([group, units]) => (
+                          <div
+                            key={group}
+                            className={`text-center p-1 rounded ${
+                              units > 0 ? 'bg-green-100 text-green-800' : 'bg-gray-100 text-gray-400'
+                            } ${bloodGroup === group ? 'ring-2 ring-primary' : ''}`}
+                          >
+                            <div className="text-xs font-semibold">{group}</div>
+                            <div className="text-xs">{units}</div>
+                          </div>
+                        ))}
                       </div>
-
-                      <button
-                        onClick={() => {
-                          const url = `https://www.google.com/maps/dir/?api=1&destination=${hospital.position.lat},${hospital.position.lng}`
-                          window.open(url, '_blank')
-                        }}
-                        className="mt-3 w-full bg-primary text-white py-2 rounded-lg text-sm hover:bg-red-600 transition-colors"
-                      >
-                        Get Directions
-                      </button>
                     </div>
-                  </Popup>
-                </Marker>
-              )
-            })}
-
-            {showRadiusDemo && mapCenter && (
-              <>
-                <Circle
-                  center={mapCenter}
-                  radius={500}
-                  pathOptions={{ color: 'red', fillColor: 'red', fillOpacity: 0.1 }}
-                />
-                <Circle
-                  center={mapCenter}
-                  radius={2000}
-                  pathOptions={{ color: 'orange', fillColor: 'orange', fillOpacity: 0.05 }}
-                />
-              </>
-            )}
-          </MapContainer>
-
-          {/* Legend */}
-          <div className="absolute bottom-4 right-4 bg-white/95 backdrop-blur-sm p-3 rounded-lg shadow-lg z-[1000]">
-            <p className="text-xs font-semibold mb-2 text-gray-700">Stock Levels</p>
-            <div className="space-y-1">
-              {[
-                { label: 'Critical (<5)', color: '#ef4444' },
-                { label: 'Low (5-14)', color: '#f97316' },
-                { label: 'Moderate (15-29)', color: '#eab308' },
-                { label: 'Good (30+)', color: '#22c55e' },
-              ].map(({ label, color }) => (
-                <div key={label} className="flex items-center space-x-2">
-                  <div
-                    className="w-4 h-4 rounded-full border-2 border-white shadow-sm"
-                    style={{ backgroundColor: color }}
-                  ></div>
-                  <span className="text-xs text-gray-700">{label}</span>
-                </div>
-              ))}
-            </div>
+
+                    <button
+                      onClick={() => {
+                        const url = `https://www.google.com/maps/dir/?api=1&destination=${hospital.position.lat},${hospital.position.lng}`
+                        window.open(url, '_blank')
+                      }}
+                      className="mt-3 w-full bg-primary text-white py-2 rounded-lg text-sm hover:bg-red-600 transition-colors"
+                    >
+                      Get Directions
+                    </button>
+                  </div>
+                </Popup>
+              </Marker>
+            )
+          })}
+
+          {showRadiusDemo && mapCenter && (
+            <>
+              <Circle
+                center={mapCenter}
+                radius={500}
+                pathOptions={{ color: 'red', fillColor: 'red', fillOpacity: 0.1 }}
+              />
+              <Circle
+                center={mapCenter}
+                radius={2000}
+                pathOptions={{ color: 'orange', fillColor: 'orange', fillOpacity: 0.05 }}
+              />
+            </>
+          )}
+        </MapContainer>
+
+        {/* Legend */}
+        <div className="absolute bottom-4 right-4 bg-white/95 backdrop-blur-sm p-3 rounded-lg shadow-lg z-[1000]">
+          <p className="text-xs font-semibold mb-2 text-gray-700">Stock Levels</p>
+          <div className="space-y-1">
+            {[
+              { label: 'Critical (<5)', color: '#ef4444' },
+              { label: 'Low (5-14)', color: '#f97316' },
+              { label: 'Moderate (15-29)', color: '#eab308' },
+              { label: 'Good (30+)', color: '#22c55e' },
+            ].map(({ label, color }) => (
+              <div key={label} className="flex items-center space-x-2">
+                <div
+                  className="w-4 h-4 rounded-full border-2 border-white shadow-sm"
+                  style={{ backgroundColor: color }}
+                ></div>
+                <span className="text-xs text-gray-700">{label}</span>
+              </div>
+            ))}
           </div>
         </div>
-      )}
+      </div>
 
       <div className="p-4 bg-gray-50 border-t">
         <p className="text-xs text-gray-600 text-center">
@@ -21,8 +21,43 @@ const FindBlood = () => {
 
   useEffect(() => {
     fetchStock()
-    const interval = setInterval(fetchStock, 15000)
-    return () => clearInterval(interval)
+    let interval = setInterval(fetchStock, 15000)
+    if (typeof EventSource === 'undefined') {
+      return () => clearInterval(interval)
+    }
+
+    // Poll every 15s until the live stream is open, then every 60s as a fallback.
+    // The stream answers 503 under WSGI and EventSource gives up after a non-200,
+    // so the fast poll stays on unless the stream actually connects.
+    const poll = (ms) => {
+      clearInterval(interval)
+      interval = setInterval(fetchStock, ms)
+    }
+
+    // Stock events carry per-group totals, not the per-product rows listed here;
+    // a burst of ingests is folded into one refetch.
+    let refetchTimer = null
+    const scheduleRefetch = () => {
+      if (refetchTimer) return
+      refetchTimer = setTimeout(() => {
+        refetchTimer = null
+        fetchStock()
+      }, 2000)
+    }
+
+    const params = new URLSearchParams()
+    if (stockFilters.city?.trim()) params.set('city', stockFilters.city.trim())
+    if (stockFilters.blood_group) params.set('blood_group', stockFilters.blood_group)
+    const source = new EventSource(`/api/v1/public/stock-stream/?${params}`)
+    source.onopen = () => poll(60000)
+    source.onerror = () => poll(15000)
+    source.addEventListener('stock', scheduleRefetch)
+    source.addEventListener('reset', scheduleRefetch)
+    return () => {
+      source.close()
+      clearInterval(interval)
+      clearTimeout(refetchTimer)
+    }
   }, [stockFilters])
 
   useEffect(() => {